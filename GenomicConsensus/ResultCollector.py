@@ -1,37 +1,77 @@
 # Author: David Alexander, Jim Drake
 from __future__ import absolute_import, division, print_function
 
-import cProfile, logging, os.path, sys
+import cProfile, logging, os.path, Queue
 from multiprocessing import Process
 from threading import Thread
-from collections import OrderedDict, defaultdict
+from collections import OrderedDict, defaultdict, deque
 from .options import options
-from GenomicConsensus import reference, consensus, utils, windows
+from GenomicConsensus import reference, consensus
+from .utils import die
+from .variants import VariantTable, asVariantTable
 from .io.VariantsGffWriter import VariantsGffWriter
 from .io.VariantsVcfWriter import VariantsVcfWriter
-from pbcore.io import FastaWriter, FastqWriter
+from .io.ConsensusWriters import StreamingFastaWriter, StreamingFastqWriter
+from .io.utils import openOutputFile
+from .io.ResultStore import ResultStoreWriter
+from .io.AlignmentSummary import AlignmentSummary
+from .progress import ProgressReporter
+from . import __VERSION__
 
 class ResultCollector(object):
     """
     Gathers results and writes to a file.
     """
-    def __init__(self, resultsQueue, algorithmName, algorithmConfig):
+    def __init__(self, resultsQueue, algorithmName, algorithmConfig, workQueue=None):
         self._resultsQueue = resultsQueue
         self._algorithmName = algorithmName
         self._algorithmConfig = algorithmConfig
+        self._workQueue = workQueue
 
     def _run(self):
         self.onStart()
+        progress = self._makeProgressReporter()
+        # Wake up to report even while no results arrive
+        timeout = progress.interval if progress and progress.interval > 0 else None
 
         sentinelsReceived = 0
         while sentinelsReceived < options.numWorkers:
-            result = self._resultsQueue.get()
-            if result is None:
-                sentinelsReceived += 1
+            try:
+                result = self._resultsQueue.get(True, timeout)
+            except Queue.Empty:
+                pass
             else:
-                self.onResult(result)
+                if result is None:
+                    sentinelsReceived += 1
+                else:
+                    window, cssAndVariants, (workerName, busySeconds) = result
+                    self.onResult((window, cssAndVariants))
+                    if progress:
+                        progress.recordResult(window, workerName, busySeconds)
+            if progress and progress.due():
+                progress.report(self._queueDepths())
 
         self.onFinish()
+        if progress:
+            progress.report(self._queueDepths(), state="finished")
+
+    def _makeProgressReporter(self):
+        if not options.progressInterval > 0:
+            return None
+        totalBases = sum(reference.numReferenceBases(refId, options.referenceWindows)
+                         for refId in reference.enumerateIds(options.referenceWindows))
+        return ProgressReporter(totalBases, options.progressInterval, options.statusFile)
+
+    def _queueDepths(self):
+        depths = {}
+        for name, queue in (("work", self._workQueue), ("results", self._resultsQueue)):
+            try:
+                if queue is not None:
+                    depths[name] = queue.qsize()
+            except NotImplementedError:
+                # (multiprocessing queues cannot tell on some platforms)
+                pass
+        return depths
 
     def run(self):
         if options.doProfiling:
@@ -53,17 +93,38 @@ class ResultCollector(object):
         for refId in reference.byName:
             self.referenceBasesProcessedById[refId] = 0
         self.variantsByRefId             = defaultdict(list)
-        self.consensusChunksByRefId      = defaultdict(list)
+
+        # Consensus records are streamed out span by span, in
+        # reference order; chunks arriving ahead of the span being
+        # written wait here, keyed by (refId, refStart).
+        self.pendingChunks = {}
+        self.spansToWrite  = deque(span
+                                   for refId in reference.enumerateIds(options.referenceWindows)
+                                   for span in reference.enumerateSpans(refId,
+                                                                        options.referenceWindows))
+        self.writtenUpTo   = None
 
         # open file writers
         self.fastaWriter = None
         self.fastqWriter = None
         self.gffWriter   = None
         self.vcfWriter   = None
+        self.resultStore = None
+        self.alignmentSummary = None
         if options.fastaOutputFilename:
-            self.fastaWriter = FastaWriter(options.fastaOutputFilename)
+            # The .fai index comes from the writer's bookkeeping, but
+            # only for uncompressed output
+            fastaIndexFilename = (None if options.fastaOutputFilename.endswith(".gz")
+                                  else options.fastaOutputFilename + ".fai")
+            self.fastaWriter = StreamingFastaWriter(
+                openOutputFile(options.fastaOutputFilename, options.compressionThreads),
+                fastaIndexFilename)
         if options.fastqOutputFilename:
-            self.fastqWriter = FastqWriter(options.fastqOutputFilename)
+            # The qualities spill next to the output, where there
+            # will be room for them
+            self.fastqWriter = StreamingFastqWriter(
+                openOutputFile(options.fastqOutputFilename, options.compressionThreads),
+                os.path.dirname(os.path.abspath(options.fastqOutputFilename)))
         if options.gffOutputFilename:
             self.gffWriter = VariantsGffWriter(options.gffOutputFilename,
                                                vars(options),
@@ -72,11 +133,27 @@ class ResultCollector(object):
             self.vcfWriter = VariantsVcfWriter(options.vcfOutputFilename,
                                                vars(options),
                                                reference.byName.values())
+        if options.resultStore:
+            self.resultStore = ResultStoreWriter(options.resultStore,
+                                                 reference.byName.values(),
+                                                 self.spansToWrite,
+                                                 self._algorithmName,
+                                                 vars(options))
+        if options.alignmentSummaryOutput:
+            self.alignmentSummary = AlignmentSummary(options.alignmentSummary,
+                                                     trackConsensusQvs=True)
+            missing = [ reference.idToFullName(refId)
+                        for refId in reference.enumerateIds(options.referenceWindows)
+                        if not self.alignmentSummary.hasRegions(reference.idToFullName(refId)) ]
+            if missing:
+                die("Alignment summary %s has no regions for contig(s): %s" %
+                    (options.alignmentSummary, ", ".join(missing)))
 
     def onResult(self, result):
         window, cssAndVariants = result
         css, variants = cssAndVariants
         self._recordNewResults(window, css, variants)
+        self._streamConsensus()
         self._flushContigIfCompleted(window)
 
     def onFinish(self):
@@ -85,61 +162,88 @@ class ResultCollector(object):
         if self.fastqWriter: self.fastqWriter.close()
         if self.gffWriter:   self.gffWriter.close()
         if self.vcfWriter:   self.vcfWriter.close()
+        if self.resultStore: self.resultStore.close()
+        if self.alignmentSummary:
+            self.alignmentSummary.write(options.alignmentSummaryOutput,
+                                        [("source", "GenomicConsensus %s" % __VERSION__),
+                                         ("pacbio-alignment-summary-version", "0.6"),
+                                         ("source-commandline", options.shellCommand)])
         logging.info("Output files completed.")
 
     def _recordNewResults(self, window, css, variants):
         refId, refStart, refEnd = window
-        self.consensusChunksByRefId[refId].append(css)
-        self.variantsByRefId[refId] += variants
+        if self.fastaWriter or self.fastqWriter:
+            self.pendingChunks[css.refWindow[:2]] = css
+        variants = asVariantTable(variants)
+        if self.resultStore:
+            self.resultStore.addWindow(window, css, variants)
+        if self.alignmentSummary:
+            self.alignmentSummary.addConsensus(reference.idToFullName(refId), css)
+        self.variantsByRefId[refId].append(variants)
         self.referenceBasesProcessedById[refId] += (refEnd - refStart)
 
     def _flushContigIfCompleted(self, window):
         refId, _, _ = window
-        refEntry = reference.byName[refId]
-        refName = refEntry.fullName
         basesProcessed = self.referenceBasesProcessedById[refId]
         requiredBases = reference.numReferenceBases(refId, options.referenceWindows)
         if basesProcessed == requiredBases:
             # This contig is done, so we can dump to file and delete
             # the data structures.
-            if self.gffWriter or self.vcfWriter:
-                variants = sorted(self.variantsByRefId[refId])
+            if self.gffWriter or self.vcfWriter or self.alignmentSummary:
+                variants = VariantTable.concatenate(self.variantsByRefId[refId]).sorted()
                 if self.gffWriter:
                     self.gffWriter.writeVariants(variants)
                 if self.vcfWriter:
                     self.vcfWriter.writeVariants(variants)
+                if self.alignmentSummary:
+                    # Counted as summarizeConsensus counts the GFF records
+                    passing = variants.meetsThresholds(options.minCoverage,
+                                                       options.minConfidence)
+                    self.alignmentSummary.addVariants(reference.idToFullName(refId),
+                                                      variants[passing])
             del self.variantsByRefId[refId]
 
-            #
-            # If the user asked to analyze a window or a set of
-            # windows, we output a FAST[AQ] contig per analyzed
-            # window.  Otherwise we output a fasta contig per
-            # reference contig.
-            #
-            # We try to be intelligent about naming the output
-            # contigs, to include window information where applicable.
-            #
-            for span in reference.enumerateSpans(refId, options.referenceWindows):
-                _, s, e = span
-                if (s == 0) and (e == refEntry.length):
-                    spanName = refName
-                else:
-                    spanName = refName + "_%d_%d" % (s, e)
-                cssName = consensus.consensusContigName(spanName, self._algorithmName)
-                # Gather just the chunks pertaining to this span
-                chunksThisSpan = [ chunk for chunk in self.consensusChunksByRefId[refId]
-                                   if windows.windowsIntersect(chunk.refWindow, span) ]
-                css = consensus.join(chunksThisSpan)
+    def _consensusRecordName(self, span):
+        #
+        # If the user asked to analyze a window or a set of windows, we
+        # output a FAST[AQ] contig per analyzed window.  Otherwise we
+        # output a fasta contig per reference contig.
+        #
+        # We try to be intelligent about naming the output contigs, to
+        # include window information where applicable.
+        #
+        return consensus.consensusContigName(reference.spanName(span),
+                                             self._algorithmName)
 
+    def _streamConsensus(self):
+        """
+        Append the pending chunks that continue the span being written
+        to its FAST[AQ] records, moving on to the following spans as
+        they are completed.
+        """
+        if not (self.fastaWriter or self.fastqWriter):
+            return
+        while self.spansToWrite:
+            refId, s, e = self.spansToWrite[0]
+            if self.writtenUpTo is None:
+                cssName = self._consensusRecordName(self.spansToWrite[0])
+                if self.fastaWriter: self.fastaWriter.beginRecord(cssName)
+                if self.fastqWriter: self.fastqWriter.beginRecord(cssName)
+                self.writtenUpTo = s
+            if self.writtenUpTo < e:
+                css = self.pendingChunks.pop((refId, self.writtenUpTo), None)
+                if css is None:
+                    return
                 if self.fastaWriter:
-                    self.fastaWriter.writeRecord(cssName,
-                                                 css.sequence)
+                    self.fastaWriter.appendSequence(css.sequence)
                 if self.fastqWriter:
-                    self.fastqWriter.writeRecord(cssName,
-                                                 css.sequence,
-                                                 css.confidence)
-
-            del self.consensusChunksByRefId[refId]
+                    self.fastqWriter.appendSequence(css.sequence, css.confidence)
+                self.writtenUpTo = css.refWindow[2]
+            else:
+                if self.fastaWriter: self.fastaWriter.endRecord()
+                if self.fastqWriter: self.fastqWriter.endRecord()
+                self.spansToWrite.popleft()
+                self.writtenUpTo = None
 
 class ResultCollectorProcess(ResultCollector, Process):
     def __init__(self, *args):
@@ -1,12 +1,16 @@
 # Author: David Alexander, Jim Drake
 from __future__ import absolute_import, division, print_function
 
-import cProfile, logging, os.path
+import cProfile, logging, os.path, time
 from multiprocessing import Process
 from threading import Thread
 from .options import options
-from .reference import windowToString
+from .reference import WorkStripe, windowToString, enlargedReferenceWindow
 from .io.utils import loadCmpH5, loadBam
+from .io.StripeReader import StripeReader
+from .io.VariantsGffWriter import formatGffRecords
+from .io.VariantsVcfWriter import formatVcfRecords
+from .variants import VariantTable
 
 class Worker(object):
     """
@@ -30,6 +34,7 @@ class Worker(object):
             self._inAlnFile = loadCmpH5(options.inputFilename, options.referenceFilename,
                                         disableChunkCache=options.disableHdf5ChunkCache)
         self.onStart()
+        self._variantsDroppedAtSource = 0
 
         while True:
             datum = self._workQueue.get()
@@ -38,18 +43,56 @@ class Worker(object):
                 # on the results queue and end this worker process.
                 self._resultsQueue.put(None)
                 break
+            elif isinstance(datum, WorkStripe):
+                logging.debug("%s received work stripe, coords=%s" %
+                              (self.name, windowToString(datum.window)))
+                startTime = time.time()
+                for result in self.onStripe(datum):
+                    self._resultsQueue.put(self._packResult(result, time.time() - startTime))
+                    startTime = time.time()
             else:
-                if datum.hasCoverage:
-                    msg = "%s received work unit, coords=%s"
-                else:
-                    msg = "%s received work unit, coords=%s (inadequate coverage)"
-                logging.debug(msg % (self.name, windowToString(datum.window)))
-
+                self._logWorkChunk(datum)
+                startTime = time.time()
                 result = self.onChunk(datum)
-                self._resultsQueue.put(result)
+                self._resultsQueue.put(self._packResult(result, time.time() - startTime))
 
+        if self._variantsDroppedAtSource:
+            logging.info("%s dropped %d variants below the output thresholds" %
+                         (self.name, self._variantsDroppedAtSource))
         self.onFinish()
 
+    def _packResult(self, result, busySeconds):
+        # Variants cross the results queue as a VariantTable, which
+        # pickles as a few arrays rather than one object per variant.
+        # The time spent computing the result goes along with it, for
+        # the collector's progress reports.
+        window, (css, variants) = result
+        variants = VariantTable.fromVariants(variants)
+        if options.keepFilteredVariants < 1:
+            keep = variants.keptAtSource(options.minCoverage,
+                                         options.minConfidence,
+                                         options.keepFilteredVariants)
+            self._variantsDroppedAtSource += len(variants) - keep.sum()
+            variants = variants[keep]
+        # Format the output records here, in parallel, leaving the
+        # collector only to merge them
+        if options.gffOutputFilename:
+            variants.gffRecords = formatGffRecords(variants,
+                                                   options.minCoverage,
+                                                   options.minConfidence)
+        if options.vcfOutputFilename:
+            variants.vcfRecords = formatVcfRecords(variants,
+                                                   options.minCoverage,
+                                                   options.minConfidence)
+        return (window, (css, variants), (self.name, busySeconds))
+
+    def _logWorkChunk(self, workChunk):
+        if workChunk.hasCoverage:
+            msg = "%s received work unit, coords=%s"
+        else:
+            msg = "%s received work unit, coords=%s (inadequate coverage)"
+        logging.debug(msg % (self.name, windowToString(workChunk.window)))
+
 
     def run(self):
         if options.pdb:
@@ -81,6 +124,26 @@ class Worker(object):
         """
         pass
 
+    def onStripe(self, workStripe):
+        """
+        Process the chunks of a stripe in order, with the alignments
+        supplied by a StripeReader that decodes each alignment of the
+        stripe (enlarged by the chunk overlap) at most once.
+
+        workStripe -> iterable of results
+        """
+        overlap = options.referenceChunkOverlap
+        alnFile = self._inAlnFile
+        self._inAlnFile = StripeReader(alnFile,
+                                       enlargedReferenceWindow(workStripe.window, overlap))
+        try:
+            for workChunk in workStripe.chunks:
+                self._inAlnFile.advanceTo(workChunk.window[1] - overlap)
+                self._logWorkChunk(workChunk)
+                yield self.onChunk(workChunk)
+        finally:
+            self._inAlnFile = alnFile
+
     def onFinish(self):
         pass
 
@@ -69,6 +69,7 @@ def consensusAndVariantsForWindow(alnFile, refWindow, referenceContig,
         alns = U.readsInWindow(alnFile, subWin,
                                depthLimit=depthLimit,
                                minMapQV=arrowConfig.minMapQV,
+                               minReadScore=arrowConfig.minReadScore,
                                strategy="long-and-strand-balanced",
                                stratum=options.readStratum,
                                barcode=options.barcode)
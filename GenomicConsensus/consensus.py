@@ -13,18 +13,35 @@ __all__ = [ "Consensus",
 class Consensus(object):
     """
     A multiple sequence consensus corresponding to a
-    (reference/scaffold) coordinate region
+    (reference/scaffold) coordinate region.
+
+    The sequence is a byte string and the confidence a uint8 QV array
+    of the same length.  Consensus objects are slotted, as the result
+    collector holds one per window until its contig is complete.
     """
+    __slots__ = ("refWindow", "sequence", "confidence")
+
     def __init__(self, refWindow, sequence, confidence):
         assert (len(sequence) ==
                 len(confidence))
         self.refWindow  = refWindow
         self.sequence   = sequence
-        self.confidence = confidence
+        self.confidence = _asQvArray(confidence)
 
     def __cmp__(self, other):
         return cmp(self.refWindow, other.refWindow)
 
+    def _slotNames(self):
+        return [ name for cls in type(self).__mro__
+                      for name in getattr(cls, "__slots__", ()) ]
+
+    def __getstate__(self):
+        return [ getattr(self, name) for name in self._slotNames() ]
+
+    def __setstate__(self, state):
+        for name, value in zip(self._slotNames(), state):
+            setattr(self, name, value)
+
     #
     # Functions for calling the consensus for regions of inadequate
     # coverage
@@ -33,20 +50,17 @@ class Consensus(object):
     @classmethod
     def nAsConsensus(cls, refWin, referenceSequence):
         length = len(referenceSequence)
-        seq = np.empty(length, dtype="S1")
-        seq.fill("N")
-        conf = np.zeros(length, dtype=np.uint8)
-        return cls(refWin, seq.tostring(), conf)
+        return cls(refWin, _nSequence(length), _zeroConfidence(length))
 
     @classmethod
     def referenceAsConsensus(cls, refWin, referenceSequence):
-        conf = np.zeros(len(referenceSequence), dtype=np.uint8)
-        return cls(refWin, referenceSequence, conf)
+        return cls(refWin, referenceSequence,
+                   _zeroConfidence(len(referenceSequence)))
 
     @classmethod
     def lowercaseReferenceAsConsensus(cls, refWin, referenceSequence):
-        conf = np.zeros(len(referenceSequence), dtype=np.uint8)
-        return cls(refWin, referenceSequence.lower(), conf)
+        return cls(refWin, referenceSequence.lower(),
+                   _zeroConfidence(len(referenceSequence)))
 
     @classmethod
     def noCallConsensus(cls, noCallStyle, refWin, refSequence):
@@ -71,6 +85,8 @@ class QuiverConsensus(Consensus):
     is the ConsensusCore MultiReadMutationScorer object, which can be
     used to perform some post-hoc analyses (diploid, sample mixture, etc)
     """
+    __slots__ = ("mms",)
+
     def __init__(self, refWindow, sequence, confidence, mms=None):
         super(QuiverConsensus, self).__init__(refWindow, sequence, confidence)
         self.mms = mms
@@ -82,6 +98,8 @@ class ArrowConsensus(Consensus):
     is the ConsensusCore2 abstract integrator object, which can be used
     to perform some post-hoc analyses (diploid, sample mixture, etc)
     """
+    __slots__ = ("ai",)
+
     def __init__(self, refWindow, sequence, confidence, ai=None):
         super(ArrowConsensus, self).__init__(refWindow, sequence, confidence)
         self.ai = ai
@@ -119,21 +137,64 @@ def join(consensi):
     contiguous.
     """
     assert len(consensi) >= 1
-    sortedConsensi = sorted(consensi)
+    sortedConsensi = sorted(consensi, key=lambda cssChunk: cssChunk.refWindow)
     if not areContiguous([cssChunk.refWindow for cssChunk in sortedConsensi]):
         raise ValueError("Consensus chunks must be contiguous")
 
     joinedRefWindow  = (sortedConsensi[0].refWindow[0],
                         sortedConsensi[0].refWindow[1],
                         sortedConsensi[-1].refWindow[2])
+    if len(sortedConsensi) == 1:
+        return Consensus(joinedRefWindow,
+                         sortedConsensi[0].sequence,
+                         sortedConsensi[0].confidence)
+
     joinedSeq        = "".join([cssChunk.sequence for cssChunk in sortedConsensi])
-    joinedConfidence = np.concatenate([cssChunk.confidence for cssChunk in sortedConsensi])
+    joinedConfidence = np.empty(len(joinedSeq), dtype=np.uint8)
+    offset = 0
+    for cssChunk in sortedConsensi:
+        length = len(cssChunk.confidence)
+        joinedConfidence[offset:offset+length] = cssChunk.confidence
+        offset += length
 
     return Consensus(joinedRefWindow,
                      joinedSeq,
                      joinedConfidence)
 
 
+#
+# Compact storage
+#
+
+def _asQvArray(confidence):
+    confidence = np.asarray(confidence)
+    if confidence.dtype != np.uint8:
+        confidence = np.clip(confidence, 0, 255).astype(np.uint8)
+    return confidence
+
+# Read-only zero QVs, shared by all the no-call consensi; grown as
+# longer windows are seen
+_zeroQvs = np.zeros(0, dtype=np.uint8)
+
+def _zeroConfidence(length):
+    global _zeroQvs
+    if len(_zeroQvs) < length:
+        _zeroQvs = np.zeros(max(length, 2*len(_zeroQvs)), dtype=np.uint8)
+        _zeroQvs.setflags(write=False)
+    return _zeroQvs[:length]
+
+# "N" runs of the window lengths seen (mostly the chunk size)
+_nSequences = {}
+
+def _nSequence(length):
+    seq = _nSequences.get(length)
+    if seq is None:
+        seq = "N" * length
+        if len(_nSequences) < 64:
+            _nSequences[length] = seq
+    return seq
+
+
 #
 # Naming convention for consensus contigs
 #
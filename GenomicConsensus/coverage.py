@@ -0,0 +1,215 @@
+# coverage.py: genome-wide read coverage profiles
+#
+#  A coverage profile is run-length encoded: for each reference
+#  (keyed by tId) we keep the sorted positions at which the coverage
+#  changes, and the coverage from each of those positions up to the
+#  next one.  Coverage is zero before the first position and from
+#  the last one on.
+#
+from __future__ import absolute_import, division, print_function
+
+import hashlib, logging, os, os.path
+import numpy as np
+
+__all__ = [ "RunsByContig",
+            "CoverageProfile",
+            "indexChecksum",
+            "loadCoverageProfile" ]
+
+class RunsByContig(object):
+    """
+    Coverage runs for all references, concatenated in tId order, with
+    the offset at which each reference's runs begin.  The runs of any
+    one reference are thus a slice, found by binary search on tId.
+    """
+    def __init__(self, ids, offsets, positions, values):
+        self.ids       = ids
+        self.offsets   = offsets
+        self.positions = positions
+        self.values    = values
+
+    @staticmethod
+    def fromReads(tId, tStart, tEnd):
+        """
+        Run-length encode the coverage of the reads, for all
+        references in a single pass.
+        """
+        ids       = np.concatenate((tId, tId)).astype(int)
+        positions = np.concatenate((tStart, tEnd)).astype(int)
+        deltas    = np.concatenate((np.ones(len(tStart), dtype=int),
+                                    -np.ones(len(tEnd), dtype=int)))
+        order = np.lexsort((positions, ids))
+        ids, positions = ids[order], positions[order]
+        # Every reference contributes as many ends as starts, so the
+        # running total returns to zero at each reference boundary.
+        values = np.cumsum(deltas[order])
+
+        # Keep the last event at each (tId, position)
+        last = np.ones(len(ids), dtype=bool)
+        last[:-1] = (ids[1:] != ids[:-1]) | (positions[1:] != positions[:-1])
+        ids, positions, values = ids[last], positions[last], values[last]
+
+        # Drop runs that do not change the coverage
+        keep = np.ones(len(ids), dtype=bool)
+        keep[1:] = (ids[1:] != ids[:-1]) | (values[1:] != values[:-1])
+        ids, positions, values = ids[keep], positions[keep], values[keep]
+
+        contigIds, offsets = np.unique(ids, return_index=True)
+        return RunsByContig(contigIds,
+                            np.append(offsets, len(ids)),
+                            positions, values)
+
+    def runs(self, tId):
+        """
+        (positions, values) for the reference
+        """
+        i = np.searchsorted(self.ids, tId)
+        if i < len(self.ids) and self.ids[i] == tId:
+            s, e = self.offsets[i], self.offsets[i+1]
+        else:
+            s = e = 0
+        return self.positions[s:e], self.values[s:e]
+
+
+class CoverageProfile(object):
+    """
+    Run-length encoded per-reference coverage, over all reads and over
+    the reads with mapQV >= `minMapQV`.
+    """
+    def __init__(self, minMapQV, allReads, filteredReads, checksum=None):
+        self.minMapQV       = minMapQV
+        self.checksum       = checksum
+        self._allReads      = allReads
+        self._filteredReads = filteredReads
+
+    @staticmethod
+    def fromIndex(tId, tStart, tEnd, mapQV, minMapQV, checksum=None):
+        good = mapQV >= minMapQV
+        return CoverageProfile(minMapQV,
+                               RunsByContig.fromReads(tId, tStart, tEnd),
+                               RunsByContig.fromReads(tId[good], tStart[good], tEnd[good]),
+                               checksum)
+
+    @staticmethod
+    def fromAlignmentFile(alnFile, minMapQV, checksum=None):
+        return CoverageProfile.fromIndex(alnFile.tId,
+                                         alnFile.index.tStart,
+                                         alnFile.index.tEnd,
+                                         alnFile.mapQV,
+                                         minMapQV, checksum)
+
+    def _runs(self, tId, filtered):
+        return (self._filteredReads if filtered else self._allReads).runs(tId)
+
+    def coverageInWindow(self, tId, winStart, winEnd, filtered=True):
+        """
+        Coverage at each position of [winStart, winEnd) as an array
+        """
+        positions, values = self._runs(tId, filtered)
+        coverage = np.zeros(winEnd - winStart, dtype=int)
+        run = np.searchsorted(positions, np.arange(winStart, winEnd), side="right") - 1
+        covered = run >= 0
+        coverage[covered] = values[run[covered]]
+        return coverage
+
+    def coverageRuns(self, tId, winStart, winEnd, filtered=True):
+        """
+        The coverage of [winStart, winEnd) as runs: (coverage,
+        length) arrays, the lengths summing to the window length
+        """
+        positions, values = self._runs(tId, filtered)
+        inside = positions[(positions > winStart) & (positions < winEnd)]
+        starts = np.concatenate(([winStart], inside))
+        ends   = np.concatenate((inside, [winEnd]))
+        coverage = np.zeros(len(starts), dtype=int)
+        run = np.searchsorted(positions, starts, side="right") - 1
+        covered = run >= 0
+        coverage[covered] = values[run[covered]]
+        return coverage, ends - starts
+
+    def kCoveredIntervals(self, tId, k, winStart, winEnd, filtered=True):
+        """
+        Maximal intervals within [winStart, winEnd) where the coverage
+        is at least k, as a sorted list of (start, end) tuples.
+        """
+        positions, values = self._runs(tId, filtered)
+        # Run i covers [positions[i], positions[i+1])
+        good = values[:-1] >= k
+        runStarts = positions[:-1][good].clip(winStart, winEnd)
+        runEnds   = positions[1:][good].clip(winStart, winEnd)
+        nonEmpty  = runStarts < runEnds
+        runStarts, runEnds = runStarts[nonEmpty], runEnds[nonEmpty]
+        if len(runStarts) == 0:
+            return []
+        # Merge abutting runs
+        breaks = np.flatnonzero(runStarts[1:] != runEnds[:-1])
+        starts = runStarts[np.concatenate(([0], breaks + 1))]
+        ends   = runEnds[np.concatenate((breaks, [len(runEnds) - 1]))]
+        return zip(starts.tolist(), ends.tolist())
+
+    def save(self, filename):
+        """
+        Save the profile.  It is written under a temporary name and
+        renamed into place, so concurrent runs saving the same profile
+        never leave (or read) a partial file.
+        """
+        arrays = {}
+        for label, runs in (("all", self._allReads),
+                            ("filtered", self._filteredReads)):
+            for name in ("ids", "offsets", "positions", "values"):
+                arrays[label + "_" + name] = getattr(runs, name)
+        temporaryFilename = "%s.%d.tmp" % (filename, os.getpid())
+        try:
+            with open(temporaryFilename, "wb") as f:
+                np.savez(f, minMapQV=self.minMapQV, checksum=str(self.checksum), **arrays)
+            os.rename(temporaryFilename, filename)
+        except Exception:
+            if os.path.exists(temporaryFilename):
+                os.remove(temporaryFilename)
+            raise
+
+    @staticmethod
+    def load(filename):
+        with np.load(filename) as data:
+            def runs(label):
+                return RunsByContig(*[ data[label + "_" + name]
+                                       for name in ("ids", "offsets", "positions", "values") ])
+            return CoverageProfile(int(data["minMapQV"]),
+                                   runs("all"),
+                                   runs("filtered"),
+                                   str(data["checksum"]))
+
+
+def indexChecksum(alnFile):
+    """
+    Checksum of the index columns a coverage profile is computed from
+    """
+    md5 = hashlib.md5()
+    for column in (alnFile.tId, alnFile.index.tStart,
+                   alnFile.index.tEnd, alnFile.mapQV):
+        md5.update(np.ascontiguousarray(column).tobytes())
+    return md5.hexdigest()
+
+def loadCoverageProfile(alnFile, minMapQV, cacheDirectory=None):
+    """
+    Compute the coverage profile of the alignment file, or load it
+    from the sidecar file in `cacheDirectory`, if one was saved there
+    for the same index.
+    """
+    if cacheDirectory is None:
+        return CoverageProfile.fromAlignmentFile(alnFile, minMapQV)
+
+    checksum = indexChecksum(alnFile)
+    sidecar = os.path.join(cacheDirectory,
+                           "coverage-%s-mapqv%d.npz" % (checksum, minMapQV))
+    if os.path.exists(sidecar):
+        logging.info("Loading coverage profile from %s" % sidecar)
+        return CoverageProfile.load(sidecar)
+
+    profile = CoverageProfile.fromAlignmentFile(alnFile, minMapQV, checksum)
+    try:
+        profile.save(sidecar)
+        logging.info("Saved coverage profile to %s" % sidecar)
+    except (IOError, OSError) as e:
+        logging.warn("Could not save coverage profile to %s: %s" % (sidecar, e))
+    return profile
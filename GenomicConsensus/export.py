@@ -0,0 +1,136 @@
+"""
+variantCaller export: write the outputs of a run from its result store
+(see --resultStore), at any filtering thresholds, without recomputing
+the consensus.
+"""
+from __future__ import absolute_import, division, print_function
+
+import argparse, logging, sys
+import numpy as np
+from collections import OrderedDict
+
+from GenomicConsensus import reference, consensus
+from GenomicConsensus.utils import fileFormat
+from GenomicConsensus.io.ResultStore import ResultStore
+from GenomicConsensus.io.VariantsGffWriter import VariantsGffWriter
+from GenomicConsensus.io.VariantsVcfWriter import VariantsVcfWriter
+from GenomicConsensus.io.ConsensusWriters import StreamingFastaWriter, StreamingFastqWriter
+from GenomicConsensus.io.utils import openOutputFile
+
+def get_parser():
+    parser = argparse.ArgumentParser(prog="variantCaller export", description=__doc__)
+    parser.add_argument(
+        "resultStore",
+        help="The result store directory written by variantCaller --resultStore")
+    parser.add_argument(
+        "-o", "--outputFilename",
+        dest="outputFilenames",
+        required=True,
+        action="append",
+        default=[],
+        help="The output filename(s).  Valid output formats are .fa/.fasta, " + \
+             ".fq/.fastq, .gff, .vcf (add .gz for bgzip-compressed output)")
+    parser.add_argument(
+        "--minConfidence", "-q",
+        dest="minConfidence",
+        type=int,
+        default=None,
+        help="The minimum confidence for a variant call to be output (by default, " + \
+             "that of the run).  Variants the run did not call cannot be recovered.")
+    parser.add_argument(
+        "--minCoverage", "-x",
+        dest="minCoverage",
+        type=int,
+        default=None,
+        help="The minimum coverage for a variant call to be output (by default, " + \
+             "that of the run)")
+    parser.add_argument(
+        "--compressionThreads",
+        dest="compressionThreads",
+        type=int,
+        default=1,
+        help="The number of threads compressing each .gz output file")
+    return parser
+
+def loadReference(store):
+    """
+    Point the reference module at the contigs recorded in the store;
+    only their names and lengths are needed to write the outputs.
+    """
+    reference.byName = OrderedDict(
+        (name, reference.ReferenceContig(i, name, fullName, "", length))
+        for (i, (name, fullName, length)) in enumerate(store.contigs))
+    reference.filename = store.options["referenceFilename"]
+
+def exportVariants(store, writers):
+    variants = store.variants()
+    contigIndex = dict((name, i) for (i, (name, _, _)) in enumerate(store.contigs))
+    codeToContig = np.array([ contigIndex.get(s, -1) for s in variants.strings ] + [-1])
+    rowContigs = codeToContig[variants.rows["refId"]]
+    for i in xrange(len(store.contigs)):
+        contigVariants = variants[rowContigs == i].sorted()
+        for writer in writers:
+            writer.writeVariants(contigVariants)
+
+def exportConsensus(store, fastaWriter, fastqWriter):
+    for span in store.spans:
+        cssName = consensus.consensusContigName(reference.spanName(span),
+                                                store.algorithmName)
+        if fastaWriter: fastaWriter.beginRecord(cssName)
+        if fastqWriter: fastqWriter.beginRecord(cssName)
+        for i in store.windowsInSpan(span):
+            css = store.consensus(i)
+            if fastaWriter: fastaWriter.appendSequence(css.sequence)
+            if fastqWriter: fastqWriter.appendSequence(css.sequence, css.confidence)
+        if fastaWriter: fastaWriter.endRecord()
+        if fastqWriter: fastqWriter.endRecord()
+
+def exportResults(store, outputFilenames, optionsDict):
+    """
+    Write the outputs named from the store, applying the thresholds
+    in `optionsDict`
+    """
+    loadReference(store)
+    threads = optionsDict["compressionThreads"]
+    fastaWriter = fastqWriter = None
+    variantWriters = []
+    for filename in outputFilenames:
+        fmt = fileFormat(filename)
+        if fmt == "FASTA":
+            fastaWriter = StreamingFastaWriter(
+                openOutputFile(filename, threads),
+                None if filename.endswith(".gz") else filename + ".fai")
+        elif fmt == "FASTQ":
+            fastqWriter = StreamingFastqWriter(openOutputFile(filename, threads))
+        elif fmt == "GFF":
+            variantWriters.append(VariantsGffWriter(filename, optionsDict,
+                                                    reference.byName.values()))
+        elif fmt == "VCF":
+            variantWriters.append(VariantsVcfWriter(filename, optionsDict,
+                                                    reference.byName.values()))
+        else:
+            raise ValueError("Cannot export {f}: unsupported format".format(f=filename))
+
+    if variantWriters:
+        exportVariants(store, variantWriters)
+    if fastaWriter or fastqWriter:
+        exportConsensus(store, fastaWriter, fastqWriter)
+    for writer in [fastaWriter, fastqWriter] + variantWriters:
+        if writer: writer.close()
+
+def main(argv):
+    parser = get_parser()
+    args = parser.parse_args(argv)
+    if args.compressionThreads < 1:
+        parser.error("--compressionThreads must be at least 1.")
+    logging.basicConfig(level=logging.INFO, format="[%(levelname)s] %(message)s")
+    store = ResultStore(args.resultStore)
+    optionsDict = dict(store.options)
+    for name in ("minConfidence", "minCoverage"):
+        if getattr(args, name) is not None:
+            optionsDict[name] = getattr(args, name)
+    optionsDict["compressionThreads"] = args.compressionThreads
+    optionsDict["shellCommand"] = " ".join(sys.argv)
+    logging.info("Exporting %d windows from %s" % (len(store), args.resultStore))
+    exportResults(store, args.outputFilenames, optionsDict)
+    return 0
@@ -0,0 +1,212 @@
+from __future__ import absolute_import, division, print_function
+
+__all__ = ["AlignmentSummary", "RegionBins", "variantSummaryColumns"]
+
+import logging
+import numpy as np
+from collections import namedtuple, defaultdict
+
+from GenomicConsensus.io.utils import openMaybeGzipped
+
+#
+# Note: GFF-style coordinates
+#
+Region = namedtuple("Region", ("seqid", "start", "end"))
+
+# Variant types counted, by their counter names, in output order
+COUNTERS = (("deletion",     "del"),
+            ("insertion",    "ins"),
+            ("substitution", "sub"))
+INSERTION = 1
+
+# Placeholder consensus QVs, where none were recorded
+DEFAULT_CQV = (20, 20, 20)
+
+
+class RegionBins(object):
+    """
+    The region records of an alignment summary, with the start and
+    end coordinates of each contig's regions in sorted arrays.  Per
+    region we count the variant bases of each type (COUNTERS) and,
+    if asked to, keep a histogram of the consensus QVs.
+    """
+    def __init__(self, regions, trackConsensusQvs=False):
+        self.index = {}
+        for region in regions:
+            self.index.setdefault(region, len(self.index))
+        self.counts = np.zeros((len(self.index), len(COUNTERS)), dtype=int)
+        self.qvHistograms = None
+        if trackConsensusQvs:
+            self.qvHistograms = np.zeros((len(self.index), 256), dtype=np.int64)
+        self.byContig = {}
+        bySeqid = defaultdict(list)
+        for region, i in self.index.items():
+            bySeqid[region.seqid].append((region.start, region.end, i))
+        for seqid, rows in bySeqid.items():
+            starts, ends, indices = (np.array(column) for column in zip(*sorted(rows)))
+            self.byContig[seqid] = (starts, ends, indices)
+
+    def addVariants(self, seqid, starts, types, lengths):
+        """
+        Count a batch of variants on one contig, by their GFF start
+        coordinates: `types` indexes COUNTERS, `lengths` are added to
+        the counters.  Variants on a contig without regions, or outside
+        every region, are skipped with a warning.
+        """
+        if seqid not in self.byContig:
+            logging.warn("No alignment summary regions for contig '%s'; "
+                         "skipping %d variants" % (seqid, len(starts)))
+            return
+        regionStarts, regionEnds, indices = self.byContig[seqid]
+        idx = np.searchsorted(regionStarts, starts, side="right") - 1
+        # XXX we have to be a little careful here - an insertion at the start
+        # of a contig will have start=0 versus start=1 for the first region
+        idx[idx < 0] = 0
+        inRegion = ((regionStarts[idx] <= starts) & (starts <= regionEnds[idx])) | \
+                   ((regionStarts[idx] == 1) & (starts == 0) & (types == INSERTION))
+        if not inRegion.all():
+            bad = np.flatnonzero(~inRegion)
+            logging.warn("Skipping %d variants outside the alignment summary regions "
+                         "of contig '%s' (first %s at %d)" %
+                         (len(bad), seqid, COUNTERS[types[bad[0]]][0], starts[bad[0]]))
+            idx, types, lengths = idx[inRegion], types[inRegion], lengths[inRegion]
+        counts = np.bincount(indices[idx] * len(COUNTERS) + types, weights=lengths,
+                             minlength=self.counts.size)
+        self.counts += counts.astype(int).reshape(self.counts.shape)
+
+    def addQvs(self, seqid, positions, qvs):
+        """
+        Add consensus QVs at the (GFF, sorted) positions on a contig
+        to the histograms of the regions containing them
+        """
+        if seqid not in self.byContig or len(positions) == 0:
+            return
+        regionStarts, regionEnds, indices = self.byContig[seqid]
+        idx = np.searchsorted(regionStarts, positions, side="right") - 1
+        inRegion = (idx >= 0)
+        inRegion[inRegion] &= positions[inRegion] <= regionEnds[idx[inRegion]]
+        idx, qvs = idx[inRegion], np.asarray(qvs)[inRegion].astype(int)
+        if len(idx) == 0:
+            return
+        # The positions are sorted, so they fall in a run of regions
+        first, last = idx[0], idx[-1]
+        histograms = np.bincount((idx - first) * 256 + qvs,
+                                 minlength=(last - first + 1) * 256)
+        self.qvHistograms[indices[first:last+1]] += histograms.reshape(-1, 256)
+
+    def consensusQvs(self):
+        """
+        (min, median, max) consensus QV of each region, 0 where none
+        were added; None if QVs are not tracked
+        """
+        if self.qvHistograms is None:
+            return None
+        cumulative = np.cumsum(self.qvHistograms, axis=1)
+        total = cumulative[:, -1]
+        def quantile(rank):
+            return (cumulative < rank[:, None]).sum(axis=1)
+        qvs = np.column_stack([ quantile(np.ones_like(total)),
+                                quantile((total + 1) // 2),
+                                quantile(total) ])
+        qvs[total == 0] = 0
+        return qvs
+
+
+def variantSummaryColumns(variants):
+    """
+    The GFF start coordinates, COUNTERS type codes and lengths, as
+    counted in region summaries, of the variants in a VariantTable.
+    Variants of other types ("variant") get type code -1.  The length
+    is that of the longer of the GFF reference and variantSeq fields.
+    """
+    rows = variants.rows
+    lengths = np.array([ len(s) for s in variants.strings ] + [0], dtype=int)
+    lr = lengths[rows["refSeq"]]
+    l1 = lengths[rows["readSeq1"]]
+    l2 = lengths[rows["readSeq2"]]
+    het = rows["readSeq2"] >= 0
+
+    # As Variant.variantType, which takes an empty readSeq2 as absent
+    types = np.full(len(rows), -1, dtype=int)
+    isSubstitution = (l1 == lr) & (~het | (l2 == 0) | (l2 == lr))
+    types[isSubstitution] = 2
+    types[l1 == 0] = 0
+    types[lr == 0] = INSERTION
+
+    gffStarts = np.where(lr > 0, rows["refStart"] + 1, rows["refStart"])
+    # Empty fields are written as "."
+    referenceLengths = np.maximum(lr, 1)
+    variantSeqLengths = np.where(het, np.maximum(l1, 1) + 1 + np.maximum(l2, 1),
+                                 np.maximum(l1, 1))
+    return gffStarts, types, np.maximum(referenceLengths, variantSeqLengths)
+
+
+class AlignmentSummary(object):
+    """
+    An alignment summary GFF, to be augmented with variant counts and
+    consensus QVs for its region records.  It is small, so it is read
+    once, parsing just the coordinates of the region records; its
+    lines are passed through unchanged.
+    """
+    def __init__(self, filename, trackConsensusQvs=False):
+        with openMaybeGzipped(filename) as f:
+            self.lines = [ line.rstrip() for line in f if line.strip() ]
+        self.regionOfLine = {}
+        for i, line in enumerate(self.lines):
+            if line[0] != "#":
+                fields = line.split("\t", 5)
+                if fields[2] == "region":
+                    self.regionOfLine[i] = Region(fields[0], int(fields[3]), int(fields[4]))
+        self.bins = RegionBins(self.regionOfLine.values(), trackConsensusQvs)
+
+    def hasRegions(self, seqid):
+        return seqid in self.bins.byContig
+
+    def addConsensus(self, seqid, css):
+        """
+        Add the QVs of a Consensus chunk.  Where the consensus is not
+        the length of its reference window, its bases are spread
+        evenly over the window.
+        """
+        _, refStart, refEnd = css.refWindow
+        length = len(css.confidence)
+        positions = refStart + 1 + np.arange(length) * (refEnd - refStart) // max(length, 1)
+        self.bins.addQvs(seqid, positions, css.confidence)
+
+    def addVariants(self, seqid, variants):
+        """
+        Count the variants (a VariantTable) of the types counted
+        """
+        starts, types, lengths = variantSummaryColumns(variants)
+        counted = types >= 0
+        if counted.any():
+            self.bins.addVariants(seqid, starts[counted], types[counted], lengths[counted])
+
+    def write(self, filename, headers):
+        """
+        Write the augmented summary, with the tool's `headers`
+        (key, value) pairs
+        """
+        cQvs = self.bins.consensusQvs()
+        out = []
+        inHeader = True
+        for i, line in enumerate(self.lines):
+            # Pass any metadata line straight through
+            if line[0] == "#":
+                out.append(line.strip())
+                continue
+            if inHeader:
+                # We are at the end of the header -- write the tool-specific headers
+                out.extend("##%s %s" % (k, v) for k, v in headers)
+                inHeader = False
+            region = self.regionOfLine.get(i)
+            if region is not None:
+                r = self.bins.index[region]
+                cQv = DEFAULT_CQV if cQvs is None else cQvs[r]
+                line += ";cQv=%s" % ",".join(str(int(f)) for f in cQv)
+                line += "".join(";%s=%d" % (counterName, count)
+                                for ((_, counterName), count) in zip(COUNTERS,
+                                                                     self.bins.counts[r]))
+                out.append(line)
+        with open(filename, "w") as f:
+            f.write("\n".join(out) + "\n" if out else "")
@@ -0,0 +1,145 @@
+from __future__ import absolute_import, division, print_function
+
+__all__ = ["StreamingFastaWriter", "StreamingFastqWriter", "fastaIndexTotals"]
+
+import shutil, tempfile
+import numpy as np
+
+
+def qvsToAscii(qvs):
+    """
+    Phred+33 quality string for an array of QVs, capped at 93
+    """
+    return (np.minimum(qvs, 93).astype(np.uint8) + 33).tostring()
+
+
+class StreamingFastaWriter(object):
+    """
+    FASTA writer whose records are written a segment at a time: a
+    record is opened with beginRecord, its sequence appended in
+    order, and closed with endRecord, so the full sequence is never
+    held in memory.  The output is that of pbcore's FastaWriter
+    (sequence wrapped at 60 columns).
+
+    The writer keeps the offset and length of each record as it goes,
+    and if given an `indexFilename` writes the samtools .fai index
+    there on close, sparing a second pass over the file.
+    """
+    COLUMNS = 60
+
+    def __init__(self, f, indexFilename=None):
+        self.file = open(f, "w") if isinstance(f, basestring) else f
+        self._indexFilename = indexFilename
+        self._index = []
+        self._offset = 0
+        self._inRecord = False
+        self._wroteLine = False
+        self._partialLine = ""
+
+    def _write(self, data):
+        self.file.write(data)
+        self._offset += len(data)
+
+    def beginRecord(self, name):
+        assert not self._inRecord
+        self._write(">" + name + "\n")
+        # (name, length, offset of the sequence); faidx names a
+        # record by the first word of its header
+        self._index.append([(name.split() or [""])[0], 0, self._offset])
+        self._inRecord = True
+        self._wroteLine = False
+        self._partialLine = ""
+
+    def appendSequence(self, sequence):
+        assert self._inRecord
+        self._index[-1][1] += len(sequence)
+        data = self._partialLine + sequence
+        end = len(data) - len(data) % self.COLUMNS
+        if end:
+            lines = [ data[i:i+self.COLUMNS] for i in xrange(0, end, self.COLUMNS) ]
+            self._write(("\n" if self._wroteLine else "") + "\n".join(lines))
+            self._wroteLine = True
+        self._partialLine = data[end:]
+
+    def endRecord(self):
+        assert self._inRecord
+        if self._partialLine:
+            self._write(("\n" if self._wroteLine else "") + self._partialLine)
+        self._write("\n")
+        self._inRecord = False
+
+    def indexLines(self):
+        """
+        The .fai lines (name, length, offset, bases per line, bytes
+        per line) of the records written so far
+        """
+        lines = []
+        for name, length, offset in self._index:
+            lineBases = min(length, self.COLUMNS)
+            lines.append("%s\t%d\t%d\t%d\t%d\n" % (name, length, offset,
+                                                    lineBases, lineBases + 1))
+        return lines
+
+    def writeRecord(self, name, sequence):
+        self.beginRecord(name)
+        self.appendSequence(sequence)
+        self.endRecord()
+
+    def close(self):
+        assert not self._inRecord
+        self.file.close()
+        if self._indexFilename is not None:
+            with open(self._indexFilename, "w") as f:
+                f.writelines(self.indexLines())
+
+
+class StreamingFastqWriter(object):
+    """
+    FASTQ writer whose records are written a segment at a time, as
+    StreamingFastaWriter.  The sequence goes straight to the output;
+    the qualities, which follow the whole sequence in a FASTQ record,
+    are spilled to a temporary file and copied out by endRecord.
+    """
+    def __init__(self, f, temporaryDirectory=None):
+        self.file = open(f, "w") if isinstance(f, basestring) else f
+        self._temporaryDirectory = temporaryDirectory
+        self._qualities = None
+
+    def beginRecord(self, name):
+        assert self._qualities is None
+        self.file.write("@" + name + "\n")
+        self._qualities = tempfile.TemporaryFile(dir=self._temporaryDirectory)
+
+    def appendSequence(self, sequence, qvs):
+        assert len(sequence) == len(qvs)
+        self.file.write(sequence)
+        self._qualities.write(qvsToAscii(qvs))
+
+    def endRecord(self):
+        self.file.write("\n+\n")
+        self._qualities.seek(0)
+        shutil.copyfileobj(self._qualities, self.file)
+        self._qualities.close()
+        self._qualities = None
+        self.file.write("\n")
+
+    def writeRecord(self, name, sequence, qvs):
+        self.beginRecord(name)
+        self.appendSequence(sequence, qvs)
+        self.endRecord()
+
+    def close(self):
+        assert self._qualities is None
+        self.file.close()
+
+
+def fastaIndexTotals(indexFilename):
+    """
+    (number of records, total sequence length) from a .fai index
+    """
+    numRecords = totalLength = 0
+    with open(indexFilename) as f:
+        for line in f:
+            numRecords += 1
+            totalLength += int(line.split("\t")[1])
+    return numRecords, totalLength
@@ -0,0 +1,152 @@
+from __future__ import absolute_import, division, print_function
+
+__all__ = ["convertGff", "vcfRecords", "variantBedRecords", "coverageBedRecords"]
+
+import sys
+from collections import deque
+from itertools import islice
+from multiprocessing import Pool
+
+from GenomicConsensus.io.utils import openMaybeGzipped
+
+#
+# Streaming conversion of GFF files to the VCF and BED records of the
+# gffToVcf and gffToBed tools.  GFF lines are read in batches, and each
+# batch is converted to one block of output text: the lines are split
+# on tabs and only the attributes needed are looked up, and formatted
+# confidences are memoized, as they repeat.  Batches
+# may be converted by a pool of worker processes; blocks are written
+# in input order.
+#
+
+BATCH_SIZE = 50000
+
+def _attributes(attributeString):
+    return dict(kv.split("=", 1) for kv in attributeString.split(";") if kv)
+
+def _records(lines):
+    # (fields, attributes) of the records among the lines
+    for line in lines:
+        if line[0] == "#" or not line.strip():
+            continue
+        fields = line.rstrip("\r\n").split("\t", 8)
+        yield fields, _attributes(fields[8])
+
+def _unsupported(feature):
+    print("Unsupported feature %s found in GFF3 file." % feature, file=sys.stderr)
+
+def _block(out):
+    return "\n".join(out) + "\n" if out else ""
+
+def vcfRecords(lines):
+    """
+    The VCF 3.3 record lines, as one block of text, of the variant GFF
+    records among `lines`
+    """
+    out = []
+    quals = {}
+    for fields, attributes in _records(lines):
+        feature = fields[2]
+        if feature == "insertion":
+            alt = "I" + attributes["variantSeq"].upper()
+        elif feature == "deletion":
+            alt = "D%d" % len(attributes["reference"])
+        elif feature == "substitution":
+            alt = attributes["variantSeq"].upper()
+        else:
+            _unsupported(feature)
+            alt = ""
+        confidence = attributes["confidence"]
+        qual = quals.get(confidence)
+        if qual is None:
+            qual = quals[confidence] = "%.2f" % float(confidence)
+        out.append("%s\t%d\t.\t%s\t%s\t%s\t0\tNS=1;DP=%s" %
+                   (fields[0], int(fields[3]), attributes.get("reference", "N"),
+                    alt, qual, attributes["coverage"]))
+    return _block(out)
+
+def variantBedRecords(lines):
+    """
+    The BED record lines, as one block of text, of the variant GFF
+    records among `lines`
+    """
+    out = []
+    scores = {}
+    for fields, attributes in _records(lines):
+        feature = fields[2]
+        # GFF3 coordinates are 1-based and inclusive,
+        # BED coordinates are 0-based and exclusive
+        start = int(fields[3])
+        if feature == "insertion":
+            end = start
+            name = "%d_%dins%s" % (start, start + 1, attributes["variantSeq"])
+        elif feature == "deletion":
+            featureLength = len(attributes["reference"])
+            end = start - 1 + featureLength
+            if featureLength == 1:
+                name = "%ddel" % start
+            else:
+                name = "%d_%ddel" % (start, end)
+        elif feature == "substitution":
+            end = start
+            name = "%d%s>%s" % (start, attributes["reference"], attributes["variantSeq"])
+        else:
+            _unsupported(feature)
+            end, name = 0, ""
+        confidence = attributes["confidence"]
+        score = scores.get(confidence)
+        if score is None:
+            score = scores[confidence] = "%.3f" % float(confidence)
+        out.append("%s\t%d\t%d\t%s\t%s\t%s" %
+                   (fields[0], start - 1, end, name, score, fields[6]))
+    return _block(out)
+
+def coverageBedRecords(lines):
+    """
+    The mean coverage BED record lines, as one block of text, of the
+    region records of the alignment summary GFF lines `lines`
+    """
+    out = []
+    for fields, attributes in _records(lines):
+        meanCoverage = float(attributes["cov2"].split(",", 1)[0])
+        out.append("%s\t%d\t%d\tmeanCov\t%.3f\t%s" %
+                   (fields[0], int(fields[3]) - 1, int(fields[4]), meanCoverage, fields[6]))
+    return _block(out)
+
+def _lineBatches(f, batchSize):
+    while True:
+        batch = list(islice(f, batchSize))
+        if not batch:
+            return
+        yield batch
+
+def convertGff(filename, out, convertBatch, numWorkers=1, batchSize=BATCH_SIZE):
+    """
+    Write the conversion of the GFF (or GFF.gz) file to `out`, by
+    applying `convertBatch`, a module-level function mapping a list of
+    lines to a block of text, to successive batches of lines, in
+    `numWorkers` processes
+    """
+    with openMaybeGzipped(filename) as f:
+        batches = _lineBatches(f, batchSize)
+        if numWorkers <= 1:
+            for batch in batches:
+                out.write(convertBatch(batch))
+            return
+        pool = Pool(numWorkers)
+        try:
+            # Bound the batches in flight, or the pool would read ahead
+            # through the whole file
+            pending = deque()
+            for batch in batches:
+                pending.append(pool.apply_async(convertBatch, (batch,)))
+                if len(pending) >= 2 * numWorkers:
+                    out.write(pending.popleft().get())
+            while pending:
+                out.write(pending.popleft().get())
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
@@ -0,0 +1,225 @@
+from __future__ import absolute_import, division, print_function
+
+__all__ = ["ResultStoreWriter", "ResultStore"]
+
+import json, os, os.path, struct
+import numpy as np
+
+from GenomicConsensus.consensus import Consensus
+from GenomicConsensus.variants import VariantTable
+
+#
+# A result store is a directory of .npy columns, written as windows
+# complete and memory-mapped by readers:
+#
+#   sequence.npy    consensus bases of all windows, concatenated (S1)
+#   confidence.npy  consensus QVs, likewise (uint8)
+#   windows.npy     one row per window (WINDOW_DTYPE): its reference
+#                   span and the slices of the sequence, confidence
+#                   and variants columns holding its results
+#   variants.npy    variant rows (VariantTable.DTYPE), with string
+#                   codes into
+#   strings.npy     the pool of allele and contig name strings
+#   metadata.json   the contigs, the spans analyzed, the algorithm,
+#                   the run options the outputs depend on, and the
+#                   (rare) variant annotations
+#
+# Windows are stored in the order they complete.  The consensus of a
+# window maps onto its reference span as a whole; the algorithms do not
+# report a finer consensus-to-reference map.
+#
+FORMAT_VERSION = 1
+
+WINDOW_DTYPE = np.dtype([("contig",       np.int32),
+                         ("refStart",     np.int64),
+                         ("refEnd",       np.int64),
+                         ("cssStart",     np.int64),
+                         ("cssEnd",       np.int64),
+                         ("variantStart", np.int64),
+                         ("variantEnd",   np.int64)])
+
+# Run options recorded in the store, for the output headers
+STORED_OPTIONS = ("minConfidence", "minCoverage", "diploid",
+                  "inputFilename", "referenceFilename")
+
+
+def _npyHeader(dtype, length, size=None):
+    # A version 1.0 .npy header for a 1-d array, padded with spaces to
+    # `size` bytes, or to the smallest multiple of 64 that fits
+    header = "{'descr': %r, 'fortran_order': False, 'shape': (%d,), }" % (
+        np.lib.format.dtype_to_descr(dtype), length)
+    if size is None:
+        size = -(-(len(header) + 11) // 64) * 64
+    assert len(header) + 11 <= size
+    return ("\x93NUMPY\x01\x00" + struct.pack("<H", size - 10) +
+            header + " " * (size - len(header) - 11) + "\n")
+
+class _ColumnWriter(object):
+    """
+    Appends to a 1-d .npy file whose length is not known in advance:
+    the header is written with room for any length and filled in by
+    close
+    """
+    def __init__(self, filename, dtype):
+        self.dtype = np.dtype(dtype)
+        self.length = 0
+        self._file = open(filename, "wb")
+        self._headerSize = len(_npyHeader(self.dtype, 2**62))
+        self._file.write(_npyHeader(self.dtype, 0, self._headerSize))
+
+    def append(self, values):
+        values = np.ascontiguousarray(values, dtype=self.dtype)
+        self._file.write(values.tostring())
+        self.length += len(values)
+
+    def close(self):
+        self._file.seek(0)
+        self._file.write(_npyHeader(self.dtype, self.length, self._headerSize))
+        self._file.close()
+
+def _loadColumn(filename):
+    try:
+        return np.load(filename, mmap_mode="r")
+    except ValueError:
+        # An empty column cannot be mapped
+        return np.load(filename)
+
+
+class ResultStoreWriter(object):
+    """
+    Writes the consensus and variants of each window to a result
+    store, as the windows complete.
+    """
+    def __init__(self, directory, contigs, spans, algorithmName, optionsDict):
+        """
+        `contigs` are the reference contigs (ReferenceContig) results
+        may refer to, `spans` the (refId, start, end) spans analyzed.
+        """
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.directory = directory
+        self._contigs = list(contigs)
+        self._contigIndex = dict((contig.name, i) for (i, contig) in enumerate(self._contigs))
+        self._metadata = {
+            "formatVersion" : FORMAT_VERSION,
+            "algorithm"     : algorithmName,
+            "contigs"       : [ (c.name, c.fullName, c.length) for c in self._contigs ],
+            "spans"         : [ (self._contigIndex[refId], s, e) for (refId, s, e) in spans ],
+            "options"       : dict((name, optionsDict.get(name)) for name in STORED_OPTIONS) }
+        self._strings = []
+        self._stringCodes = {}
+        self._annotations = []
+        self._windows = []
+        self._sequence = _ColumnWriter(self._path("sequence.npy"), "S1")
+        self._confidence = _ColumnWriter(self._path("confidence.npy"), np.uint8)
+        self._variants = _ColumnWriter(self._path("variants.npy"), VariantTable.DTYPE)
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _internedRows(self, variants):
+        # The table's rows with string codes into the store's pool
+        remap = np.empty(len(variants.strings) + 1, dtype=np.int32)
+        remap[-1] = -1
+        for code, s in enumerate(variants.strings):
+            stored = self._stringCodes.get(s)
+            if stored is None:
+                stored = self._stringCodes[s] = len(self._strings)
+                self._strings.append(s)
+            remap[code] = stored
+        rows = variants.rows.copy()
+        for field in VariantTable.STRING_FIELDS:
+            rows[field] = remap[rows[field]]
+        return rows
+
+    def addWindow(self, window, css, variants):
+        """
+        Store the results of a window: its Consensus and VariantTable
+        """
+        refId, refStart, refEnd = window
+        cssStart, variantStart = self._sequence.length, self._variants.length
+        self._sequence.append(np.frombuffer(css.sequence, dtype="S1"))
+        self._confidence.append(css.confidence)
+        self._variants.append(self._internedRows(variants))
+        if variants.annotations is not None:
+            for i, annotations in enumerate(variants.annotations):
+                if annotations:
+                    self._annotations.append((variantStart + i, annotations))
+        self._windows.append((self._contigIndex[refId], refStart, refEnd,
+                              cssStart, self._sequence.length,
+                              variantStart, self._variants.length))
+
+    def close(self):
+        for column in (self._sequence, self._confidence, self._variants):
+            column.close()
+        np.save(self._path("windows.npy"), np.array(self._windows, dtype=WINDOW_DTYPE))
+        np.save(self._path("strings.npy"), (np.array(self._strings, dtype=str) if self._strings
+                                            else np.empty(0, dtype="S1")))
+        self._metadata["annotations"] = self._annotations
+        with open(self._path("metadata.json"), "w") as f:
+            json.dump(self._metadata, f)
+
+
+class ResultStore(object):
+    """
+    Read access to a result store.  The large columns are memory
+    mapped, so opening a store is cheap and windows are read on demand.
+    """
+    def __init__(self, directory):
+        def path(name):
+            return os.path.join(directory, name)
+        with open(path("metadata.json")) as f:
+            metadata = json.load(f)
+        if metadata["formatVersion"] != FORMAT_VERSION:
+            raise IOError("Unsupported result store format version %r in %s" %
+                          (metadata["formatVersion"], directory))
+        self.directory     = directory
+        self.algorithmName = str(metadata["algorithm"])
+        self.contigs       = [ (str(name), str(fullName), length)
+                               for (name, fullName, length) in metadata["contigs"] ]
+        self.spans         = [ (self.contigs[i][0], s, e) for (i, s, e) in metadata["spans"] ]
+        self.options       = dict((str(k), v) for (k, v) in metadata["options"].items())
+        self._annotations  = metadata["annotations"]
+        self.windows       = np.load(path("windows.npy"))
+        self.sequence      = _loadColumn(path("sequence.npy"))
+        self.confidence    = _loadColumn(path("confidence.npy"))
+        self._rows         = _loadColumn(path("variants.npy"))
+        self._strings      = np.array(np.load(path("strings.npy")).tolist(), dtype=object)
+
+    def __len__(self):
+        return len(self.windows)
+
+    def window(self, i):
+        w = self.windows[i]
+        return (self.contigs[w["contig"]][0], int(w["refStart"]), int(w["refEnd"]))
+
+    def consensus(self, i):
+        """
+        The Consensus of the i'th window
+        """
+        w = self.windows[i]
+        return Consensus(self.window(i),
+                         self.sequence[w["cssStart"]:w["cssEnd"]].tostring(),
+                         self.confidence[w["cssStart"]:w["cssEnd"]])
+
+    def variants(self):
+        """
+        All the variants, as a VariantTable, in window order
+        """
+        annotations = None
+        if self._annotations:
+            annotations = np.empty(len(self._rows), dtype=object)
+            for i, pairs in self._annotations:
+                annotations[i] = [ (str(k), str(v)) for (k, v) in pairs ]
+        return VariantTable(np.array(self._rows), self._strings, annotations)
+
+    def windowsInSpan(self, span):
+        """
+        Indices of the windows within the span, in reference order
+        """
+        refId, s, e = span
+        contig = [ name for (name, _, _) in self.contigs ].index(refId)
+        w = self.windows
+        mine = np.flatnonzero((w["contig"] == contig) &
+                              (w["refStart"] >= s) & (w["refEnd"] <= e))
+        return mine[np.argsort(w["refStart"][mine], kind="mergesort")]
@@ -0,0 +1,102 @@
+from __future__ import absolute_import, division, print_function
+
+__all__ = ["StripeReader"]
+
+import numpy as np
+
+class StripeReader(object):
+    """
+    Sequential supply of alignments for a contiguous stripe of a
+    reference contig.
+
+    The alignments overlapping the stripe are located once, using the
+    index, and are then decoded in coordinate order as the caller
+    moves through the stripe, so that each record is decoded at most
+    once per stripe rather than once for every window it overlaps
+    (see tests/bench/stripeReader.py).  Records are still fetched by
+    row number, each from its own offset in the file; whether a
+    compressed block is inflated only once is up to the reader's
+    caching.  Decoded records are retained until the caller declares
+    (via `advanceTo`) that no later window will start before their
+    end.
+
+    The reader stands in for the alignment file in `readsInWindow`:
+    it answers `readsInRange(..., justIndices=True)` and row-number
+    lookups for windows inside the stripe, and delegates everything
+    else (index columns, windows outside the stripe) to the
+    underlying alignment file.
+    """
+    def __init__(self, alnFile, stripeWindow):
+        refId, start, end = stripeWindow
+        self._alnFile = alnFile
+        self._window  = stripeWindow
+
+        rows = np.array(list(alnFile.readsInRange(refId, start, end,
+                                                  justIndices=True)), dtype=int)
+        tStart = alnFile.index.tStart[rows]
+        order = np.lexsort((rows, tStart))
+        self._rows   = rows[order]
+        self._tStart = tStart[order]
+        self._tEnd   = alnFile.index.tEnd[self._rows]
+        self._positionOfRow = dict(zip(self._rows.tolist(),
+                                       xrange(len(self._rows))))
+
+        self._frontier  = 0      # rows [0, frontier) have been visited
+        self._lowWater  = start  # no window will start before this
+        self._records   = {}     # row number -> decoded record
+
+    @property
+    def window(self):
+        return self._window
+
+    def __getattr__(self, name):
+        return getattr(self._alnFile, name)
+
+    def _inStripe(self, refId, start, end):
+        stripeId, stripeStart, stripeEnd = self._window
+        return (refId == stripeId and
+                stripeStart <= start and end <= stripeEnd)
+
+    def readsInRange(self, refId, start, end, justIndices=False):
+        if not (justIndices and self._inStripe(refId, start, end)):
+            return self._alnFile.readsInRange(refId, start, end,
+                                              justIndices=justIndices)
+        overlapping = (self._tStart < end) & (self._tEnd > start)
+        return np.sort(self._rows[overlapping])
+
+    def advanceTo(self, position):
+        """
+        Declare that no window starting before `position` will be
+        requested from now on, releasing the records that end there.
+        """
+        self._lowWater = max(self._lowWater, position)
+        for rowNumber in [ r for (r, aln) in self._records.iteritems()
+                           if self._tEnd[self._positionOfRow[r]] <= self._lowWater ]:
+            del self._records[rowNumber]
+
+    def _decodeThrough(self, position):
+        # Visit the rows up to `position` in order, decoding only those
+        # that could still be requested.
+        pending = np.arange(self._frontier, position + 1)
+        pending = pending[self._tEnd[pending] > self._lowWater]
+        pendingRows = self._rows[pending].tolist()
+        if pendingRows:
+            for rowNumber, aln in zip(pendingRows, self._alnFile[pendingRows]):
+                self._records[rowNumber] = aln
+        self._frontier = position + 1
+
+    def _record(self, rowNumber):
+        aln = self._records.get(rowNumber)
+        if aln is not None:
+            return aln
+        position = self._positionOfRow.get(rowNumber)
+        if position is None or position < self._frontier:
+            # Outside the stripe, or released already
+            return self._alnFile[rowNumber]
+        self._decodeThrough(position)
+        return self._records[rowNumber]
+
+    def __getitem__(self, rowNumbers):
+        if np.isscalar(rowNumbers):
+            return self._record(int(rowNumbers))
+        return [ self._record(int(r)) for r in rowNumbers ]
@@ -1,9 +1,12 @@
 # Author: David Alexander
 from __future__ import absolute_import, division, print_function
 
-import time
+import time, numpy as np
+from itertools import izip
 from pbcore.io import GffWriter, Gff3Record
 from GenomicConsensus import __VERSION__, reference
+from GenomicConsensus.variants import Variant, asVariantTable
+from GenomicConsensus.io.utils import openOutputFile
 
 
 def gffVariantSeq(var):
@@ -40,13 +43,171 @@ def toGffRecord(var):
             record.put(k, v)
     return record
 
+def _ranks(values):
+    """
+    Number the distinct values in order, returning (inverse, firsts)
+    as np.unique does.  Integral values of small range are numbered by
+    table lookup rather than by sorting.
+    """
+    if values.dtype.kind in "iuf" and len(values):
+        lo, hi = values.min(), values.max()
+        if (hi - lo < 4 * len(values) and
+            (values.dtype.kind != "f" or (np.floor(values) == values).all())):
+            offsets = (values - lo).astype(np.int64)
+            firstOf = np.full(int(hi - lo) + 1, -1, dtype=np.int64)
+            firstOf[offsets[::-1]] = np.arange(len(values))[::-1]
+            present = firstOf >= 0
+            rank = np.cumsum(present) - 1
+            return rank[offsets], firstOf[present]
+    _, firsts, inverse = np.unique(values, return_index=True, return_inverse=True)
+    return inverse, firsts
+
+def _distinctRows(columns):
+    """
+    Number the distinct rows of the columns: returns (inverse, firsts)
+    where inverse[i] numbers row i and firsts[k] is a row numbered k
+    """
+    if len(columns) == 1:
+        return _ranks(columns[0])
+    key = np.zeros(len(columns[0]), dtype=np.int64)
+    span = 1
+    for column in columns:
+        inverse, firsts = _ranks(column)
+        numDistinct = len(firsts)
+        if span * numDistinct >= 2**62:
+            # Too many combinations for one integer key; renumber
+            key, _ = _ranks(key)
+            span = key.max() + 1
+        key = key * numDistinct + inverse
+        span *= numDistinct
+    return _ranks(key)
+
+def _formattedByRow(columns, formatter):
+    """
+    formatter(*values) for each row of the columns, as an object
+    array; formatter is called once per distinct row
+    """
+    inverse, firsts = _distinctRows(columns)
+    formatted = np.empty(len(firsts), dtype=object)
+    for k, values in enumerate(izip(*[ column[firsts].tolist() for column in columns ])):
+        formatted[k] = formatter(*values)
+    return formatted[inverse]
+
+def _formattedIntegers(values):
+    return np.array(map(str, values.tolist()), dtype=object)
+
+def _gffFields(variants):
+    """
+    The GFF record lines of the variants in a VariantTable, as a list
+    of object arrays of line pieces: concatenating the pieces of row i
+    gives str(toGffRecord(variants[i])).  The fields that repeat
+    across records (contig prefix, type and alleles; frequencies;
+    coverage and confidence) are formatted once per distinct value.
+    """
+    rows, strings = variants.rows, variants.strings
+
+    def string(code):
+        return None if code < 0 else strings[code]
+
+    def alleleFields(refId, refSeq, readSeq1, readSeq2):
+        var = Variant(string(refId), 0, 0, string(refSeq), string(readSeq1),
+                      string(readSeq2), refPrev="", readPrev="")
+        head = "%s\t.\t%s\t" % (reference.idToFullName(var.refId),
+                                   var.variantType.lower())
+        tail = "\t.\t.\t.\treference=%s;variantSeq=%s" % (var.refSeq or ".",
+                                                        gffVariantSeq(var))
+        return head, tail
+
+    alleleColumns = [ rows["refId"], rows["refSeq"], rows["readSeq1"], rows["readSeq2"] ]
+    inverse, firsts = _distinctRows(alleleColumns)
+    heads = np.empty(len(firsts), dtype=object)
+    tails = np.empty(len(firsts), dtype=object)
+    for k, codes in enumerate(izip(*[ column[firsts].tolist() for column in alleleColumns ])):
+        heads[k], tails[k] = alleleFields(*codes)
+    heads, tails = heads[inverse], tails[inverse]
+
+    lengths = np.array([ len(s) for s in strings ] + [0])
+    hasRef  = lengths[rows["refSeq"]] != 0
+    gffStart = np.where(hasRef, rows["refStart"] + 1, rows["refStart"])
+    gffEnd   = np.where(hasRef, rows["refEnd"], rows["refStart"])
+    starts = _formattedIntegers(gffStart)
+    ends = starts.copy()
+    longer = gffEnd != gffStart
+    ends[longer] = _formattedIntegers(gffEnd[longer])
+
+    frequencies = np.empty(len(rows), dtype=object)
+    frequencies[:] = ""
+    isHeterozygous = rows["readSeq2"] >= 0
+    hasFrequency = ~np.isnan(rows["frequency1"])
+    for het in (False, True):
+        which = hasFrequency & (isHeterozygous == het)
+        if which.any():
+            columns = [ rows["frequency1"][which] ]
+            if het:
+                columns.append(rows["frequency2"][which])
+            frequencies[which] = _formattedByRow(
+                columns, lambda *fs: ";frequency=" + "/".join("{0:.3g}".format(f)
+                                                              for f in fs))
+
+    def orNone(value):
+        return None if value < 0 else value
+
+    scores = _formattedByRow([ rows["coverage"], rows["confidence"] ],
+                             lambda c, q: ";coverage=%s;confidence=%s" % (orNone(c),
+                                                                          orNone(q)))
+    fields = [ heads, starts, np.full(len(rows), "\t", dtype=object), ends,
+               tails, frequencies, scores ]
+
+    # Annotated variants are rare: format them the long way
+    if variants.annotations is not None:
+        for i in np.flatnonzero([ bool(a) for a in variants.annotations ]):
+            fields[0][i] = str(toGffRecord(variants[i]))
+            for field in fields[1:]:
+                field[i] = ""
+    return fields
+
+def formatGffLines(variants):
+    """
+    The GFF record lines (without newlines) of all the variants in a
+    VariantTable, as an object array.  Identical to
+    str(toGffRecord(var)), but assembled column by column.
+    """
+    if len(variants) == 0:
+        return np.empty(0, dtype=object)
+    return reduce(np.add, _gffFields(variants))
+
+def formatGffText(variants):
+    """
+    The GFF record lines of all the variants in a VariantTable, as a
+    single string.  The same as "".join(formatGffLines(variants) +
+    "\n"), but the pieces are joined in one pass, without building
+    the lines.
+    """
+    if len(variants) == 0:
+        return ""
+    fields = _gffFields(variants) + [ np.full(len(variants), "\n", dtype=object) ]
+    pieces = [ None ] * (len(variants) * len(fields))
+    for k, field in enumerate(fields):
+        pieces[k::len(fields)] = field.tolist()
+    return "".join(pieces)
+
+def formatGffRecords(variants, minCoverage, minConfidence):
+    """
+    The GFF record lines of the variants (a VariantTable) meeting the
+    thresholds, as an object array with None for the others
+    """
+    records = np.empty(len(variants), dtype=object)
+    passing = variants.meetsThresholds(minCoverage, minConfidence)
+    records[passing] = formatGffLines(variants[passing])
+    return records
+
 class VariantsGffWriter(object):
 
     ONTOLOGY_URL = \
         "http://song.cvs.sourceforge.net/*checkout*/song/ontology/sofa.obo?revision=1.12"
 
     def __init__(self, f, optionsDict, referenceEntries):
-        self._gffWriter = GffWriter(f)
+        self._gffWriter = GffWriter(openOutputFile(f, optionsDict.get("compressionThreads", 1)))
         self._minConfidence = optionsDict["minConfidence"]
         self._minCoverage = optionsDict["minCoverage"]
 
@@ -63,9 +224,23 @@ class VariantsGffWriter(object):
                                             % (entry.name, entry.length))
 
     def writeVariants(self, variants):
-        for var in variants:
-            if var.coverage >= self._minCoverage and var.confidence >= self._minConfidence:
-                self._gffWriter.writeRecord(toGffRecord(var))
+        """
+        Write the variants meeting the thresholds, using the records
+        preformatted by the workers where present
+        """
+        variants = asVariantTable(variants)
+        passing = variants[variants.meetsThresholds(self._minCoverage,
+                                                    self._minConfidence)]
+        records = passing.gffRecords
+        if records is None:
+            self._gffWriter.file.write(formatGffText(passing))
+            return
+        missing = np.array([ r is None for r in records ], dtype=bool)
+        if missing.any():
+            records = records.copy()
+            records[missing] = formatGffLines(passing[missing])
+        if len(records):
+            self._gffWriter.file.write("\n".join(records.tolist()) + "\n")
 
     def close(self):
         self._gffWriter.close()
@@ -1,9 +1,11 @@
 # Author: Lance Hepler
 from __future__ import absolute_import, division, print_function
 
-import time
+import time, numpy as np
 from textwrap import dedent
 from GenomicConsensus import __VERSION__, reference
+from GenomicConsensus.variants import asVariantTable
+from GenomicConsensus.io.utils import openOutputFile, tabixIndexVcf
 
 def vcfVariantFrequency(var, labels):
     if var.frequency1 is None:
@@ -17,10 +19,90 @@ def vcfVariantFrequency(var, labels):
         # the frequency is 100%, so no need
         return None
 
+def toVcfRecord(var, minCoverage, minConfidence):
+    """
+    The VCF record line of the variant, with FILTER noting the
+    thresholds it fails
+    """
+    pos = var.refStart
+    ref = ""
+    alt = ""
+    labels = (1, 2)
+    # insertion or deletion
+    if var.refSeq == "" or var.readSeq1 == "" or \
+            (var.isHeterozygous and var.readSeq2 == ""):
+        # we're anchored on the previous base so no 0- to 1-indexing
+        #   correction required
+        ref = var.refPrev + var.refSeq
+        if var.isHeterozygous:
+            alt = ",".join(var.readPrev + seq for seq in (var.readSeq1, var.readSeq2))
+        else:
+            alt = var.readPrev + var.readSeq1
+    # substitution
+    else:
+        # due to 1-indexing, pos needs to be incremented
+        pos += 1
+        ref = var.refSeq
+        if var.isHeterozygous:
+            alt = ",".join(seq for seq in (var.readSeq1, var.readSeq2))
+            if var.refSeq == var.readSeq1:
+                # first variant is same as wildtype
+                alt = var.readSeq2
+                labels = (2,)
+            elif var.refSeq == var.readSeq2:
+                # second variant is same as wildtype
+                alt = var.readSeq1
+                labels = (1,)
+            else:
+                # both variants differ from wildtype
+                alt = ",".join(seq for seq in (var.readSeq1, var.readSeq2))
+        else:
+            alt = var.readSeq1
+    freq = vcfVariantFrequency(var=var, labels=labels)
+    info = "DP={0}".format(var.coverage)
+    if freq:
+        info = info + ";" + freq
+
+    # failed filters
+    failedFilters = []
+    if var.confidence < minConfidence:
+        failedFilters.append(minConfidenceFilterID(minConfidence))
+    if var.coverage < minCoverage:
+        failedFilters.append(minCoverageFilterID(minCoverage))
+    filterText = ";".join(failedFilters) if failedFilters else "PASS"
+
+    return "{chrom}\t{pos}\t{id}\t{ref}\t{alt}\t{qual}\t{filter}\t{info}".format(
+        chrom=reference.idToFullName(var.refId),
+        pos=pos,
+        id=".",
+        ref=ref,
+        alt=alt,
+        qual=var.confidence,
+        filter=filterText,
+        info=info)
+
+def minConfidenceFilterID(minConfidence):
+    return 'q{}'.format(minConfidence)
+
+def minCoverageFilterID(minCoverage):
+    return 'c{}'.format(minCoverage)
+
+def formatVcfRecords(variants, minCoverage, minConfidence):
+    """
+    The VCF record lines of the variants (a VariantTable), as an
+    object array
+    """
+    records = np.empty(len(variants), dtype=object)
+    records[:] = [ toVcfRecord(var, minCoverage, minConfidence) for var in variants ]
+    return records
+
 class VariantsVcfWriter(object):
 
     def __init__(self, f, optionsDict, referenceEntries):
-        self._vcfFile = open(f, "w")
+        # A ".gz" output is written BGZF-compressed and tabix-indexed
+        # on close
+        self._compressed = f.endswith(".gz")
+        self._vcfFile = openOutputFile(f, optionsDict.get("compressionThreads", 1))
         self._minConfidence = optionsDict["minConfidence"]
         self._minCoverage = optionsDict["minCoverage"]
 
@@ -47,13 +129,13 @@ class VariantsVcfWriter(object):
                   file=self._vcfFile)
 
         # filters
-        self._minConfidenceFilterID = 'q{}'.format(self._minConfidence)
+        self._minConfidenceFilterID = minConfidenceFilterID(self._minConfidence)
         if self._minConfidence > 0:
             print('##FILTER=<ID={id},Description="Quality below {confidence}">'.format(
                 id=self._minConfidenceFilterID,
                 confidence=self._minConfidence
                 ), file=self._vcfFile)
-        self._minCoverageFilterID = 'c{}'.format(self._minCoverage)
+        self._minCoverageFilterID = minCoverageFilterID(self._minCoverage)
         if self._minCoverage > 0:
             print('##FILTER=<ID={id},Description="Coverage below {coverage}">'.format(
                 id=self._minCoverageFilterID,
@@ -63,63 +145,20 @@ class VariantsVcfWriter(object):
         print("#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO", file=self._vcfFile)
 
     def writeVariants(self, variants):
-        for var in variants:
-            pos = var.refStart
-            ref = ""
-            alt = ""
-            labels = (1, 2)
-            # insertion or deletion
-            if var.refSeq == "" or var.readSeq1 == "" or \
-                    (var.isHeterozygous and var.readSeq2 == ""):
-                # we're anchored on the previous base so no 0- to 1-indexing
-                #   correction required
-                ref = var.refPrev + var.refSeq
-                if var.isHeterozygous:
-                    alt = ",".join(var.readPrev + seq for seq in (var.readSeq1, var.readSeq2))
-                else:
-                    alt = var.readPrev + var.readSeq1
-            # substitution
-            else:
-                # due to 1-indexing, pos needs to be incremented
-                pos += 1
-                ref = var.refSeq
-                if var.isHeterozygous:
-                    alt = ",".join(seq for seq in (var.readSeq1, var.readSeq2))
-                    if var.refSeq == var.readSeq1:
-                        # first variant is same as wildtype
-                        alt = var.readSeq2
-                        labels = (2,)
-                    elif var.refSeq == var.readSeq2:
-                        # second variant is same as wildtype
-                        alt = var.readSeq1
-                        labels = (1,)
-                    else:
-                        # both variants differ from wildtype
-                        alt = ",".join(seq for seq in (var.readSeq1, var.readSeq2))
-                else:
-                    alt = var.readSeq1
-            freq = vcfVariantFrequency(var=var, labels=labels)
-            info = "DP={0}".format(var.coverage)
-            if freq:
-                info = info + ";" + freq
-
-            # failed filters
-            failedFilters = []
-            if var.confidence < self._minConfidence:
-                failedFilters.append(self._minConfidenceFilterID)
-            if var.coverage < self._minCoverage:
-                failedFilters.append(self._minCoverageFilterID)
-            filterText = ";".join(failedFilters) if failedFilters else "PASS"
-
-            print("{chrom}\t{pos}\t{id}\t{ref}\t{alt}\t{qual}\t{filter}\t{info}".format(
-                chrom=reference.idToFullName(var.refId),
-                pos=pos,
-                id=".",
-                ref=ref,
-                alt=alt,
-                qual=var.confidence,
-                filter=filterText,
-                info=info), file=self._vcfFile)
+        """
+        Write the variants, using the records preformatted by the
+        workers where present
+        """
+        variants = asVariantTable(variants)
+        records = variants.vcfRecords
+        if records is None:
+            records = np.empty(len(variants), dtype=object)
+        lines = [ (record if record is not None
+                   else toVcfRecord(variants[i], self._minCoverage, self._minConfidence)) + "\n"
+                  for (i, record) in enumerate(records) ]
+        self._vcfFile.write("".join(lines))
 
     def close(self):
         self._vcfFile.close()
+        if self._compressed:
+            tabixIndexVcf(self._vcfFile.name)
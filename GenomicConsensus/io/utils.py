@@ -1,9 +1,12 @@
 # Author: David Alexander
 from __future__ import absolute_import, division, print_function
 
-__all__ = ["loadCmpH5", "loadBam"]
+__all__ = ["loadCmpH5", "loadBam", "BgzfWriter", "openOutputFile", "openMaybeGzipped",
+           "tabixIndexVcf"]
 
-import os.path
+import gzip, os.path, struct, zlib, Queue
+from threading import Thread
+from multiprocessing.pool import ThreadPool
 from pbcore.io import AlignmentSet
 
 
@@ -18,3 +21,113 @@ def loadBam(filename, referenceFname):
     filename = os.path.abspath(os.path.expanduser(filename))
     aln = AlignmentSet(filename, referenceFastaFname=referenceFname)
     return aln
+
+
+class BgzfWriter(object):
+    """
+    Write-only file object producing BGZF (blocked gzip), the format
+    tabix indexes and any gzip reader accepts.  Data is cut into
+    blocks as it is written.  The blocks are compressed on a pool of
+    `numThreads` threads, as zlib releases the GIL while compressing.
+    A background thread writes the blocks to disk in order, so
+    formatting, compression and I/O overlap.  Any error in the
+    threads is raised by the next write or by close.
+    """
+    BLOCK_SIZE = 0xff00   # as htslib; a compressed block must fit in 64KiB
+    EOF_BLOCK  = ("\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00\x42\x43"
+                  "\x02\x00\x1b\x00\x03\x00\x00\x00\x00\x00\x00\x00\x00\x00")
+
+    def __init__(self, filename, compressionLevel=6, numThreads=1, maxPendingBlocks=64):
+        self.name = filename
+        self.mode = "w"
+        self._file = open(filename, "wb")
+        self._compressionLevel = compressionLevel
+        self._buffer = []
+        self._bufferedBytes = 0
+        self._error = None
+        self._pool = ThreadPool(numThreads)
+        self._blocks = Queue.Queue(max(maxPendingBlocks, 2 * numThreads))
+        self._thread = Thread(target=self._writeBlocks, name="BgzfWriter")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _compressBlock(self, block):
+        compressor = zlib.compressobj(self._compressionLevel, zlib.DEFLATED, -15)
+        data = compressor.compress(block) + compressor.flush()
+        header = struct.pack("<4BI2BH2BHH", 31, 139, 8, 4, 0, 0, 255, 6,
+                             66, 67, 2, len(data) + 25)
+        footer = struct.pack("<2I", zlib.crc32(block) & 0xffffffff, len(block))
+        return header + data + footer
+
+    def _writeBlocks(self):
+        # The queue holds the pending compressions in file order
+        while True:
+            compressed = self._blocks.get()
+            if compressed is None:
+                break
+            if self._error is None:
+                try:
+                    self._file.write(compressed.get())
+                except Exception as e:
+                    self._error = e
+
+    def _checkError(self):
+        if self._error is not None:
+            raise self._error
+
+    def _queueBlocks(self, final=False):
+        data = "".join(self._buffer)
+        end = len(data) if final else len(data) - len(data) % self.BLOCK_SIZE
+        for start in xrange(0, end, self.BLOCK_SIZE):
+            block = data[start:min(start + self.BLOCK_SIZE, end)]
+            self._blocks.put(self._pool.apply_async(self._compressBlock, (block,)))
+        self._buffer = [data[end:]] if end < len(data) else []
+        self._bufferedBytes = len(data) - end
+
+    def write(self, data):
+        self._checkError()
+        self._buffer.append(data)
+        self._bufferedBytes += len(data)
+        if self._bufferedBytes >= self.BLOCK_SIZE:
+            self._queueBlocks()
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._queueBlocks(final=True)
+        self._blocks.put(None)
+        self._thread.join()
+        self._pool.close()
+        self._pool.join()
+        try:
+            self._checkError()
+            self._file.write(self.EOF_BLOCK)
+        finally:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def openOutputFile(filename, compressionThreads=1):
+    """
+    Open an output file for writing; a ".gz" file is written
+    BGZF-compressed on `compressionThreads` threads
+    """
+    if filename.endswith(".gz"):
+        return BgzfWriter(filename, numThreads=compressionThreads)
+    else:
+        return open(filename, "w")
+
+def openMaybeGzipped(filename):
+    return gzip.open(filename) if filename.endswith(".gz") else open(filename)
+
+def tabixIndexVcf(filename):
+    """
+    Write the tabix index (filename + ".tbi") of a BGZF-compressed,
+    position-sorted VCF file
+    """
+    import pysam
+    pysam.tabix_index(filename, preset="vcf", force=True)
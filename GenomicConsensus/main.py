@@ -7,13 +7,13 @@ import functools
 import re
 import sys
 
-import pysam
-
 from pbcommand.utils import setup_log, Constants as LogFormats
 from pbcommand.cli import pbparser_runner
 from pbcore.io import AlignmentSet, ContigSet
 
 from GenomicConsensus import reference
+from GenomicConsensus.coverage import loadCoverageProfile
+from GenomicConsensus.io.ConsensusWriters import fastaIndexTotals
 from GenomicConsensus.options import (options, Constants,
                                       get_parser,
                                       processOptions,
@@ -99,7 +99,8 @@ class ToolRunner(object):
             p.start()
         logging.info("Launched compute slaves.")
 
-        rcp = ResultCollectorType(self._resultsQueue, self._algorithm.name, self._algorithmConfiguration)
+        rcp = ResultCollectorType(self._resultsQueue, self._algorithm.name,
+                                  self._algorithmConfiguration, self._workQueue)
         rcp.start()
         self._slaves.append(rcp)
         logging.info("Launched collector slave.")
@@ -170,6 +171,10 @@ class ToolRunner(object):
         # a chunk as a unit of work.
         logging.debug("Starting main loop.")
         ids = reference.enumerateIds(options.referenceWindows)
+        if options.fancyChunking:
+            coverageProfile = loadCoverageProfile(self._inAlnFile,
+                                                  options.minMapQV,
+                                                  options.coverageCacheDirectory)
         for _id in ids:
             if options.fancyChunking:
                 chunks = reference.fancyEnumerateChunks(self._inAlnFile,
@@ -177,11 +182,14 @@ class ToolRunner(object):
                                                         options.referenceChunkSize,
                                                         options.minCoverage,
                                                         options.minMapQV,
-                                                        options.referenceWindows)
+                                                        options.referenceWindows,
+                                                        coverageProfile)
             else:
                 chunks = reference.enumerateChunks(_id,
                                                    options.referenceChunkSize,
                                                    options.referenceWindows)
+            if options.stripeSize:
+                chunks = reference.enumerateStripes(chunks, options.stripeSize)
             for chunk in chunks:
                 if self._aborting: return
                 self._workQueue.put(chunk)
@@ -190,6 +198,13 @@ class ToolRunner(object):
         for i in xrange(options.numWorkers):
             self._workQueue.put(None)
 
+    def _plan(self, alnFile):
+        from GenomicConsensus.plan import Plan, planAlgorithmName
+        plan = Plan(alnFile, planAlgorithmName(alnFile))
+        for line in plan.report():
+            print(line)
+        return 0
+
     def _printProfiles(self):
         for profile in glob.glob(os.path.join(options.temporaryDirectory, "*")):
             pstats.Stats(profile).sort_stats("time").print_stats(20)
@@ -265,6 +280,8 @@ class ToolRunner(object):
             logging.info("Input data: numAlnHits=%d" % len(peekFile))
             resolveOptions(peekFile)
             self._loadReference(peekFile)
+            if options.plan:
+                return self._plan(peekFile)
             self._checkFileCompatibility(peekFile)
             self._algorithm = self._algorithmByName(options.algorithm, peekFile)
             self._configureAlgorithm(options, peekFile)
@@ -371,12 +388,21 @@ def resolved_tool_contract_runner(resolved_contract):
     args_ = get_parser().arg_parser.parser.parse_args(args)
     rc = args_runner(args_)
     if rc == 0:
-        pysam.faidx(fasta_path)
-        ds = ContigSet(fasta_path, strict=True)
+        # The consensus FASTA was indexed as it was written; take the
+        # counts from the index rather than reading the FASTA again,
+        # but still have pbcore open and validate it
+        numRecords, totalLength = fastaIndexTotals(fasta_path + ".fai")
+        ds = ContigSet(fasta_path, strict=True, skipCounts=True)
+        ds.induceIndices()
+        ds.metadata.numRecords = numRecords
+        ds.metadata.totalLength = totalLength
         ds.write(dataset_path)
     return rc
 
 def main(argv=sys.argv):
+    if len(argv) > 1 and argv[1] == "export":
+        from GenomicConsensus.export import main as exportMain
+        return exportMain(argv[2:])
     setup_log_ = functools.partial(setup_log,
         str_formatter=LogFormats.LOG_FMT_LVL)
     return pbparser_runner(
@@ -18,7 +18,7 @@
 #  and get the loaded options dictionary.
 #
 from __future__ import absolute_import, division, print_function
-import argparse, os, os.path, sys, json
+import argparse, logging, os, os.path, sys, json
 
 from pbcommand.models import FileTypes, SymbolTypes, get_pbparser
 from pbcommand.common_options import (add_resolved_tool_contract_option,
@@ -157,7 +157,50 @@ def add_options_to_argument_parser(parser):
         action="append",
         default=[],
         help="The output filename(s), as a comma-separated list." + \
-             "Valid output formats are .fa/.fasta, .fq/.fastq, .gff, .vcf")
+             "Valid output formats are .fa/.fasta, .fq/.fastq, .gff, .vcf" + \
+             " (add .gz for bgzip-compressed output; .vcf.gz is also tabix-indexed)")
+    basics.add_argument(
+        "--resultStore",
+        dest="resultStore",
+        type=str,
+        default=None,
+        help="Also store the consensus, QVs and variants of every window, in " + \
+             "binary form, in this directory.  `variantCaller export` writes any " + \
+             "of the output formats from it, at any filtering thresholds, "      + \
+             "without recomputing the consensus.")
+
+    basics.add_argument(
+        "--alignmentSummary",
+        dest="alignmentSummary",
+        type=str,
+        default=None,
+        help="An alignment_summary.gff to augment with the variant counts and " + \
+             "consensus QVs (min, median, max) of its regions, as the results "   + \
+             "stream in; written to --alignmentSummaryOutput.  This replaces a "  + \
+             "separate summarizeConsensus pass.")
+    basics.add_argument(
+        "--alignmentSummaryOutput",
+        dest="alignmentSummaryOutput",
+        type=str,
+        default=None,
+        help="Output filename for the augmented --alignmentSummary")
+    basics.add_argument(
+        "--plan",
+        action="store_true",
+        help="Do not run; from the alignment index and the reference index only, " + \
+             "report the chunks and coverage of the run, estimates of its CPU "     + \
+             "time and of the result collector's peak memory, and suggested "       + \
+             "--numWorkers and --referenceChunkSize.  No outputs are written.")
+    basics.add_argument(
+        "--costModel",
+        dest="costModel",
+        type=str,
+        default=None,
+        help="A JSON file of measured --plan cost model coefficients by "          + \
+             "algorithm, {\"arrow\": {\"perBaseRead\": s, \"perChunk\": s}}: the " + \
+             "CPU seconds of a run over a --referenceWindow, split between the "  + \
+             "read bases and chunks its plan reports.  Without it, CPU and wall " + \
+             "time estimates are uncalibrated.")
 
     parallelism = parser.add_argument_group("Parallelism")
     parallelism.add_argument(
@@ -166,6 +209,12 @@ def add_options_to_argument_parser(parser):
         type=int,
         default=1,
         help="The number of worker processes to be used")
+    parallelism.add_argument(
+        "--compressionThreads",
+        dest="compressionThreads",
+        type=int,
+        default=1,
+        help="The number of threads compressing each .gz output file")
 
     filtering = parser.add_argument_group("Output filtering")
     filtering.add_argument(
@@ -183,6 +232,17 @@ def add_options_to_argument_parser(parser):
         type=int,
         help="The minimum site coverage that must be achieved for variant calls and " + \
              "consensus to be calculated for a site.")
+    filtering.add_argument(
+        "--keepFilteredVariants",
+        action="store",
+        dest="keepFilteredVariants",
+        type=float,
+        default=1.0,
+        help="Fraction of the variants failing the --minConfidence/--minCoverage " + \
+             "thresholds that workers pass on to be output (as filtered records in " + \
+             "the VCF; they are never written to the GFF).  The default, 1, keeps " + \
+             "them all; 0 drops them at source.  The subset kept is chosen by "     + \
+             "reference position, so it does not depend on the worker count.")
     filtering.add_argument(
         "--noEvidenceConsensusCall",
         action="store",
@@ -351,6 +411,23 @@ def add_options_to_argument_parser(parser):
         dest="doProfiling",
         default=False,
         help="Enable Python-level profiling (using cProfile).")
+    debugging.add_argument(
+        "--progressInterval",
+        action="store",
+        dest="progressInterval",
+        type=float,
+        default=60,
+        help="Report progress (percent done, bases and chunks per second, worker "  + \
+             "utilization, queue depths and ETA) to the log every this many "       + \
+             "seconds; 0 disables the reports")
+    debugging.add_argument(
+        "--statusFile",
+        action="store",
+        dest="statusFile",
+        default=None,
+        help="Also write each progress report, as JSON, to this file, for "          + \
+             "schedulers to poll.  It is replaced atomically at each report.  "      + \
+             "Requires a nonzero --progressInterval.")
     debugging.add_argument(
         "--annotateGFF",
         action="store_true",
@@ -399,6 +476,33 @@ def add_options_to_argument_parser(parser):
         dest="referenceChunkOverlap",
         type=int,
         default=5)
+    advanced.add_argument(
+        "--stripeSize",
+        action="store",
+        dest="stripeSize",
+        type=int,
+        default=0,
+        help="Hand out work in stripes of consecutive reference chunks spanning at least " + \
+             "this many bases.  Each stripe is processed by a single worker, which streams " + \
+             "through the sorted alignments once instead of querying every window.  0 "   + \
+             "(the default) disables striping.")
+    advanced.add_argument(
+        "--streamingPileup",
+        action="store_true",
+        dest="streamingPileup",
+        default=False,
+        help="Plurality only, with --stripeSize: pile up the reads of each stripe in a "   + \
+             "single pass, decoding and clipping each read once, and call each chunk "   + \
+             "as soon as no later read can reach it.  Every read passing the filters "    + \
+             "is counted; reads are not subsampled to --coverage per window.")
+    advanced.add_argument(
+        "--coverageCacheDirectory",
+        action="store",
+        dest="coverageCacheDirectory",
+        default=None,
+        help="Directory in which to save the coverage profile computed from the alignment " + \
+             "index, keyed on a checksum of the index, so that later runs on the same "    + \
+             "alignments can reuse it.  By default the profile is not saved.")
     advanced.add_argument(
         "--autoDisableHdf5ChunkCache",
         action="store",
@@ -477,13 +581,39 @@ def processOptions():
     else:
         options.usingBam, options.usingCmpH5 = False, True
 
-    for path in (options.inputFilename, options.referenceFilename):
+    if (options.alignmentSummary is None) != (options.alignmentSummaryOutput is None):
+        parser.error("--alignmentSummary and --alignmentSummaryOutput must be given together.")
+
+    if options.compressionThreads < 1:
+        parser.error("--compressionThreads must be at least 1.")
+
+    if not 0 <= options.keepFilteredVariants <= 1:
+        parser.error("--keepFilteredVariants must be between 0 and 1.")
+
+    if options.statusFile is not None and not options.progressInterval > 0:
+        parser.error("--statusFile requires a nonzero --progressInterval.")
+
+    if options.streamingPileup:
+        if options.algorithm != "plurality":
+            parser.error("--streamingPileup is only supported with --algorithm=plurality.")
+        if not options.stripeSize:
+            parser.error("--streamingPileup requires --stripeSize.")
+        logging.warn("--streamingPileup counts every read passing the filters; "
+                     "--coverage does not apply.")
+
+    if options.costModel is not None and not options.plan:
+        parser.error("--costModel only applies to --plan.")
+
+    for path in (options.inputFilename, options.referenceFilename,
+                 options.alignmentSummary, options.costModel):
         if path != None:
             checkInputFile(path)
 
-    for path in options.outputFilenames:
-        if path != None:
-            checkOutputFile(path)
+    # (Checking creates the files, which a plan does not write)
+    if not options.plan:
+        for path in options.outputFilenames + [options.alignmentSummaryOutput]:
+            if path != None:
+                checkOutputFile(path)
 
     options.shellCommand = " ".join(sys.argv)
 
@@ -0,0 +1,222 @@
+"""
+variantCaller --plan: a dry run that reads only the alignment index and
+the reference index, and reports the work a run with the same options
+would do, with estimates of its CPU time and of the result collector's
+peak memory, and suggested parallelism settings.  No workers are
+started and no outputs are written.
+"""
+from __future__ import absolute_import, division, print_function
+
+import json, multiprocessing
+import numpy as np
+
+from GenomicConsensus import reference
+from GenomicConsensus.coverage import loadCoverageProfile
+from GenomicConsensus.options import options
+from GenomicConsensus.utils import formatDuration
+from GenomicConsensus.variants import VariantTable
+
+#
+# Cost model: CPU seconds per reference base per read used, and per
+# chunk (fetching reads, setting up), by algorithm.  Only the bases of
+# chunks with coverage are computed, using at most --coverage reads.
+# These are order-of-magnitude guesses, and reported as uncalibrated;
+# --costModel supplies coefficients measured from the CPU time of a run
+# over a slice of the data (--referenceWindow), divided by the read
+# bases and chunks the plan of that slice reports.
+#
+COST_MODEL = { "plurality" : (5e-8, 0.005),
+               "poa"       : (3e-6, 0.02),
+               "quiver"    : (1.5e-5, 0.05),
+               "arrow"     : (3e-5, 0.05) }
+
+#
+# Memory model of the result collector: a fixed baseline; the windows
+# in flight, whose consensus (a byte per base, and one per QV) may wait
+# to be written in reference order; and the variants of the contig in
+# progress, held until the contig completes.
+#
+COLLECTOR_BASELINE_BYTES = 150 * 2**20
+CONSENSUS_BYTES_PER_BASE = 2
+VARIANTS_PER_BASE        = 1e-3     # generous for resequencing
+
+# Suggested chunk sizes keep the per-chunk cost to a tenth of the
+# work, but leave each worker this many chunks, for load balance
+MAX_CHUNK_OVERHEAD = 0.1
+CHUNKS_PER_WORKER  = 8
+MIN_CHUNK_SIZE     = 500
+
+
+def planAlgorithmName(alnFile):
+    if options.algorithm == "best":
+        from GenomicConsensus.algorithmSelection import bestAlgorithm
+        return bestAlgorithm(alnFile.sequencingChemistry)
+    return options.algorithm
+
+def loadCostModel(filename):
+    """
+    Measured cost model coefficients, by algorithm, from a JSON file
+    of the form {"arrow": {"perBaseRead": 2.1e-5, "perChunk": 0.04}}
+    """
+    with open(filename) as f:
+        try:
+            measured = json.load(f)
+            return dict((algorithmName, (float(coefficients["perBaseRead"]),
+                                         float(coefficients["perChunk"])))
+                        for algorithmName, coefficients in measured.items())
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            raise ValueError("Invalid cost model file %s: %s" % (filename, e))
+
+def _weightedQuantiles(values, weights, quantiles):
+    order = np.argsort(values, kind="mergesort")
+    cumulative = np.cumsum(weights[order])
+    ranks = np.searchsorted(cumulative, np.asarray(quantiles) * cumulative[-1])
+    return values[order][np.minimum(ranks, len(values) - 1)]
+
+
+class Plan(object):
+    """
+    The work of a run, from the alignment index and the reference
+    """
+    def __init__(self, alnFile, algorithmName, coverageProfile=None, measuredCostModel=None):
+        if coverageProfile is None:
+            coverageProfile = loadCoverageProfile(alnFile, options.minMapQV,
+                                                  options.coverageCacheDirectory)
+        if measuredCostModel is None and options.costModel:
+            measuredCostModel = loadCostModel(options.costModel)
+        self.algorithmName = algorithmName
+        self.measuredCostModel = measuredCostModel or {}
+        self.numContigs = self.numSpans = self.largestContigBases = 0
+        self.numChunks = self.numCoveredChunks = self.numStripes = 0
+        coverages, lengths = [], []
+        for refId in reference.enumerateIds(options.referenceWindows):
+            self.numContigs += 1
+            tId = alnFile.referenceInfo(refId).ID
+            self.largestContigBases = max(self.largestContigBases,
+                                          reference.numReferenceBases(refId,
+                                                                      options.referenceWindows))
+            for (_, start, end) in reference.enumerateSpans(refId, options.referenceWindows):
+                self.numSpans += 1
+                c, l = coverageProfile.coverageRuns(tId, start, end)
+                coverages.append(c)
+                lengths.append(l)
+            if options.fancyChunking:
+                chunks = list(reference.fancyEnumerateChunks(alnFile, refId,
+                                                             options.referenceChunkSize,
+                                                             options.minCoverage,
+                                                             options.minMapQV,
+                                                             options.referenceWindows,
+                                                             coverageProfile))
+            else:
+                chunks = list(reference.enumerateChunks(refId,
+                                                        options.referenceChunkSize,
+                                                        options.referenceWindows))
+            self.numChunks += len(chunks)
+            self.numCoveredChunks += sum(chunk.hasCoverage for chunk in chunks)
+            if options.stripeSize:
+                self.numStripes += sum(1 for _ in reference.enumerateStripes(
+                    chunks, options.stripeSize))
+
+        self.coverage = np.concatenate(coverages) if coverages else np.zeros(0, dtype=int)
+        self.lengths  = np.concatenate(lengths) if lengths else np.zeros(0, dtype=int)
+        self.numBases = int(self.lengths.sum())
+
+        # Fancy chunking hands out the stretches below --minCoverage
+        # as chunks without coverage, which cost next to nothing
+        if options.fancyChunking:
+            computed = self.coverage >= options.minCoverage
+        else:
+            computed = np.ones(len(self.coverage), dtype=bool)
+        self.computedBases = int(self.lengths[computed].sum())
+        self.readBasesUsed = int((self.lengths[computed] *
+                                  np.minimum(self.coverage[computed], options.coverage)).sum())
+
+    def coverageQuantiles(self, quantiles):
+        """
+        Coverage quantiles, weighting each base of the spans equally
+        """
+        if self.numBases == 0:
+            return np.zeros(len(quantiles), dtype=int)
+        return _weightedQuantiles(self.coverage, self.lengths, quantiles)
+
+    @property
+    def meanCoverage(self):
+        return (self.coverage * self.lengths).sum() / max(self.numBases, 1)
+
+    def fractionBelow(self, k):
+        return self.lengths[self.coverage < k].sum() / max(self.numBases, 1)
+
+    @property
+    def isCalibrated(self):
+        return self.algorithmName in self.measuredCostModel
+
+    @property
+    def costModel(self):
+        if self.isCalibrated:
+            return self.measuredCostModel[self.algorithmName]
+        return COST_MODEL.get(self.algorithmName, COST_MODEL["arrow"])
+
+    @property
+    def cpuSeconds(self):
+        perBaseRead, perChunk = self.costModel
+        return perBaseRead * self.readBasesUsed + perChunk * self.numCoveredChunks
+
+    def collectorPeakBytes(self, numWorkers):
+        windowBases = max(options.referenceChunkSize, options.stripeSize or 0)
+        inFlight = numWorkers + options.queueSize
+        return (COLLECTOR_BASELINE_BYTES +
+                inFlight * windowBases * CONSENSUS_BYTES_PER_BASE +
+                self.largestContigBases * VARIANTS_PER_BASE * VariantTable.DTYPE.itemsize)
+
+    def suggestedNumWorkers(self, availableCpus=None):
+        if availableCpus is None:
+            availableCpus = multiprocessing.cpu_count()
+        return max(1, min(availableCpus, self.numCoveredChunks))
+
+    def suggestedChunkSize(self, numWorkers):
+        perBaseRead, perChunk = self.costModel
+        if self.computedBases == 0:
+            return MIN_CHUNK_SIZE
+        meanReadsUsed = max(self.readBasesUsed / self.computedBases, 1)
+        smallest = perChunk / (MAX_CHUNK_OVERHEAD * perBaseRead * meanReadsUsed)
+        largest = self.computedBases / (CHUNKS_PER_WORKER * numWorkers)
+        size = min(max(smallest, MIN_CHUNK_SIZE), max(largest, MIN_CHUNK_SIZE))
+        return int(round(size, -2))
+
+    def report(self):
+        """
+        The plan, as lines of text
+        """
+        quantiles = self.coverageQuantiles([0.05, 0.25, 0.5, 0.75, 0.95])
+        perBaseRead, perChunk = self.costModel
+        numWorkers = self.suggestedNumWorkers()
+        calibration = ("measured, %s" % options.costModel if self.isCalibrated
+                       else "uncalibrated guesses; see --costModel")
+        lines = [
+            "Plan for %s:" % self.algorithmName,
+            "  Reference:          %d contig(s), %d span(s), %d bases" %
+            (self.numContigs, self.numSpans, self.numBases),
+            "  Chunks:             %d of up to %d bases (%d with coverage, %d without)" %
+            (self.numChunks, options.referenceChunkSize,
+             self.numCoveredChunks, self.numChunks - self.numCoveredChunks) +
+            ("; %d stripes" % self.numStripes if options.stripeSize else ""),
+            "  Coverage:           mean %.1f; 5/25/50/75/95%%: %s (mapQV >= %g)" %
+            (self.meanCoverage, "/".join(str(q) for q in quantiles), options.minMapQV),
+            "  No coverage:        %.2f%% of bases; below --minCoverage %d: %.2f%%" %
+            (100 * self.fractionBelow(1), options.minCoverage,
+             100 * self.fractionBelow(options.minCoverage)),
+            "  Work:               %d read bases (using up to %d reads), %d chunks computed" %
+            (self.readBasesUsed, options.coverage, self.numCoveredChunks),
+            "  Cost model:         %g s per read base, %g s per chunk (%s)" %
+            (perBaseRead, perChunk, calibration),
+            "  CPU time:           %s%s" %
+            (formatDuration(self.cpuSeconds), "" if self.isCalibrated else " (uncalibrated)"),
+            "  Wall time:          %s with %d worker(s), %s with %d%s" %
+            (formatDuration(self.cpuSeconds / options.numWorkers), options.numWorkers,
+             formatDuration(self.cpuSeconds / numWorkers), numWorkers,
+             "" if self.isCalibrated else " (uncalibrated)"),
+            "  Collector memory:   %.0f MB peak" %
+            (self.collectorPeakBytes(options.numWorkers) / 2**20),
+            "  Suggested settings: --numWorkers %d --referenceChunkSize %d" %
+            (numWorkers, self.suggestedChunkSize(numWorkers)) ]
+        return lines
@@ -26,12 +26,14 @@ class PluralityConfig(object):
                  minCoverage=3,
                  minConfidence=40,
                  diploid=False,
-                 noEvidenceConsensus="nocall"):
+                 noEvidenceConsensus="nocall",
+                 maxCoverage=100):
         self.minMapQV            = minMapQV
         self.minCoverage         = minCoverage
         self.minConfidence       = minConfidence
         self.noEvidenceConsensus = noEvidenceConsensus
         self.diploid             = diploid
+        self.maxCoverage         = maxCoverage
         self.realignHomopolymers = False # not available yet
 
 
@@ -53,71 +55,52 @@ def pluralityConsensusAndVariants(refWindow, referenceSequenceInWindow, alns,
     in homopolymer regions in an attempt to maximize variant detection
     sensitivity (not yet implemented, and may never be).
     """
+    return consensusAndVariantsFromPileup(refWindow, referenceSequenceInWindow,
+                                          pileupBaseCalls(refWindow, alns),
+                                          pluralityConfig)
+
+def consensusAndVariantsFromPileup(refWindow, referenceSequenceInWindow, pileup,
+                                   pluralityConfig):
+    """
+    Compute (Consensus, [Variant]) for this window from the
+    BaseCallPileup of its reads
+    """
     _, refStart, refEnd = refWindow
     windowSize = refEnd - refStart
     assert len(referenceSequenceInWindow) == windowSize
-
-    #
-    # Build up these arrays in reference coordinates.
-    #
-    consensusSequence_   = []
-    consensusFrequency_  = []
-    consensusConfidence_ = []
-    effectiveCoverage_   = []
-    alternateAllele_     = []        # DIPLOID ONLY
-    alternateFrequency_  = []        # "
-    heterozygousConfidence_ = []     # "
+    assert len(pileup.counts) == windowSize
 
     noCallCss = Consensus.noCallConsensus(pluralityConfig.noEvidenceConsensus,
                                           refWindow, referenceSequenceInWindow)
 
-    baseCallsMatrix = tabulateBaseCalls(refWindow, alns)
-
-    for j in xrange(0, windowSize):
-        counter = Counter(baseCallsMatrix[:, j])
-        if "" in counter: counter.pop("")
-
-        siteEffectiveCoverage = sum(counter.itervalues())
-        if ((siteEffectiveCoverage == 0) or
-            (siteEffectiveCoverage < pluralityConfig.minCoverage)):
-            siteConsensusFrequency = siteEffectiveCoverage
-            siteConsensusSequence  = noCallCss.sequence[j]
-            top2                   = None
-        else:
-            # Not for production code:
-            top2 = counter.most_common(2)
-            siteConsensusSequence, siteConsensusFrequency = top2[0]
-
-        # Replace explicit gaps with empty string
-        if siteConsensusSequence == "-":
-            siteConsensusSequence = ""
-
-        consensusSequence_.append(siteConsensusSequence)
-        consensusFrequency_.append(siteConsensusFrequency)
-        effectiveCoverage_.append(siteEffectiveCoverage)
-
-        if pluralityConfig.diploid:
-            if top2 and len(top2) > 1:
-                siteAlternateAllele, siteAlternateFrequency = top2[1]
-            else:
-                siteAlternateAllele    = "N"
-                siteAlternateFrequency =  0
-            if siteAlternateAllele == "-":
-                siteAlternateAllele = ""
-            alternateAllele_.append(siteAlternateAllele)
-            alternateFrequency_.append(siteAlternateFrequency)
-        else:
-            siteAlternateAllele    = "N"
-            siteAlternateFrequency = 0
-
-        siteConsensusConfidence, siteHeterozygousConfidence = \
-            posteriorConfidences(siteEffectiveCoverage,
-                                 siteConsensusFrequency,
-                                 siteAlternateFrequency,
-                                 diploid=pluralityConfig.diploid)
-        consensusConfidence_.append(siteConsensusConfidence)
-        if pluralityConfig.diploid:
-            heterozygousConfidence_.append(siteHeterozygousConfidence)
+    #
+    # Build up these arrays in reference coordinates.
+    #
+    (consensusSequence_, consensusFrequency_, effectiveCoverage_,
+     alternateAllele_, alternateFrequency_) = \
+        columnConsensus(pileup, noCallCss.sequence, pluralityConfig.minCoverage)
+
+    if not pluralityConfig.diploid:
+        alternateFrequency_ = np.zeros_like(alternateFrequency_)
+    confidenceTable = ConfidenceTable.forDepth(pluralityConfig.diploid,
+                                               pluralityConfig.maxCoverage)
+    consensusConfidence_, heterozygousConfidence_ = \
+        confidenceTable.lookup(effectiveCoverage_,
+                               consensusFrequency_,
+                               alternateFrequency_)
+
+    consensusSequence_   = consensusSequence_.tolist()
+    consensusFrequency_  = consensusFrequency_.tolist()
+    consensusConfidence_ = consensusConfidence_.tolist()
+    effectiveCoverage_   = effectiveCoverage_.tolist()
+    if pluralityConfig.diploid:
+        alternateAllele_        = alternateAllele_.tolist()
+        alternateFrequency_     = alternateFrequency_.tolist()
+        heterozygousConfidence_ = heterozygousConfidence_.tolist()
+    else:
+        alternateAllele_        = []
+        alternateFrequency_     = []
+        heterozygousConfidence_ = []
 
     #
     # Derive variants from reference-coordinates consensus
@@ -209,99 +192,388 @@ def _computeVariants(config,
         assert len(alternateAlleleArray) == windowSize
         assert len(alternateAlleleFrequency) == windowSize
 
-    # these are predecessor anchors, to support VCF output
-    refPrev = "N"
-    cssPrev = "N"
+    refBases  = np.array(list(refSequenceInWindow), dtype=object)
+    cssArray = np.array(list(consensusArray), dtype=object)
+    coverage  = np.asarray(coverageArray)
+    conf      = np.asarray(consensusConfidenceArray)
+
+    # Sites that are considered at all; only these move the anchors
+    considered = coverage >= config.minCoverage
+    if config.diploid:
+        hetConf = np.asarray(heterozygousConfidence)
+        isDiploidSite = considered & (hetConf > conf)
+    else:
+        isDiploidSite = np.zeros(windowSize, dtype=bool)
+    isHaploidSite = considered & ~isDiploidSite
+
+    refIsN = refBases == "N"
+    cssIsUpperOrEmpty = np.array([ b == "" or b.isupper() for b in cssArray ],
+                                 dtype=bool)
+    haploidHits = (isHaploidSite                      &
+                   (conf >= config.minConfidence)     &
+                   (refBases != cssArray)            &
+                   ~refIsN                            &
+                   (cssArray != "N")                 &
+                   cssIsUpperOrEmpty)
+    diploidHits = (isDiploidSite & ~refIsN)
+    if config.diploid:
+        diploidHits &= hetConf >= config.minConfidence
+
+    # These are predecessor anchors, to support VCF output: the
+    # reference base and last consensus base at the previous
+    # considered site (with consensus bases), or "N"
+    positions = np.arange(windowSize)
+    lastRefSite = np.maximum.accumulate(np.where(considered, positions, -1))
+    hasCss = considered & (np.array(map(len, cssArray), dtype=int) > 0)
+    lastCssSite = np.maximum.accumulate(np.where(hasCss, positions, -1))
+    def anchors(j):
+        r = lastRefSite[j-1] if j > 0 else -1
+        c = lastCssSite[j-1] if j > 0 else -1
+        return (refSequenceInWindow[r] if r >= 0 else "N",
+                consensusArray[c][-1] if c >= 0 else "N")
 
     vars = []
-    for j in xrange(windowSize):
+    for j in np.flatnonzero(haploidHits | diploidHits):
         refPos = j + refStart
         refBase = refSequenceInWindow[j]
-        cov  = coverageArray[j]
-        cssBases = consensusArray[j]
-        conf = consensusConfidenceArray[j]
-        cssFreq = consensusFrequencyArray[j]
-        if config.diploid:
-            altBases = alternateAlleleArray[j]
-            altFreq  = alternateAlleleFrequency[j]
-            hetConf  = heterozygousConfidence[j]
+        refPrev, cssPrev = anchors(j)
+        if diploidHits[j]:
+            vars.extend(varsFromRefAndReads(refId, refPos, refBase,
+                                            consensusArray[j], alternateAlleleArray[j],
+                                            confidence=heterozygousConfidence[j],
+                                            coverage=coverageArray[j],
+                                            frequency1=consensusFrequencyArray[j],
+                                            frequency2=alternateAlleleFrequency[j],
+                                            refPrev=refPrev, readPrev=cssPrev))
         else:
-            altBases = "N"
-            altFreq  = 0
-
-        if cov < config.minCoverage: continue
-
-        if (config.diploid and hetConf > conf):
-            #
-            # Diploid variant[s]?
-            #
-            if (hetConf >= config.minConfidence) and (refBase != "N"):
-                vs = varsFromRefAndReads(refId, refPos, refBase,
-                                         cssBases, altBases,
-                                         confidence=hetConf, coverage=cov,
-                                         frequency1=cssFreq, frequency2=altFreq,
-                                         refPrev=refPrev, readPrev=cssPrev)
-                vars = vars + vs
-
-        else:
-            #
-            # Haploid variant[s]?
-            #
-            if (conf >= config.minConfidence) and \
-               (refBase  != cssBases)         and \
-               (refBase  != "N")              and \
-               (cssBases != "N")              and \
-               (cssBases == "" or cssBases.isupper()):
-
-                vs = varsFromRefAndRead(refId, refPos, refBase, cssBases,
-                                        confidence=conf, coverage=cov,
-                                        frequency1=cssFreq,
-                                        refPrev=refPrev, readPrev=cssPrev)
-                vars = vars + vs
-
-        # if we have ref or css bases, update the anchors
-        refPrev = refBase if refBase else refPrev
-        cssPrev = cssBases[-1] if cssBases else cssPrev
+            vars.extend(varsFromRefAndRead(refId, refPos, refBase, consensusArray[j],
+                                           confidence=consensusConfidenceArray[j],
+                                           coverage=coverageArray[j],
+                                           frequency1=consensusFrequencyArray[j],
+                                           refPrev=refPrev, readPrev=cssPrev))
 
     if config.diploid:
         vars = filter(_isSameLengthVariant, vars)
     return sorted(vars)
 
-def tabulateBaseCalls(refWindow, alns, realignHomopolymers=False):
+#
+# ------ PILEUP OF READ BASE CALLS ----------
+#
+
+# Calls counted in the pileup matrix; any other call is OTHER_CALL
+CALLS = np.array(["A", "C", "G", "T", "-"])
+OTHER_CALL = len(CALLS)
+
+# Calls are truncated to this many bases
+MAX_CALL_LENGTH = 8
+
+_GAP = ord("-")
+_callCodes = np.empty(256, dtype=np.int8)
+_callCodes.fill(OTHER_CALL)
+for _code, _call in enumerate(CALLS):
+    _callCodes[ord(_call)] = _code
+_callStrings = np.append(CALLS, "")
+
+class BaseCalls(object):
     """
-    Go through the reads and build up the structured baseCallsMatrix
-    table, which tabulates the read bases occurring at each reference
-    coordinate in each read.  This code is somewhat tricky, read carefully.
+    The base calls of a set of reads at each reference position they
+    span, in a window.  The call of a read at a reference position is
+    the read bases seen since the previous reference base, or "-" if
+    there are none.
+
+    Call k is made by read `read[k]` at window position `position[k]`;
+    `code[k]` indexes CALLS, or is OTHER_CALL, in which case the call
+    (of two or more bases, or a base other than A/C/G/T; truncated
+    to MAX_CALL_LENGTH) is found in the parallel
+    arrays `otherRead`, `otherPosition` and `otherCall`.
+    """
+    def __init__(self, read, position, code,
+                 otherRead, otherPosition, otherCall):
+        self.read          = read
+        self.position      = position
+        self.code          = code
+        self.otherRead     = otherRead
+        self.otherPosition = otherPosition
+        self.otherCall     = otherCall
+
+def windowBaseCalls(refWindow, alns, realignHomopolymers=False):
+    """
+    Tabulate the BaseCalls of the alns in the window, processing the
+    gapped alignments of all the reads together.
     """
     _, refStart, refEnd = refWindow
-    windowSize = refEnd - refStart
-
-    baseCallsMatrix = np.zeros(shape=(len(alns), windowSize), dtype="S8")
-
-    for i, aln in enumerate(alns):
+    alnRefs, alnReads, starts = [], [], []
+    for aln in alns:
         aln = aln.clippedTo(refStart, refEnd)
         alnRef    = aln.reference(orientation="genomic")
         alnRead   = aln.read(orientation="genomic")
         if realignHomopolymers:
             alnRef, alnRead =  normalizeHomopolymerGaps(alnRef, alnRead)
+        alnRefs.append(alnRef)
+        alnReads.append(alnRead)
+        starts.append(aln.referenceStart - refStart)
+
+    ref  = np.frombuffer("".join(alnRefs),  dtype=np.uint8)
+    read = np.frombuffer("".join(alnReads), dtype=np.uint8)
+    readOfColumn = np.repeat(np.arange(len(alns)), map(len, alnRefs))
+    isRefBase = ref != _GAP
+
+    # Number the reference positions of all the reads consecutively.
+    # Read bases are called at the next reference position of their
+    # read; those past the last reference position are dropped.
+    callIndex = np.cumsum(isRefBase) - isRefBase
+    numCalls = int(isRefBase.sum())
+    readOfCall = readOfColumn[isRefBase]
+    firstCallOfRead = np.searchsorted(readOfCall, np.arange(len(alns)))
+    positionOfCall = (np.array(starts, dtype=int)[readOfCall] +
+                      np.arange(numCalls) - firstCallOfRead[readOfCall])
+    isReadBase = (read != _GAP) & (callIndex < numCalls)
+    isReadBase[isReadBase] = (readOfCall[callIndex[isReadBase]] ==
+                              readOfColumn[isReadBase])
+
+    code = _callCodes[read[isRefBase]]
+    code[callIndex[isReadBase & ~isRefBase]] = OTHER_CALL
+
+    # An inserted base followed by a deletion is a call of one base,
+    # which must be counted with the same call made without a gap
+    basesInCall = np.bincount(callIndex[isReadBase], minlength=numCalls)
+    lastBaseOfCall = np.zeros(numCalls, dtype=np.uint8)
+    lastBaseOfCall[callIndex[isReadBase]] = read[isReadBase]
+    isSingleBase = (code == OTHER_CALL) & (basesInCall == 1)
+    code[isSingleBase] = _callCodes[lastBaseOfCall[isSingleBase]]
+
+    # Other calls are never empty: gather their read bases and lay
+    # them out, one call per row, in a fixed-width byte matrix.
+    isOther = code == OTHER_CALL
+    otherIndex = np.flatnonzero(isOther)
+    isOtherBase = isReadBase.copy()
+    isOtherBase[isOtherBase] = isOther[callIndex[isOtherBase]]
+    otherCallIndex = callIndex[isOtherBase]
+    rowOfBase = np.searchsorted(otherIndex, otherCallIndex)
+    rankInCall = (np.arange(len(otherCallIndex)) -
+                  np.searchsorted(otherCallIndex, otherCallIndex))
+    fits = rankInCall < MAX_CALL_LENGTH
+    otherBytes = np.zeros((len(otherIndex), MAX_CALL_LENGTH), dtype=np.uint8)
+    otherBytes[rowOfBase[fits], rankInCall[fits]] = read[isOtherBase][fits]
+    otherCall = otherBytes.view("S%d" % MAX_CALL_LENGTH).ravel()
+    return BaseCalls(readOfCall, positionOfCall, code,
+                     readOfCall[otherIndex], positionOfCall[otherIndex], otherCall)
+
+def tabulateBaseCalls(refWindow, alns, realignHomopolymers=False):
+    """
+    Go through the reads and build up the structured baseCallsMatrix
+    table, which tabulates the read bases occurring at each reference
+    coordinate in each read.
+    """
+    _, refStart, refEnd = refWindow
+    windowSize = refEnd - refStart
 
-        # Idea: scan through the ref, read; for each non-gap character
-        # in ref, record all non-gap characters seen in read since
-        # last ref gap.
-        readBases = []
-        accum = []
-        for (refBase, readBase) in izip(alnRef, alnRead):
-            if readBase != "-":
-                readBases.append(readBase)
-            if refBase != "-":
-                basesForRefPos = "".join(readBases) if readBases else "-"
-                accum.append(basesForRefPos)
-                readBases = []
-        s, e = (aln.referenceStart - refStart,
-                aln.referenceEnd   - refStart)
-        baseCallsMatrix[i, s:e] = accum
+    baseCalls = windowBaseCalls(refWindow, alns, realignHomopolymers)
+    baseCallsMatrix = np.zeros(shape=(len(alns), windowSize),
+                               dtype="S%d" % MAX_CALL_LENGTH)
+    baseCallsMatrix[baseCalls.read, baseCalls.position] = _callStrings[baseCalls.code]
+    baseCallsMatrix[baseCalls.otherRead, baseCalls.otherPosition] = baseCalls.otherCall
     return baseCallsMatrix
 
+class BaseCallPileup(object):
+    """
+    Tally of the read base calls at each position of a window.  Calls
+    in CALLS are counted in `counts`, a (windowSize x len(CALLS))
+    integer matrix; the rarer other calls are kept in the sparse table
+    `otherCalls`, mapping a window position to a dict of the counts
+    of each call.
+    """
+    def __init__(self, counts, otherCalls):
+        self.counts     = counts
+        self.otherCalls = otherCalls
+
+    def callCounts(self, j):
+        """
+        Counter of all the calls at window position j
+        """
+        counter = Counter(dict((call, count)
+                               for (call, count) in izip(CALLS, self.counts[j])
+                               if count > 0))
+        counter.update(self.otherCalls.get(j, {}))
+        return counter
+
+def pileupBaseCalls(refWindow, alns, realignHomopolymers=False):
+    """
+    Build the BaseCallPileup for the reads in the window
+    """
+    _, refStart, refEnd = refWindow
+    windowSize = refEnd - refStart
+    numCodes = OTHER_CALL + 1
+
+    baseCalls = windowBaseCalls(refWindow, alns, realignHomopolymers)
+    counts = np.bincount(baseCalls.position * numCodes + baseCalls.code,
+                         minlength=windowSize * numCodes)
+    counts = counts.reshape(windowSize, numCodes)[:, :OTHER_CALL]
+
+    return BaseCallPileup(counts, _otherCallTable(baseCalls.otherPosition,
+                                                  baseCalls.otherCall))
+
+def _tallyOtherCalls(otherPosition, otherCall):
+    """
+    The distinct (position, call) pairs among the other calls, with
+    their multiplicities, as (position, call, count) triples
+    """
+    order = np.lexsort((otherCall, otherPosition))
+    position, call = otherPosition[order], otherCall[order]
+    isFirst = np.ones(len(position), dtype=bool)
+    isFirst[1:] = (position[1:] != position[:-1]) | (call[1:] != call[:-1])
+    firsts = np.flatnonzero(isFirst)
+    multiplicity = np.diff(np.append(firsts, len(position)))
+    return izip(position[firsts].tolist(), call[firsts].tolist(),
+                multiplicity.tolist())
+
+def _otherCallTable(otherPosition, otherCall, offset=0):
+    """
+    The otherCalls table of a BaseCallPileup, for the other calls at
+    these positions less `offset`
+    """
+    otherCalls = {}
+    for j, c, n in _tallyOtherCalls(otherPosition, otherCall):
+        otherCalls.setdefault(j - offset, {})[c] = n
+    return otherCalls
+
+class RollingPileup(object):
+    """
+    BaseCallPileup of a stripe of the reference, accumulated as reads
+    are added in order of their reference start.  Once no read still
+    to be added can reach a window, its pileup is final; it is handed
+    out by `popWindow`, which releases the counts and other calls it
+    held.  Windows must be popped in reference order.
+
+    Counts are kept only for the live range, from the first position
+    not yet popped to the end of the reads added so far, so the memory
+    held follows the read length and not the stripe length.
+    """
+    def __init__(self, stripeWindow, realignHomopolymers=False):
+        self._window = stripeWindow
+        self._realignHomopolymers = realignHomopolymers
+        self._counts = np.zeros((0, OTHER_CALL), dtype=np.int32)
+        self._countsStart = 0   # (stripe) position of _counts[0]
+        self._popped = 0        # positions before this have been popped
+        # Other calls are kept as they came, as (positions, calls)
+        # arrays, and only tallied when their window is popped
+        self._otherPositions = []
+        self._otherCalls = []
+
+    def _reserve(self, end):
+        """
+        Make room in the counts for positions up to `end`, dropping
+        those already popped
+        """
+        if end - self._countsStart <= len(self._counts):
+            return
+        live = self._counts[self._popped - self._countsStart:]
+        counts = np.zeros((max(end - self._popped, 2 * len(live)), OTHER_CALL),
+                          dtype=np.int32)
+        counts[:len(live)] = live
+        self._counts, self._countsStart = counts, self._popped
+
+    def add(self, alns):
+        """
+        Add the base calls of the alns, clipped to the stripe
+        """
+        if not alns:
+            return
+        numCodes = OTHER_CALL + 1
+        baseCalls = windowBaseCalls(self._window, alns, self._realignHomopolymers)
+        if len(baseCalls.position) == 0:
+            return
+        # Only tally the span of positions these reads cover
+        lo = baseCalls.position.min()
+        hi = baseCalls.position.max() + 1
+        assert lo >= self._popped, "read added after its window was popped"
+        self._reserve(hi)
+        counts = np.bincount((baseCalls.position - lo) * numCodes + baseCalls.code,
+                             minlength=(hi - lo) * numCodes)
+        s = lo - self._countsStart
+        self._counts[s:s + hi - lo] += counts.reshape(hi - lo, numCodes)[:, :OTHER_CALL]
+        if len(baseCalls.otherPosition):
+            self._otherPositions.append(baseCalls.otherPosition)
+            self._otherCalls.append(baseCalls.otherCall)
+
+    def popWindow(self, window):
+        """
+        The BaseCallPileup of a window within the stripe
+        """
+        _, stripeStart, _ = self._window
+        _, winStart, winEnd = window
+        s, e = winStart - stripeStart, winEnd - stripeStart
+        assert s >= self._popped, "windows must be popped in order"
+        counts = np.zeros((e - s, OTHER_CALL), dtype=np.int32)
+        held = self._counts[s - self._countsStart:e - self._countsStart]
+        counts[:len(held)] = held
+        otherCalls = {}
+        if self._otherPositions:
+            positions = np.concatenate(self._otherPositions)
+            calls = np.concatenate(self._otherCalls)
+            inWindow = positions < e
+            otherCalls = _otherCallTable(positions[inWindow], calls[inWindow], s)
+            self._otherPositions = [ positions[~inWindow] ]
+            self._otherCalls = [ calls[~inWindow] ]
+        self._popped = e
+        # Release the popped counts once they are most of the buffer
+        if 2 * (self._popped - self._countsStart) > len(self._counts):
+            self._counts = self._counts[self._popped - self._countsStart:].copy()
+            self._countsStart = self._popped
+        return BaseCallPileup(counts, otherCalls)
+
+def columnConsensus(pileup, noCallSequence, minCoverage):
+    """
+    Call the consensus and alternate allele at every position of the
+    pileup at once.  Returns the arrays (consensus, consensusFrequency,
+    effectiveCoverage, alternate, alternateFrequency).
+
+    Where the effective coverage is below `minCoverage` (or zero) the
+    consensus is taken from `noCallSequence`, and there is no
+    alternate ("N", frequency 0); likewise where there is only one
+    call.  Deletions ("-") are called as the empty string.  Ties in
+    frequency go to the call listed first in CALLS, then to the other
+    calls in lexical order.
+    """
+    windowSize = len(pileup.counts)
+    numCandidates = OTHER_CALL + 2
+
+    # The candidates at each position are CALLS and the two most
+    # frequent other calls
+    calls = np.empty((windowSize, numCandidates), dtype=object)
+    calls[:, :OTHER_CALL] = CALLS
+    calls[:, OTHER_CALL:] = ""
+    counts = np.zeros((windowSize, numCandidates), dtype=int)
+    counts[:, :OTHER_CALL] = pileup.counts
+    otherCoverage = np.zeros(windowSize, dtype=int)
+    for j, counter in pileup.otherCalls.iteritems():
+        otherCoverage[j] = sum(counter.itervalues())
+        top2 = sorted(counter.iteritems(), key=lambda item: (-item[1], item[0]))[:2]
+        for k, (call, n) in enumerate(top2):
+            calls[j, OTHER_CALL + k]  = call
+            counts[j, OTHER_CALL + k] = n
+
+    effectiveCoverage = pileup.counts.sum(axis=1) + otherCoverage
+    ranked = np.argsort(-counts, axis=1, kind="mergesort")
+    positions = np.arange(windowSize)
+    consensus          = calls[positions, ranked[:, 0]]
+    consensusFrequency = counts[positions, ranked[:, 0]]
+    alternate          = calls[positions, ranked[:, 1]]
+    alternateFrequency = counts[positions, ranked[:, 1]]
+
+    noCall = (effectiveCoverage == 0) | (effectiveCoverage < minCoverage)
+    consensus[noCall] = np.array(list(noCallSequence), dtype=object)[noCall]
+    consensusFrequency[noCall] = effectiveCoverage[noCall]
+    noAlternate = noCall | (alternateFrequency == 0)
+    alternate[noAlternate] = "N"
+    alternateFrequency[noAlternate] = 0
+
+    # Replace explicit gaps with empty string
+    consensus[consensus == "-"] = ""
+    alternate[alternate == "-"] = ""
+    return (consensus, consensusFrequency, effectiveCoverage,
+            alternate, alternateFrequency)
+
 #
 # ------ HACKISH POSTERIOR PROBABILITY CALCULATION ----------
 #
@@ -319,26 +591,99 @@ def posteriorConfidences(depth, cssFreq, altFreq, diploid=False, cap=40):
     probability of the genotype being anything other that s_1, s_2, or
     s_1/s_2 is vanishingly small.  Not really a very good assumption,
     but plurality is not our real algorithm anyway.
+
+    Arguments may be scalars or arrays (of sites); the confidences are
+    returned correspondingly.
     """
-    cssFreq = cssFreq+1
-    altFreq = altFreq+1
-    depth = depth + 2
-    cssLL_ = cssFreq*LOG_O_M_EPS + (depth-cssFreq)*LOGEPS
-    altLL_ = altFreq*LOG_O_M_EPS + (depth-altFreq)*LOGEPS
-    cssL_ = np.exp(cssLL_)
-    altL_ = np.exp(altLL_)
-    if diploid:
-        hetLL_ = (cssFreq+altFreq)*LOG_O_M_EPS_2 + (depth-cssFreq-altFreq)*LOGEPS
-        hetL_ = np.exp(hetLL_)
-        total =  cssL_ + altL_ + hetL_
-        hetProb = hetL_/total
-        hetConf = -10*np.log10(1.-hetProb) if (hetProb < 1) else cap
-    else:
-        total =  cssL_ + altL_
-        hetConf = 0
-    cssProb = cssL_/total
-    cssConf = -10*np.log10(1.-cssProb) if (cssProb < 1) else cap
-    return int(min(cap, cssConf)), int(min(cap, hetConf))
+    cssFreq = np.asarray(cssFreq)+1
+    altFreq = np.asarray(altFreq)+1
+    depth = np.asarray(depth) + 2
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        cssLL_ = cssFreq*LOG_O_M_EPS + (depth-cssFreq)*LOGEPS
+        altLL_ = altFreq*LOG_O_M_EPS + (depth-altFreq)*LOGEPS
+        cssL_ = np.exp(cssLL_)
+        altL_ = np.exp(altLL_)
+        if diploid:
+            hetLL_ = (cssFreq+altFreq)*LOG_O_M_EPS_2 + (depth-cssFreq-altFreq)*LOGEPS
+            hetL_ = np.exp(hetLL_)
+            total =  cssL_ + altL_ + hetL_
+            hetProb = hetL_/total
+            hetConf = np.where(hetProb < 1, -10*np.log10(1.-hetProb), cap)
+        else:
+            total =  cssL_ + altL_
+            hetConf = np.zeros_like(total)
+        cssProb = cssL_/total
+        cssConf = np.where(cssProb < 1, -10*np.log10(1.-cssProb), cap)
+    cssConf = np.minimum(cap, cssConf).astype(int)
+    hetConf = np.minimum(cap, hetConf).astype(int)
+    if cssConf.ndim == 0:
+        return int(cssConf), int(hetConf)
+    return cssConf, hetConf
+
+# The confidence table holds (depth+1)^3 entries, so it stops growing
+# at this depth whatever the coverage limit
+MAX_CONFIDENCE_TABLE_DEPTH = 200
+
+class ConfidenceTable(object):
+    """
+    Table of posteriorConfidences for every (depth, cssFreq, altFreq)
+    up to some depth, so that the confidences of all the sites in a
+    window can be gathered without evaluating the likelihoods.  The
+    table is grown as deeper sites are seen, up to `maxDepth` (the
+    coverage limit) or MAX_CONFIDENCE_TABLE_DEPTH, whichever is
+    smaller; any deeper sites are computed directly.
+    """
+    _tables = {}
+
+    @staticmethod
+    def forDepth(diploid, maxDepth):
+        """
+        The (per-process) table for this mode and depth limit
+        """
+        key = (diploid, maxDepth)
+        if key not in ConfidenceTable._tables:
+            ConfidenceTable._tables[key] = ConfidenceTable(diploid, maxDepth)
+        return ConfidenceTable._tables[key]
+
+    def __init__(self, diploid, maxDepth):
+        self.diploid  = diploid
+        self.maxDepth = min(maxDepth, MAX_CONFIDENCE_TABLE_DEPTH)
+        self.depth    = -1
+        self._cssConf = None
+        self._hetConf = None
+
+    def _grow(self, depth):
+        depth = min(self.maxDepth, max(depth, 2 * self.depth))
+        self._cssConf = np.empty((depth+1, depth+1, depth+1), dtype=np.uint8)
+        self._hetConf = np.empty((depth+1, depth+1, depth+1), dtype=np.uint8)
+        # One depth at a time, to keep the float temporaries small
+        c, a = np.ogrid[:depth+1, :depth+1]
+        for d in xrange(depth+1):
+            self._cssConf[d], self._hetConf[d] = \
+                posteriorConfidences(d, c, a, diploid=self.diploid)
+        self.depth = depth
+
+    def lookup(self, depth, cssFreq, altFreq):
+        """
+        posteriorConfidences(depth, cssFreq, altFreq) for arrays of sites
+        """
+        depth, cssFreq, altFreq = np.broadcast_arrays(depth, cssFreq, altFreq)
+        deepest = depth.max() if depth.size else 0
+        if deepest > self.depth and self.depth < self.maxDepth:
+            self._grow(deepest)
+
+        cssConf = np.zeros(depth.shape, dtype=int)
+        hetConf = np.zeros(depth.shape, dtype=int)
+        inTable = depth <= self.depth
+        index = (depth[inTable], cssFreq[inTable], altFreq[inTable])
+        cssConf[inTable] = self._cssConf[index]
+        hetConf[inTable] = self._hetConf[index]
+        if not inTable.all():
+            deep = ~inTable
+            cssConf[deep], hetConf[deep] = \
+                posteriorConfidences(depth[deep], cssFreq[deep], altFreq[deep],
+                                     diploid=self.diploid)
+        return cssConf, hetConf
 
 #
 # --------------  Plurality Worker class --------------------
@@ -374,6 +719,51 @@ class PluralityWorker(object):
                 pluralityConsensusAndVariants(referenceWindow, refSeqInWindow,
                                               alnHits, self.pluralityConfig))
 
+    def onStripe(self, workStripe):
+        """
+        With --streamingPileup, make a single pass over the reads of
+        the stripe in reference order, adding each to a RollingPileup
+        as it is decoded, and call each chunk once no read still to be
+        read can reach it.  Otherwise, process the chunks one by one.
+        """
+        if not options.streamingPileup:
+            for result in super(PluralityWorker, self).onStripe(workStripe):
+                yield result
+            return
+
+        stripeWindow = workStripe.window
+        rows = filteredReadsInRange(self._inAlnFile, stripeWindow,
+                                    minMapQV=options.minMapQV,
+                                    barcode=options.barcode)
+        tStart = self._inAlnFile.index.tStart[rows]
+        order = np.lexsort((rows, tStart))
+        rows, tStart = rows[order], tStart[order]
+
+        pileup = RollingPileup(stripeWindow,
+                               self.pluralityConfig.realignHomopolymers)
+        added = 0
+        for workChunk in workStripe.chunks:
+            self._logWorkChunk(workChunk)
+            referenceWindow = workChunk.window
+            _, _, winEnd = referenceWindow
+            reachable = np.searchsorted(tStart, winEnd)
+            if reachable > added:
+                pileup.add(self._inAlnFile[rows[added:reachable].tolist()])
+                added = reachable
+            windowPileup = pileup.popWindow(referenceWindow)
+
+            refSeqInWindow = reference.sequenceInWindow(referenceWindow)
+            logging.info("Plurality operating on %s" %
+                         reference.windowToString(referenceWindow))
+            if not workChunk.hasCoverage:
+                noCallCss = Consensus.noCallConsensus(options.noEvidenceConsensusCall,
+                                                      referenceWindow, refSeqInWindow)
+                yield (referenceWindow, (noCallCss, []))
+            else:
+                yield (referenceWindow,
+                       consensusAndVariantsFromPileup(referenceWindow, refSeqInWindow,
+                                                      windowPileup, self.pluralityConfig))
+
 # define both process and thread-based plurality callers
 class PluralityWorkerProcess(PluralityWorker, WorkerProcess): pass
 class PluralityWorkerThread(PluralityWorker, WorkerThread): pass
@@ -413,5 +803,6 @@ def configure(options, cmpH5):
                                       minCoverage=options.minCoverage,
                                       minConfidence=options.minConfidence,
                                       diploid=options.diploid,
-                                      noEvidenceConsensus=options.noEvidenceConsensusCall)
+                                      noEvidenceConsensus=options.noEvidenceConsensusCall,
+                                      maxCoverage=options.coverage)
     return pluralityConfig
@@ -174,6 +174,7 @@ def poaConsensusAndVariants(alnFile, refWindow, referenceContig,
         alns = readsInWindow(alnFile, subWin,
                              depthLimit=depthLimit,
                              minMapQV=poaConfig.minMapQV,
+                             minReadScore=poaConfig.minReadScore,
                              strategy="longest",
                              stratum=options.readStratum,
                              barcode=options.barcode)
@@ -0,0 +1,115 @@
+# progress.py: progress, throughput and ETA of a run
+#
+#  The result collector counts the reference bases of the windows it
+#  has received against the total to be analyzed.  Each result also
+#  carries the seconds its worker spent computing it, from which we
+#  get the utilization of each worker.  Reports go to the log and,
+#  optionally, to a JSON status file that schedulers can poll; it is
+#  replaced atomically, so readers never see a partial file.
+#
+from __future__ import absolute_import, division, print_function
+
+import json, logging, os, time
+from collections import deque
+
+from .utils import formatDuration
+
+__all__ = [ "ProgressReporter" ]
+
+
+class ProgressReporter(object):
+    """
+    Tracks the bases and chunks completed, and reports at most every
+    `interval` seconds.  Rates, and hence the ETA, are measured over
+    the last `rateWindow` reports, so they follow changes in speed
+    (e.g. as coverage varies along the genome).
+    """
+    def __init__(self, totalBases, interval, statusFilename=None,
+                 rateWindow=10, clock=time.time):
+        self.totalBases      = totalBases
+        self.interval        = interval
+        self.statusFilename  = statusFilename
+        self._clock          = clock
+        self.startTime       = clock()
+        self.basesCompleted  = 0
+        self.chunksCompleted = 0
+        self.workerChunks    = {}
+        self.workerBusy      = {}
+        self._lastReport     = self.startTime
+        self._samples        = deque([(self.startTime, 0, 0)], maxlen=rateWindow + 1)
+
+    def recordResult(self, window, workerName=None, busySeconds=0.0):
+        _, refStart, refEnd = window
+        self.basesCompleted  += refEnd - refStart
+        self.chunksCompleted += 1
+        if workerName is not None:
+            self.workerChunks[workerName] = self.workerChunks.get(workerName, 0) + 1
+            self.workerBusy[workerName] = self.workerBusy.get(workerName, 0.0) + busySeconds
+
+    def status(self, queueDepths=None, state="running"):
+        """
+        The progress report, as a dict
+        """
+        now = self._clock()
+        elapsed = now - self.startTime
+        t0, bases0, chunks0 = self._samples[0]
+        span = now - t0
+        basesPerSecond  = (self.basesCompleted - bases0) / span if span > 0 else 0.0
+        chunksPerSecond = (self.chunksCompleted - chunks0) / span if span > 0 else 0.0
+        remaining = self.totalBases - self.basesCompleted
+        if remaining <= 0:
+            eta = 0.0
+        elif basesPerSecond > 0:
+            eta = remaining / basesPerSecond
+        else:
+            eta = None
+        workers = dict((name, { "chunks"       : self.workerChunks[name],
+                                "busySeconds"  : self.workerBusy[name],
+                                "utilization"  : (self.workerBusy[name] / elapsed
+                                                  if elapsed > 0 else 0.0) })
+                       for name in self.workerChunks)
+        return { "state"           : state,
+                 "time"            : now,
+                 "elapsedSeconds"  : elapsed,
+                 "basesCompleted"  : self.basesCompleted,
+                 "totalBases"      : self.totalBases,
+                 "fractionDone"    : (self.basesCompleted / self.totalBases
+                                      if self.totalBases else 1.0),
+                 "chunksCompleted" : self.chunksCompleted,
+                 "basesPerSecond"  : basesPerSecond,
+                 "chunksPerSecond" : chunksPerSecond,
+                 "etaSeconds"      : eta,
+                 "workers"         : workers,
+                 "queueDepths"     : queueDepths or {} }
+
+    def due(self):
+        return self.interval > 0 and self._clock() - self._lastReport >= self.interval
+
+    def report(self, queueDepths=None, state="running"):
+        """
+        Log the progress and update the status file
+        """
+        status = self.status(queueDepths, state)
+        self._lastReport = status["time"]
+        self._samples.append((status["time"], self.basesCompleted, self.chunksCompleted))
+
+        utilizations = [ w["utilization"] for w in status["workers"].values() ]
+        msg = ("Progress: %.1f%% (%d of %d bases, %d chunks), %.0f bases/s, "
+               "%.2f chunks/s, ETA %s" %
+               (100 * status["fractionDone"], self.basesCompleted, self.totalBases,
+                self.chunksCompleted, status["basesPerSecond"],
+                status["chunksPerSecond"], formatDuration(status["etaSeconds"])))
+        if utilizations:
+            msg += "; workers %.0f%% busy (min %.0f%%)" % (
+                100 * sum(utilizations) / len(utilizations), 100 * min(utilizations))
+        if status["queueDepths"]:
+            msg += "; queues: " + ", ".join("%s %d" % item for item in
+                                            sorted(status["queueDepths"].items()))
+        logging.info(msg)
+
+        if self.statusFilename:
+            temporaryFilename = self.statusFilename + ".tmp"
+            with open(temporaryFilename, "w") as f:
+                json.dump(status, f, indent=2, sort_keys=True)
+            os.rename(temporaryFilename, self.statusFilename)
+        return status
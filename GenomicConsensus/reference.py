@@ -5,7 +5,8 @@ import logging, re, numpy as np
 from collections import OrderedDict
 from pbcore.io import ReferenceSet
 
-from .windows import holes, kCoveredIntervals, enumerateIntervals
+from .windows import holes, enumerateIntervals
+from .coverage import CoverageProfile
 from .utils import die, nub
 
 class WorkChunk(object):
@@ -16,6 +17,17 @@ class WorkChunk(object):
         self.window      = window
         self.hasCoverage = hasCoverage
 
+class WorkStripe(object):
+    """
+    A run of contiguous chunks of one reference contig, to be
+    processed in order by a single worker
+    """
+    def __init__(self, chunks):
+        assert len(chunks) >= 1
+        self.chunks = chunks
+        refId, start, _ = chunks[0].window
+        self.window = (refId, start, chunks[-1].window[2])
+
 class UppercasingMmappedFastaSequence(object):
     def __init__(self, mmappedFastaSequence):
         self.other = mmappedFastaSequence
@@ -167,6 +179,18 @@ def enumerateSpans(refId, referenceWindows=()):
         if refWinId == refId:
             yield (refId, start, end)
 
+def spanName(span):
+    """
+    The name output for an analyzed span: the contig's full name,
+    qualified by the bounds unless the span is the whole contig.
+    """
+    refId, s, e = span
+    refEntry = byName[refId]
+    if (s == 0) and (e == refEntry.length):
+        return refEntry.fullName
+    else:
+        return refEntry.fullName + "_%d_%d" % (s, e)
+
 def enumerateChunks(refId, referenceStride, referenceWindows=()):
     """
     Enumerate all work chunks on this reference contig (restricted to
@@ -177,27 +201,31 @@ def enumerateChunks(refId, referenceStride, referenceWindows=()):
             yield WorkChunk((refId, s, e), True)
 
 def fancyEnumerateChunks(alnFile, refId, referenceStride,
-                         minCoverage, minMapQV, referenceWindows=()):
+                         minCoverage, minMapQV, referenceWindows=(),
+                         coverageProfile=None):
     """
     Enumerate chunks, creating chunks with hasCoverage=False for
     coverage cutouts.
-    """
-    # Pull out rows with this refId and good enough MapQV
-    rows = alnFile.index[
-        ((alnFile.tId == alnFile.referenceInfo(refId).ID) &
-         (alnFile.mapQV >= minMapQV))]
-
-    unsorted_tStart = rows.tStart
-    unsorted_tEnd = rows.tEnd
 
-    # Sort (expected by CoveredIntervals)
-    sort_order = np.lexsort((unsorted_tEnd, unsorted_tStart))
-    tStart = unsorted_tStart[sort_order].tolist()
-    tEnd = unsorted_tEnd[sort_order].tolist()
+    The coverage cutouts are found using `coverageProfile`, in which
+    the runs of each contig are a slice; callers enumerating many
+    contigs should compute it once and pass it in.  Otherwise it is
+    computed for this contig alone.
+    """
+    tId = alnFile.referenceInfo(refId).ID
+    if coverageProfile is None:
+        rows = np.flatnonzero(alnFile.tId == tId)
+        coverageProfile = CoverageProfile.fromIndex(alnFile.tId[rows],
+                                                    alnFile.index.tStart[rows],
+                                                    alnFile.index.tEnd[rows],
+                                                    alnFile.mapQV[rows],
+                                                    minMapQV)
+    assert coverageProfile.minMapQV == minMapQV
 
     for span in enumerateSpans(refId, referenceWindows):
         _, spanStart, spanEnd = span
-        coveredIntervals = kCoveredIntervals(minCoverage, tStart, tEnd, spanStart, spanEnd)
+        coveredIntervals = coverageProfile.kCoveredIntervals(tId, minCoverage,
+                                                             spanStart, spanEnd)
         unCoveredIntervals = holes(span, coveredIntervals)
 
         for (s, e) in sorted(list(coveredIntervals) + unCoveredIntervals):
@@ -209,6 +237,26 @@ def fancyEnumerateChunks(alnFile, refId, referenceStride,
                 yield WorkChunk(win, False)
 
 
+def enumerateStripes(chunks, stripeSize):
+    """
+    Group consecutive, contiguous work chunks into stripes spanning
+    at least `stripeSize` reference bases (except at the end of a
+    contiguous span).
+    """
+    stripe = []
+    for chunk in chunks:
+        if stripe:
+            stripeId, stripeStart, stripeEnd = WorkStripe(stripe).window
+            refId, start, _ = chunk.window
+            if (refId != stripeId or start != stripeEnd or
+                stripeEnd - stripeStart >= stripeSize):
+                yield WorkStripe(stripe)
+                stripe = []
+        stripe.append(chunk)
+    if stripe:
+        yield WorkStripe(stripe)
+
+
 def numReferenceBases(refId, referenceWindows=()):
     """
     Termination is determined to be when the result collector has
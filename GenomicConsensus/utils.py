@@ -76,14 +76,49 @@ def rowNumberIsInReadStratum(readStratum, rowNumber):
     n, N = readStratum
     return (rowNumber % N) == n
 
+def hasIndexColumn(alnFile, columnName):
+    """
+    Does the alignment file's index carry the named column?  (The
+    .pbi of a BAM file has e.g. readQual, which a cmp.h5 index lacks.)
+    """
+    names = getattr(getattr(alnFile.index, "dtype", None), "names", None)
+    return names is not None and columnName in names
+
+def filteredReadsInRange(alnFile, window, minMapQV=0,
+                         barcode=None, minReadScore=None):
+    """
+    Row numbers (as an array) of the reads intersecting the window
+    that pass the mapQV, barcode and `minReadScore` criteria, tested
+    on the index alone.
+    """
+    winId, winStart, winEnd = window
+    alnHits = np.array(list(alnFile.readsInRange(winId, winStart, winEnd,
+                                                 justIndices=True)), dtype=int)
+    if len(alnHits) == 0:
+        return alnHits
+
+    mask = alnFile.mapQV[alnHits] >= minMapQV
+    if barcode != None:
+        # this wont work with CmpH5 (no bc in index):
+        barcode = ast.literal_eval(barcode)
+        mask &= ((alnFile.index.bcLeft[alnHits] == barcode[0]) &
+                 (alnFile.index.bcRight[alnHits] == barcode[1]))
+    if minReadScore is not None and hasIndexColumn(alnFile, "readQual"):
+        mask &= alnFile.index.readQual[alnHits] >= minReadScore
+    return alnHits[mask]
+
 def readsInWindow(alnFile, window, depthLimit=None,
                   minMapQV=0, strategy="fileorder",
-                  stratum=None, barcode=None):
+                  stratum=None, barcode=None, minReadScore=None):
     """
     Return up to `depthLimit` reads (as row numbers integers) where
     the mapped reference intersects the window.  If depthLimit is None,
     return all the reads meeting the criteria.
 
+    The criteria (mapQV, barcode, and `minReadScore` where the index
+    records the read quality) are applied to the index, so that reads
+    failing them are never decoded.
+
     `strategy` can be:
       - "longest" --- get the reads with the longest length in the window
       - "spanning" --- get only the reads spanning the window
@@ -106,20 +141,11 @@ def readsInWindow(alnFile, window, depthLimit=None,
                 max(alnFile.index.tStart[hit], winStart))
 
     winId, winStart, winEnd = window
-    alnHits = np.array(list(alnFile.readsInRange(winId, winStart, winEnd,
-                                                 justIndices=True)))
+    alnHits = filteredReadsInRange(alnFile, window, minMapQV,
+                                   barcode, minReadScore)
     if len(alnHits) == 0:
         return []
 
-    if barcode == None:
-        alnHits = alnHits[alnFile.mapQV[alnHits] >= minMapQV]
-    else:
-        # this wont work with CmpH5 (no bc in index):
-        barcode = ast.literal_eval(barcode)
-        alnHits = alnHits[(alnFile.mapQV[alnHits] >= minMapQV) &
-                          (alnFile.index.bcLeft[alnHits] == barcode[0]) &
-                          (alnFile.index.bcRight[alnHits] == barcode[1])]
-
     if strategy == "fileorder":
         return depthCap(alnHits)
     elif strategy == "spanning":
@@ -168,6 +194,21 @@ def datasetCountExceedsThreshold(alnFile, threshold):
             return True
     return False
 
+def formatDuration(seconds):
+    """
+    A duration for humans, e.g. "42 s", "3.5 min", "2.1 h"
+    """
+    if seconds is None:
+        return "unknown"
+    elif seconds < 10:
+        return "%.1f s" % seconds
+    elif seconds < 120:
+        return "%.0f s" % seconds
+    elif seconds < 7200:
+        return "%.1f min" % (seconds / 60)
+    else:
+        return "%.1f h" % (seconds / 3600)
+
 #
 # Some lisp functions we want
 #
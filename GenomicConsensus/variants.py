@@ -1,8 +1,11 @@
 # Author: David Alexander
 from __future__ import absolute_import, division, print_function
+import numpy as np
 from .utils import CommonEqualityMixin
 
-__all__ = [ "Variant" ]
+__all__ = [ "Variant",
+            "VariantTable",
+            "asVariantTable" ]
 
 class Variant(CommonEqualityMixin):
     """
@@ -92,3 +95,192 @@ def annotateVariants(variants, alns):
     # Operates in place
     for v in variants:
         v.annotate("rows", ",".join(str(a.rowNumber) for a in alns))
+
+
+class VariantTable(object):
+    """
+    Columnar store of variants, as a structured array with one row per
+    variant.  The string fields (refId, refSeq, readSeq1, readSeq2,
+    refPrev, readPrev) are interned in a shared pool, `strings`, and
+    stored as codes into it (-1 for None); absent numeric fields are
+    stored as -1 (NaN for the frequencies).  Annotations, which are
+    rare, and output records preformatted by the workers are kept in
+    parallel object arrays (OBJECT_COLUMNS), or not at all.
+
+    Indexing with an integer, or iterating, gives Variant objects;
+    indexing with a slice, mask or index array gives a VariantTable
+    sharing the pool.
+    """
+    STRING_FIELDS = ("refId", "refSeq", "readSeq1", "readSeq2",
+                     "refPrev", "readPrev")
+    DTYPE = np.dtype([("refId",      np.int32),
+                      ("refStart",   np.int64),
+                      ("refEnd",     np.int64),
+                      ("refSeq",     np.int32),
+                      ("readSeq1",   np.int32),
+                      ("readSeq2",   np.int32),
+                      ("refPrev",    np.int32),
+                      ("readPrev",   np.int32),
+                      ("confidence", np.int64),
+                      ("coverage",   np.int64),
+                      ("frequency1", np.float64),
+                      ("frequency2", np.float64)])
+    OBJECT_COLUMNS = ("annotations", "gffRecords", "vcfRecords")
+
+    def __init__(self, rows, strings, annotations=None,
+                 gffRecords=None, vcfRecords=None):
+        self.rows        = rows
+        self.strings     = strings
+        self.annotations = annotations
+        self.gffRecords  = gffRecords
+        self.vcfRecords  = vcfRecords
+
+    def _objectColumns(self, key=slice(None)):
+        columns = {}
+        for name in self.OBJECT_COLUMNS:
+            column = getattr(self, name)
+            if column is not None:
+                columns[name] = column[key]
+        return columns
+
+    @staticmethod
+    def fromVariants(variants):
+        strings = []
+        codes = {None: -1}
+        def intern(s):
+            code = codes.get(s)
+            if code is None:
+                code = codes[s] = len(strings)
+                strings.append(s)
+            return code
+        def orMissing(x, missing):
+            return missing if x is None else x
+
+        rows = np.empty(len(variants), dtype=VariantTable.DTYPE)
+        rows[:] = [ (intern(v.refId), v.refStart, v.refEnd,
+                     intern(v.refSeq), intern(v.readSeq1), intern(v.readSeq2),
+                     intern(v.refPrev), intern(v.readPrev),
+                     orMissing(v.confidence, -1), orMissing(v.coverage, -1),
+                     orMissing(v.frequency1, np.nan), orMissing(v.frequency2, np.nan))
+                    for v in variants ]
+        annotations = None
+        if any(v.annotations for v in variants):
+            annotations = np.empty(len(variants), dtype=object)
+            annotations[:] = [ v.annotations for v in variants ]
+        return VariantTable(rows, np.array(strings, dtype=object), annotations)
+
+    @staticmethod
+    def concatenate(tables):
+        """
+        One table holding the rows of all the tables, in order
+        """
+        strings = []
+        codes = {}
+        pieces = []
+        for table in tables:
+            # Map this table's codes into the merged pool; -1 maps to -1
+            remap = np.empty(len(table.strings) + 1, dtype=np.int32)
+            remap[-1] = -1
+            for code, s in enumerate(table.strings):
+                merged = codes.get(s)
+                if merged is None:
+                    merged = codes[s] = len(strings)
+                    strings.append(s)
+                remap[code] = merged
+            rows = table.rows.copy()
+            for field in VariantTable.STRING_FIELDS:
+                rows[field] = remap[rows[field]]
+            pieces.append(rows)
+        rows = (np.concatenate(pieces) if pieces
+                else np.empty(0, dtype=VariantTable.DTYPE))
+        columns = {}
+        for name in VariantTable.OBJECT_COLUMNS:
+            if any(getattr(table, name) is not None for table in tables):
+                columns[name] = np.concatenate([ getattr(table, name)
+                                                 if getattr(table, name) is not None
+                                                 else np.empty(len(table), dtype=object)
+                                                 for table in tables ])
+        return VariantTable(rows, np.array(strings, dtype=object), **columns)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _string(self, code):
+        return None if code < 0 else self.strings[code]
+
+    def variant(self, i):
+        row = self.rows[i]
+        confidence = int(row["confidence"])
+        coverage   = int(row["coverage"])
+        frequency1 = float(row["frequency1"])
+        frequency2 = float(row["frequency2"])
+        return Variant(self._string(row["refId"]),
+                       int(row["refStart"]),
+                       int(row["refEnd"]),
+                       self._string(row["refSeq"]),
+                       self._string(row["readSeq1"]),
+                       self._string(row["readSeq2"]),
+                       confidence=None if confidence < 0 else confidence,
+                       coverage=None if coverage < 0 else coverage,
+                       frequency1=None if np.isnan(frequency1) else frequency1,
+                       frequency2=None if np.isnan(frequency2) else frequency2,
+                       annotations=(None if self.annotations is None
+                                    else self.annotations[i]),
+                       refPrev=self._string(row["refPrev"]),
+                       readPrev=self._string(row["readPrev"]))
+
+    def __getitem__(self, key):
+        if np.isscalar(key):
+            return self.variant(key)
+        return VariantTable(self.rows[key], self.strings,
+                            **self._objectColumns(key))
+
+    def __iter__(self):
+        for i in xrange(len(self)):
+            yield self.variant(i)
+
+    def _stringRanks(self, field):
+        # Rank of each row's string in lexical order (None first)
+        ranks = np.empty(len(self.strings) + 1, dtype=np.int64)
+        ranks[-1] = -1
+        ranks[np.argsort(self.strings, kind="mergesort")] = np.arange(len(self.strings))
+        return ranks[self.rows[field]]
+
+    def sorted(self):
+        """
+        The table in Variant order: by refId, refStart, refEnd, then
+        readSeq1; ties keep their order
+        """
+        order = np.lexsort((self._stringRanks("readSeq1"),
+                            self.rows["refEnd"],
+                            self.rows["refStart"],
+                            self._stringRanks("refId")))
+        return self[order]
+
+    def meetsThresholds(self, minCoverage, minConfidence):
+        """
+        Mask of the variants with at least the given coverage and
+        confidence
+        """
+        return ((self.rows["coverage"] >= minCoverage) &
+                (self.rows["confidence"] >= minConfidence) &
+                (self.rows["coverage"] >= 0) &
+                (self.rows["confidence"] >= 0))
+
+    def keptAtSource(self, minCoverage, minConfidence, keepFraction):
+        """
+        Mask of the variants to pass on for output: all of those
+        meeting the thresholds, and a `keepFraction` of the others,
+        picked by a hash of their reference start
+        """
+        keepFraction = min(max(keepFraction, 0.0), 1.0)
+        hashed = (self.rows["refStart"].astype(np.uint64) *
+                  np.uint64(2654435761)) % np.uint64(2**32)
+        return (self.meetsThresholds(minCoverage, minConfidence) |
+                (hashed < np.uint64(keepFraction * 2**32)))
+
+
+def asVariantTable(variants):
+    if isinstance(variants, VariantTable):
+        return variants
+    return VariantTable.fromVariants(list(variants))
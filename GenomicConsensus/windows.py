@@ -9,8 +9,7 @@
 # Author: David Alexander
 from __future__ import absolute_import, division, print_function
 
-import numpy as np, math
-from pbcore.io.rangeQueries import projectIntoRange
+import heapq, numpy as np, math
 from ConsensusCore import CoveredIntervals
 
 # TODO(lhepler): replace the above with the following:
@@ -41,6 +40,8 @@ def kSpannedIntervals(refWindow, k, start, end, minLength=0):
     Note that this is a greedy search procedure and may not always
     return the optimal solution, in some sense.  However it will
     always return the optimal solutions in the most common cases.
+
+    Runs in O(n log k + L) time for n reads and a window of length L.
     """
     assert k >= 1
     winId, winStart_, winEnd_ = refWindow
@@ -56,28 +57,42 @@ def kSpannedIntervals(refWindow, k, start, end, minLength=0):
     winStart = 0
     winEnd   = winEnd_ - winStart_
 
-    positions = np.arange(winEnd - winStart, dtype=int)
-    coverage = projectIntoRange(start, end,
-                                winStart, winEnd)
-    x = -1
+    # Positions that are k-covered, found by a cumulative sum over
+    # the read start/end events
+    coverage = np.cumsum(np.bincount(start, minlength=winEnd+1) -
+                         np.bincount(end,   minlength=winEnd+1))[:winEnd]
+    kCovered = np.flatnonzero(coverage >= k)
+
+    # Sweep the reads in order of start, keeping a min-heap of the k
+    # largest `end`s among the reads starting at or before x
+    order = np.argsort(start, kind="mergesort")
+    starts = start[order].tolist()
+    ends   = end[order].tolist()
+    largestEnds = []
+    nextRead = 0
+
     y = 0
     intervalsFound = []
 
     while y < winEnd:
         # Step 1: let x be the first pos >= y that is k-covered
-        eligible = np.flatnonzero((positions >= y) & (coverage >= k))
-        if len(eligible) > 0:
-            x = eligible[0]
+        i = np.searchsorted(kCovered, y)
+        if i < len(kCovered):
+            x = int(kCovered[i])
         else:
             break
 
         # Step 2: extend the window [x, y) until [x, y) is no longer
         # k-spanned.  Do this by setting y to the k-th largest `end`
         # among reads covering x
-        eligible = end[(start <= x)]
-        eligible.sort()
-        if len(eligible) >= k:
-            y = eligible[-k]
+        while nextRead < len(starts) and starts[nextRead] <= x:
+            if len(largestEnds) < k:
+                heapq.heappush(largestEnds, ends[nextRead])
+            elif ends[nextRead] > largestEnds[0]:
+                heapq.heapreplace(largestEnds, ends[nextRead])
+            nextRead += 1
+        if len(largestEnds) >= k:
+            y = largestEnds[0]
         else:
             break
 
@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+"""
+Microbenchmark for BGZF output: compression throughput of BgzfWriter
+by number of compression threads, on FASTQ-like data.
+
+Usage: python tests/bench/bgzfWriter.py [megabytes]
+"""
+from __future__ import absolute_import, division, print_function
+
+import os, sys, tempfile, time
+import numpy as np
+
+from GenomicConsensus.io.utils import BgzfWriter
+
+def fastqLikeData(numBytes, seed=42):
+    rng = np.random.RandomState(seed)
+    sequence = rng.choice(np.fromstring("ACGT", dtype=np.uint8), size=numBytes // 2)
+    qvs = (np.minimum(rng.geometric(0.05, size=numBytes // 2), 93) + 33).astype(np.uint8)
+    return sequence.tostring() + qvs.tostring()
+
+def main():
+    megabytes = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    data = fastqLikeData(megabytes << 20)
+    fd, path = tempfile.mkstemp(suffix=".gz")
+    os.close(fd)
+    try:
+        for numThreads in (1, 2, 4, 8):
+            start = time.time()
+            with BgzfWriter(path, numThreads=numThreads) as f:
+                for i in xrange(0, len(data), 1 << 20):
+                    f.write(data[i:i + (1 << 20)])
+            elapsed = time.time() - start
+            print("%d threads: %d MB in %.2fs (%.1f MB/s)" %
+                  (numThreads, megabytes, elapsed, megabytes / elapsed))
+    finally:
+        os.remove(path)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+"""
+Microbenchmark for chunk planning (reference.fancyEnumerateChunks) on
+a fragmented assembly, with the coverage profile computed once for all
+contigs versus per contig.
+
+Usage: python tests/bench/fancyChunking.py [numContigs] [readsPerContig]
+"""
+from __future__ import absolute_import, division, print_function
+
+import sys, time
+from collections import namedtuple
+import numpy as np
+
+from GenomicConsensus import reference
+from GenomicConsensus.coverage import CoverageProfile
+
+Contig = namedtuple("Contig", ("ID", "length"))
+
+class IndexOnlyAlignmentFile(object):
+    def __init__(self, numContigs, readsPerContig, contigLength, seed=42):
+        rng = np.random.RandomState(seed)
+        numReads   = numContigs * readsPerContig
+        self.tId   = np.repeat(np.arange(numContigs), readsPerContig)
+        tStart     = rng.randint(0, contigLength, size=numReads)
+        tEnd       = np.minimum(tStart + rng.randint(500, 5000, size=numReads),
+                                contigLength)
+        self.mapQV = rng.randint(0, 60, size=numReads)
+        self.index = np.rec.fromarrays([self.tId, tStart, tEnd, self.mapQV],
+                                       names=["tId", "tStart", "tEnd", "mapQV"])
+
+    def referenceInfo(self, refId):
+        return reference.byName[refId]
+
+def plan(alnFile, coverageProfile):
+    numChunks = 0
+    for refId in reference.byName:
+        for chunk in reference.fancyEnumerateChunks(alnFile, refId, 500, 5, 10,
+                                                    coverageProfile=coverageProfile):
+            numChunks += 1
+    return numChunks
+
+def main():
+    numContigs     = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    readsPerContig = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    contigLength   = 10000
+    alnFile = IndexOnlyAlignmentFile(numContigs, readsPerContig, contigLength)
+    for i in xrange(numContigs):
+        reference.byName["contig%d" % i] = Contig(i, contigLength)
+    reference.filename = "(benchmark)"
+
+    t0 = time.time()
+    profile = CoverageProfile.fromAlignmentFile(alnFile, 10)
+    numChunks = plan(alnFile, profile)
+    print("contigs=%d reads=%d chunks=%d  shared profile:   %.2fs" %
+          (numContigs, len(alnFile.tId), numChunks, time.time() - t0))
+
+    if numContigs <= 10000:
+        t0 = time.time()
+        numChunks = plan(alnFile, None)
+        print("contigs=%d reads=%d chunks=%d  per-contig scans: %.2fs" %
+              (numContigs, len(alnFile.tId), numChunks, time.time() - t0))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+"""
+Benchmark for the streaming GFF to VCF/BED converters on a synthetic
+variants GFF, at one and several worker processes.  For comparison,
+the per-record path of the old converters is timed on a sample: its
+GffReader parsing alone, which bounds its throughput from above.
+
+Usage: python tests/bench/gffConverters.py [numRecords [numWorkers]]
+"""
+from __future__ import absolute_import, division, print_function
+
+import os, sys, tempfile, time
+from itertools import islice
+import numpy as np
+
+from pbcore.io import GffReader
+from GenomicConsensus.io.GffConverters import convertGff, vcfRecords, variantBedRecords
+
+def writeSyntheticGff(f, numRecords, seed=42, chunkSize=100000):
+    # Sorted calls along four contigs, as variantCaller writes them
+    rng = np.random.RandomState(seed)
+    f.write("##gff-version 3\n")
+    bases = np.array(list("ACGT"))
+    for chunkStart in xrange(0, numRecords, chunkSize):
+        n = min(chunkSize, numRecords - chunkStart)
+        contig = (chunkStart * 4) // numRecords
+        starts = np.sort(rng.randint(1, 10000000, size=n))
+        kinds = rng.randint(0, 3, size=n)
+        refBases = bases[rng.randint(0, 4, size=n)]
+        readBases = bases[rng.randint(0, 4, size=n)]
+        coverage = rng.randint(5, 100, size=n)
+        confidence = rng.randint(20, 94, size=n)
+        lines = []
+        for i in xrange(n):
+            kind = kinds[i]
+            if kind == 0:
+                fields = ("insertion", starts[i], starts[i], ".", readBases[i])
+            elif kind == 1:
+                fields = ("deletion", starts[i], starts[i], refBases[i], ".")
+            else:
+                fields = ("substitution", starts[i], starts[i], refBases[i], readBases[i])
+            lines.append("contig%d\t.\t%s\t%d\t%d\t.\t.\t.\treference=%s;variantSeq=%s;"
+                         "coverage=%d;confidence=%d\n" %
+                         ((contig,) + fields + (coverage[i], confidence[i])))
+        f.write("".join(lines))
+
+class NullOutput(object):
+    def __init__(self):
+        self.bytes = 0
+    def write(self, s):
+        self.bytes += len(s)
+
+def main():
+    numRecords = int(sys.argv[1]) if len(sys.argv) > 1 else 5000000
+    numWorkers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+    fd, path = tempfile.mkstemp(suffix=".gff")
+    try:
+        with os.fdopen(fd, "w") as f:
+            writeSyntheticGff(f, numRecords)
+
+        sampleSize = min(numRecords, 100000)
+        start = time.time()
+        with GffReader(path) as reader:
+            for _ in islice(reader, sampleSize):
+                pass
+        elapsed = time.time() - start
+        print("GffReader parsing:  %d records in %.2fs (%.0f records/s)" %
+              (sampleSize, elapsed, sampleSize / elapsed))
+
+        for name, convertBatch in (("VCF", vcfRecords), ("BED", variantBedRecords)):
+            for workers in (1, numWorkers):
+                out = NullOutput()
+                start = time.time()
+                convertGff(path, out, convertBatch, workers)
+                elapsed = time.time() - start
+                print("%s, %d worker(s): %d records in %.2fs (%.0f records/s, %.1f MB/s out)" %
+                      (name, workers, numRecords, elapsed, numRecords / elapsed,
+                       out.bytes / elapsed / 1e6))
+    finally:
+        os.remove(path)
+
+if __name__ == "__main__":
+    main()
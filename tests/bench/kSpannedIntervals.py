@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+"""
+Microbenchmark for windows.kSpannedIntervals on large windows with
+patchy coverage.
+
+Usage: python tests/bench/kSpannedIntervals.py [windowLength] [numReads]
+"""
+from __future__ import absolute_import, division, print_function
+
+import sys, timeit
+import numpy as np
+
+from GenomicConsensus.windows import kSpannedIntervals
+
+def patchyReads(windowLength, numReads, seed=42):
+    # Reads clustered into islands, leaving coverage holes in between
+    rng = np.random.RandomState(seed)
+    islands = rng.randint(0, windowLength, size=max(1, numReads // 200))
+    start = (rng.choice(islands, size=numReads) +
+             rng.randint(-300, 300, size=numReads)).clip(0, windowLength)
+    start.sort()
+    end = start + rng.randint(50, 600, size=numReads)
+    return start, end
+
+def main():
+    windowLength = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    numReads     = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    start, end = patchyReads(windowLength, numReads)
+    refWindow = (0, 0, windowLength)
+    for k in (1, 3, 5, 10):
+        timer = timeit.Timer(lambda: kSpannedIntervals(refWindow, k, start, end, minLength=10))
+        best = min(timer.repeat(repeat=3, number=1))
+        print("window=%d reads=%d k=%-2d intervals=%-4d %.4fs" %
+              (windowLength, numReads, k,
+               len(kSpannedIntervals(refWindow, k, start, end, minLength=10)), best))
+
+if __name__ == "__main__":
+    main()
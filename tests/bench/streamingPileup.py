@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+"""
+Microbenchmark for the plurality streaming pileup (RollingPileup):
+read bases piled up per second along a long stripe, against the rate
+at which zlib inflates the BGZF blocks holding those reads, as a proxy
+for BAM decompression.  Also reports the largest count buffer held,
+which should follow the read length, not the stripe length.
+
+The proxy assumes `bytesPerBase` bytes of BAM record per aligned base
+(sequence, qualities, CIGAR and tags), compressed at zlib's default
+level; pulse-feature tags make real PacBio records several times
+larger.
+
+Usage: python tests/bench/streamingPileup.py [stripeLength] [coverage] [bytesPerBase]
+"""
+from __future__ import absolute_import, division, print_function
+
+import sys, time, zlib
+import numpy as np
+
+from GenomicConsensus.plurality.plurality import RollingPileup
+
+CHUNK_SIZE  = 500
+READ_LENGTH = 10000
+
+class Alignment(object):
+    def __init__(self, referenceStart, alnRef, alnRead):
+        self.referenceStart = referenceStart
+        self._ref, self._read = alnRef, alnRead
+
+    def clippedTo(self, refStart, refEnd):
+        return self
+
+    def reference(self, orientation="genomic"):
+        return self._ref
+
+    def read(self, orientation="genomic"):
+        return self._read
+
+def syntheticReads(stripeLength, coverage, seed=42):
+    rng = np.random.RandomState(seed)
+    reference = rng.choice(list("ACGT"), size=stripeLength)
+    numReads = stripeLength * coverage // READ_LENGTH
+    starts = np.sort(rng.randint(0, stripeLength - READ_LENGTH, size=numReads))
+    reads = []
+    for start in starts:
+        alnRef = reference[start:start + READ_LENGTH].copy()
+        alnRead = alnRef.copy()
+        # 10% errors: substitutions and deletions, and some insertions
+        errors = rng.rand(READ_LENGTH)
+        alnRead[errors < 0.04] = rng.choice(list("ACGT"), size=(errors < 0.04).sum())
+        alnRead[(errors >= 0.04) & (errors < 0.07)] = "-"
+        inserted = np.flatnonzero(errors >= 0.97)
+        alnRef = np.insert(alnRef, inserted, "-")
+        alnRead = np.insert(alnRead, inserted, rng.choice(list("ACGT"), size=len(inserted)))
+        reads.append(Alignment(int(start), "".join(alnRef), "".join(alnRead)))
+    return reads
+
+def pileUp(stripeLength, reads):
+    stripe = ("ref", 0, stripeLength)
+    pileup = RollingPileup(stripe)
+    largest = added = 0
+    for winStart in xrange(0, stripeLength, CHUNK_SIZE):
+        winEnd = min(winStart + CHUNK_SIZE, stripeLength)
+        reachable = added
+        while reachable < len(reads) and reads[reachable].referenceStart < winEnd:
+            reachable += 1
+        pileup.add(reads[added:reachable])
+        added = reachable
+        pileup.popWindow(("ref", winStart, winEnd))
+        largest = max(largest, pileup._counts.nbytes)
+    return largest
+
+def inflateSeconds(numBytes, seed=42):
+    # DNA-like payload of numBytes, in 64 kB BGZF-sized blocks
+    rng = np.random.RandomState(seed)
+    block = rng.choice(np.frombuffer(b"ACGT!+5?", dtype=np.uint8), size=65536).tobytes()
+    compressed = zlib.compress(block)
+    numBlocks = max(1, numBytes // len(block))
+    t0 = time.time()
+    for _ in xrange(numBlocks):
+        zlib.decompress(compressed)
+    return time.time() - t0
+
+def main():
+    stripeLength = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    coverage     = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    bytesPerBase = float(sys.argv[3]) if len(sys.argv) > 3 else 2.0
+
+    reads = syntheticReads(stripeLength, coverage)
+    numBases = sum(len(r.read()) for r in reads)
+    t0 = time.time()
+    largest = pileUp(stripeLength, reads)
+    elapsed = time.time() - t0
+    inflate = inflateSeconds(int(numBases * bytesPerBase))
+    print("stripe=%d coverage=%d reads=%d" % (stripeLength, coverage, len(reads)))
+    print("  pileup:  %.2fs (%.2fM read bases/s); largest count buffer %.1f MB "
+          "(%.1f MB for the whole stripe)" %
+          (elapsed, numBases / elapsed / 1e6, largest / 2**20,
+           stripeLength * 5 * 4 / 2**20))
+    print("  inflate: %.2fs (%.2fM read bases/s at %g bytes/base)" %
+          (inflate, numBases / inflate / 1e6, bytesPerBase))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+"""
+Microbenchmark for the striped read supply (io.StripeReader): counts
+the alignment records decoded when the chunks of a stripe fetch their
+reads window by window from the alignment file, versus through a
+StripeReader, on a synthetic sorted index.  A fixed cost per decoded
+record stands in for BAM decoding.
+
+Records are fetched by row number either way, so this measures the
+records that are not decoded again, not the compressed blocks that
+are not inflated again (which depends on the reader's caching).
+
+Usage: python tests/bench/stripeReader.py [numReads] [depthLimit]
+"""
+from __future__ import absolute_import, division, print_function
+
+import sys, time
+import numpy as np
+
+from GenomicConsensus.io.StripeReader import StripeReader
+from GenomicConsensus.utils import readsInWindow
+
+CONTIG_LENGTH  = 1000000
+CHUNK_SIZE     = 500
+CHUNK_OVERLAP  = 5
+DECODE_SECONDS = 20e-6
+
+class FakeIndex(object):
+    def __init__(self, tStart, tEnd):
+        self.tStart = tStart
+        self.tEnd   = tEnd
+
+class CountingAlignmentFile(object):
+    def __init__(self, numReads, seed=42):
+        rng = np.random.RandomState(seed)
+        tStart = np.sort(rng.randint(0, CONTIG_LENGTH, size=numReads))
+        tEnd   = np.minimum(tStart + rng.randint(500, 15000, size=numReads),
+                            CONTIG_LENGTH)
+        self.index = FakeIndex(tStart, tEnd)
+        self.mapQV = np.full(numReads, 60, dtype=int)
+        self.numDecoded = 0
+
+    def readsInRange(self, refId, start, end, justIndices=False):
+        lo = np.searchsorted(self.index.tStart, start - 15000)
+        hi = np.searchsorted(self.index.tStart, end)
+        rows = np.arange(lo, hi)
+        return rows[self.index.tEnd[rows] > start]
+
+    def __getitem__(self, rowNumbers):
+        if np.isscalar(rowNumbers):
+            self.numDecoded += 1
+            deadline = time.time() + DECODE_SECONDS
+            while time.time() < deadline:
+                pass
+            return int(rowNumbers)
+        return [ self[r] for r in rowNumbers ]
+
+def chunkWindows():
+    for start in xrange(0, CONTIG_LENGTH, CHUNK_SIZE):
+        yield ("ref", max(0, start - CHUNK_OVERLAP),
+               min(CONTIG_LENGTH, start + CHUNK_SIZE + CHUNK_OVERLAP))
+
+def perWindow(alnFile, depthLimit):
+    for window in chunkWindows():
+        readsInWindow(alnFile, window, depthLimit=depthLimit,
+                      strategy="long-and-strand-balanced")
+
+def striped(alnFile, depthLimit):
+    reader = StripeReader(alnFile, ("ref", 0, CONTIG_LENGTH))
+    for window in chunkWindows():
+        reader.advanceTo(window[1])
+        readsInWindow(reader, window, depthLimit=depthLimit,
+                      strategy="long-and-strand-balanced")
+
+def main():
+    numReads   = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    depthLimit = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    for name, supply in (("per-window", perWindow), ("striped", striped)):
+        alnFile = CountingAlignmentFile(numReads)
+        t0 = time.time()
+        supply(alnFile, depthLimit)
+        print("%-10s reads=%d depthLimit=%s: %d records decoded (%.2f per read), %.2fs" %
+              (name, numReads, depthLimit, alnFile.numDecoded,
+               alnFile.numDecoded / numReads, time.time() - t0))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+from __future__ import absolute_import, division, print_function
+
+import os, shutil, tempfile
+import numpy as np
+from collections import OrderedDict
+from nose.tools import assert_equal
+
+from GenomicConsensus import reference
+from GenomicConsensus.consensus import Consensus
+from GenomicConsensus.variants import VariantTable
+from GenomicConsensus.io.VariantsGffWriter import toGffRecord
+from GenomicConsensus.io.AlignmentSummary import (AlignmentSummary, RegionBins, Region,
+                                                  COUNTERS, variantSummaryColumns)
+from test_variant_table import randomVariants
+
+SUMMARY = """\
+##gff-version 3
+##sequence-region ref1 1 100
+ref1\t.\tregion\t1\t50\t0.00\t+\t.\tcov=4,23,28;cov2=20.162,5.851;gaps=0,0
+ref1\t.\tregion\t51\t100\t0.00\t+\t.\tcov=18,24,29;cov2=24.009,2.316;gaps=0,0
+ref2\t.\tregion\t1\t60\t0.00\t+\t.\tcov=17,25,29;cov2=24.182,2.596;gaps=0,0
+"""
+
+
+class TestAlignmentSummary(object):
+
+    def setup(self):
+        self.savedReference = reference.byName
+        reference.byName = OrderedDict((name, reference.ReferenceContig(i, name, name,
+                                                                        "A" * length, length))
+                                       for (i, (name, length)) in enumerate([("ref1", 100),
+                                                                             ("ref2", 60)]))
+        self.directory = tempfile.mkdtemp()
+        self.summaryPath = os.path.join(self.directory, "alignment_summary.gff")
+        with open(self.summaryPath, "w") as f:
+            f.write(SUMMARY)
+
+    def teardown(self):
+        reference.byName = self.savedReference
+        shutil.rmtree(self.directory)
+
+    def test_variantSummaryColumns(self):
+        # As summarizeConsensus reads them from the GFF records
+        variants = randomVariants(np.random.RandomState(11), 300)
+        starts, types, lengths = variantSummaryColumns(VariantTable.fromVariants(variants))
+        typeCodes = dict((name, code) for (code, (name, _)) in enumerate(COUNTERS))
+        for i, v in enumerate(variants):
+            record = toGffRecord(v)
+            assert_equal(record.start, starts[i])
+            assert_equal(typeCodes.get(record.type, -1), types[i])
+            assert_equal(max(len(record.reference), len(record.variantSeq)), lengths[i])
+
+    def test_consensusQvs(self):
+        rng = np.random.RandomState(5)
+        regions = [ Region("ref1", 1, 50), Region("ref1", 51, 100), Region("ref2", 1, 60) ]
+        bins = RegionBins(regions, trackConsensusQvs=True)
+        positions = np.sort(rng.randint(1, 91, size=500))
+        qvs = rng.randint(0, 94, size=500)
+        bins.addQvs("ref1", positions, qvs)
+        for region in regions:
+            mine = sorted(qvs[(positions >= region.start) & (positions <= region.end)]) \
+                   if region.seqid == "ref1" else []
+            expected = [mine[0], mine[(len(mine) - 1) // 2], mine[-1]] if mine else [0, 0, 0]
+            assert_equal(expected, bins.consensusQvs()[bins.index[region]].tolist())
+
+    def test_write(self):
+        summary = AlignmentSummary(self.summaryPath, trackConsensusQvs=True)
+        summary.addConsensus("ref1", Consensus(("ref1", 40, 60), "A" * 20, np.arange(20)))
+        variants = [ v for v in randomVariants(np.random.RandomState(2), 40)
+                     if v.refId == "ref1" ]
+        summary.addVariants("ref1", VariantTable.fromVariants(variants))
+        outputPath = os.path.join(self.directory, "out.gff")
+        summary.write(outputPath, [("source", "test")])
+
+        counts = dict((region, [0] * len(COUNTERS)) for region in summary.regionOfLine.values())
+        typeCodes = dict((name, code) for (code, (name, _)) in enumerate(COUNTERS))
+        for v in variants:
+            record = toGffRecord(v)
+            if record.type in typeCodes:
+                region = [ r for r in counts if r.seqid == "ref1" and
+                           (r.start <= record.start <= r.end or record.start == 0 == r.start - 1) ][0]
+                counts[region][typeCodes[record.type]] += max(len(record.reference),
+                                                              len(record.variantSeq))
+        lines = open(outputPath).read().splitlines()
+        assert_equal(["##gff-version 3", "##sequence-region ref1 1 100", "##source test"],
+                     lines[:3])
+        # QVs 0..9 fall in [1, 50], 10..19 in [51, 100]
+        expectedQvs = [ "0,4,9", "10,14,19", "0,0,0" ]
+        for line, region, cQv in zip(lines[3:], sorted(counts), expectedQvs):
+            assert_equal(";cQv=%s;del=%d;ins=%d;sub=%d" % ((cQv,) + tuple(counts[region])),
+                         line[line.index(";cQv"):])
+
+    def test_skipsUnsummarizedVariants(self):
+        regions = [ Region("ref1", 1, 50), Region("ref1", 51, 100) ]
+        bins = RegionBins(regions)
+        types = np.array([0, 2, 2])
+        lengths = np.array([1, 1, 1])
+        # No regions for ref2: nothing counted, nothing raised
+        bins.addVariants("ref2", np.array([5, 10, 20]), types, lengths)
+        assert_equal(0, bins.counts.sum())
+        # Variants past the last region are dropped, the rest counted
+        bins.addVariants("ref1", np.array([5, 60, 150]), types, lengths)
+        assert_equal([[1, 0, 0], [0, 0, 1]], bins.counts.tolist())
+
+    def test_hasRegions(self):
+        summary = AlignmentSummary(self.summaryPath)
+        assert summary.hasRegions("ref1") and summary.hasRegions("ref2")
+        assert not summary.hasRegions("ref3")
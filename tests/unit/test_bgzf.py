@@ -0,0 +1,62 @@
+from __future__ import absolute_import, division, print_function
+
+import gzip, os, shutil, struct, tempfile
+from nose.tools import assert_equal
+
+from GenomicConsensus.io.utils import BgzfWriter
+
+
+def bgzfBlocks(data):
+    # (header extra field, uncompressed size) of each BGZF block
+    blocks = []
+    offset = 0
+    while offset < len(data):
+        xlen, = struct.unpack("<H", data[offset+10:offset+12])
+        si1, si2, slen, bsize = struct.unpack("<2BHH", data[offset+12:offset+18])
+        assert_equal((6, 66, 67, 2), (xlen, si1, si2, slen))
+        isize, = struct.unpack("<I", data[offset+bsize-3:offset+bsize+1])
+        blocks.append(isize)
+        offset += bsize + 1
+    assert_equal(len(data), offset)
+    return blocks
+
+class TestBgzfWriter(object):
+
+    def setup(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "out.vcf.gz")
+
+    def teardown(self):
+        shutil.rmtree(self.directory)
+
+    def test_roundtrip(self):
+        lines = [ "ref1\t%d\t.\tA\tC\t40\tPASS\tDP=%d\n" % (i, i % 97)
+                  for i in xrange(20000) ]
+        with BgzfWriter(self.path) as f:
+            for i in xrange(0, len(lines), 1000):
+                f.write("".join(lines[i:i+1000]))
+        assert_equal("".join(lines), gzip.open(self.path).read())
+
+        blockSizes = bgzfBlocks(open(self.path, "rb").read())
+        assert len(blockSizes) > 2
+        assert all(size <= BgzfWriter.BLOCK_SIZE for size in blockSizes)
+        # Terminated by the empty EOF block
+        assert_equal(0, blockSizes[-1])
+        assert_equal(BgzfWriter.EOF_BLOCK, open(self.path, "rb").read()[-28:])
+
+    def test_threads(self):
+        data = "".join("ref1\t%d\t.\tA\tC\t40\tPASS\tDP=%d\n" % (i, i % 97)
+                       for i in xrange(50000))
+        outputs = []
+        for numThreads in (1, 4):
+            with BgzfWriter(self.path, numThreads=numThreads) as f:
+                for i in xrange(0, len(data), 10000):
+                    f.write(data[i:i+10000])
+            outputs.append(open(self.path, "rb").read())
+        assert_equal(outputs[0], outputs[1])
+        assert_equal(data, gzip.open(self.path).read())
+
+    def test_empty(self):
+        BgzfWriter(self.path).close()
+        assert_equal(BgzfWriter.EOF_BLOCK, open(self.path, "rb").read())
+        assert_equal("", gzip.open(self.path).read())
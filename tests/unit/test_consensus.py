@@ -2,6 +2,7 @@ from __future__ import absolute_import, division, print_function
 
 from numpy.testing import assert_array_almost_equal
 from nose.tools import assert_equal
+import cPickle as pickle, numpy as np
 
 from GenomicConsensus.consensus import *
 
@@ -22,3 +23,32 @@ def test_join():
     joined = join(chunks)
     expectedJoined = Consensus( (0, 100, 120), "GATTACACATTACA", range(14))
     assert_equal(expectedJoined, joined)
+
+def test_join_preserves_sequence_and_qvs():
+    chunks = [ Consensus( (0, 120, 130), "TT", [40, 41] ),
+               Consensus( (0, 100, 110), "GATTACA", range(7) ),
+               Consensus( (0, 110, 120), "", [] ) ]
+    joined = join(chunks)
+    assert_equal((0, 100, 130), joined.refWindow)
+    assert_equal("GATTACATT", joined.sequence)
+    assert_equal(range(7) + [40, 41], joined.confidence.tolist())
+    assert_equal(np.uint8, joined.confidence.dtype)
+
+def test_noCallConsensus_shares_buffers():
+    a = Consensus.noCallConsensus("nocall", (0, 0, 5), "GATTA")
+    b = Consensus.noCallConsensus("reference", (0, 5, 10), "CAGAT")
+    assert_equal("NNNNN", a.sequence)
+    assert_equal("CAGAT", b.sequence)
+    assert_equal([0]*5, a.confidence.tolist())
+    assert not a.confidence.flags.writeable
+    assert np.may_share_memory(a.confidence, b.confidence)
+
+def test_pickle_roundtrip():
+    for protocol in (0, pickle.HIGHEST_PROTOCOL):
+        css = ArrowConsensus( (0, 100, 107), "GATTACA", range(7) )
+        copy = pickle.loads(pickle.dumps(css, protocol))
+        assert_equal(css.refWindow, copy.refWindow)
+        assert_equal(css.sequence, copy.sequence)
+        assert_equal(css.confidence.tolist(), copy.confidence.tolist())
+        assert copy.ai is None
+        assert not copy.hasEvidence
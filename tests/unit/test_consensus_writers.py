@@ -0,0 +1,151 @@
+from __future__ import absolute_import, division, print_function
+
+import gzip, os, shutil, tempfile
+from collections import OrderedDict
+import numpy as np
+from nose.tools import assert_equal
+
+from GenomicConsensus import reference
+from GenomicConsensus.consensus import Consensus
+from GenomicConsensus.options import options
+from GenomicConsensus.ResultCollector import ResultCollector
+from GenomicConsensus.io.ConsensusWriters import (StreamingFastaWriter, StreamingFastqWriter,
+                                                   fastaIndexTotals)
+
+
+def fastaRecord(name, sequence):
+    # pbcore's FastaWriter output
+    lines = [ sequence[i:i+60] for i in xrange(0, len(sequence), 60) ]
+    return ">%s\n%s\n" % (name, "\n".join(lines))
+
+def fastqRecord(name, sequence, qvs):
+    return "@%s\n%s\n+\n%s\n" % (name, sequence,
+                                 "".join(chr(33 + min(93, q)) for q in qvs))
+
+def randomRecords(rng, n):
+    records = []
+    for i in xrange(n):
+        length = rng.choice([0, 1, 59, 60, 61, 120, rng.randint(0, 1000)])
+        sequence = "".join(rng.choice(list("ACGT"), size=length))
+        records.append(("contig%d" % i, sequence, rng.randint(0, 120, size=length)))
+    return records
+
+def randomCuts(rng, length):
+    cuts = np.unique(rng.randint(0, length + 1, size=rng.randint(0, 6)))
+    return zip([0] + cuts.tolist(), cuts.tolist() + [length])
+
+class TestConsensusWriters(object):
+
+    def setup(self):
+        self.directory = tempfile.mkdtemp()
+
+    def teardown(self):
+        shutil.rmtree(self.directory)
+
+    def test_segmented_records(self):
+        rng = np.random.RandomState(42)
+        records = randomRecords(rng, 30)
+        fastaPath = os.path.join(self.directory, "out.fasta")
+        fastqPath = os.path.join(self.directory, "out.fastq")
+        fasta = StreamingFastaWriter(fastaPath)
+        fastq = StreamingFastqWriter(fastqPath, self.directory)
+        for name, sequence, qvs in records:
+            fasta.beginRecord(name)
+            fastq.beginRecord(name)
+            for s, e in randomCuts(rng, len(sequence)):
+                fasta.appendSequence(sequence[s:e])
+                fastq.appendSequence(sequence[s:e], qvs[s:e])
+            fasta.endRecord()
+            fastq.endRecord()
+        fasta.close()
+        fastq.close()
+        assert_equal("".join(fastaRecord(name, sequence) for name, sequence, _ in records),
+                     open(fastaPath).read())
+        assert_equal("".join(fastqRecord(*record) for record in records),
+                     open(fastqPath).read())
+        # The quality spills are removed
+        assert_equal(sorted(["out.fasta", "out.fastq"]), sorted(os.listdir(self.directory)))
+
+    def test_fasta_index(self):
+        rng = np.random.RandomState(7)
+        records = randomRecords(rng, 30)
+        fastaPath = os.path.join(self.directory, "out.fasta")
+        fasta = StreamingFastaWriter(fastaPath, fastaPath + ".fai")
+        for name, sequence, _ in records:
+            fasta.beginRecord(name + " description")
+            for s, e in randomCuts(rng, len(sequence)):
+                fasta.appendSequence(sequence[s:e])
+            fasta.endRecord()
+        fasta.close()
+
+        # Fetch each sequence back through the index, as faidx would
+        data = open(fastaPath).read()
+        index = [ line.split("\t") for line in open(fastaPath + ".fai") ]
+        assert_equal([ name for name, _, _ in records ], [ fields[0] for fields in index ])
+        for (name, sequence, _), fields in zip(records, index):
+            length, offset, lineBases, lineWidth = map(int, fields[1:])
+            fetched = "".join(data[offset + i * lineWidth:
+                                   offset + i * lineWidth + min(lineBases, length - i * lineBases)]
+                              for i in xrange(-(-length // max(lineBases, 1))))
+            assert_equal(sequence, fetched)
+        assert_equal((len(records), sum(len(sequence) for _, sequence, _ in records)),
+                     fastaIndexTotals(fastaPath + ".fai"))
+
+
+class TestResultCollectorStreaming(object):
+
+    OPTIONS = ("referenceWindows", "fastaOutputFilename", "fastqOutputFilename",
+               "gffOutputFilename", "vcfOutputFilename", "compressionThreads",
+               "resultStore", "alignmentSummaryOutput")
+
+    def setup(self):
+        self.directory = tempfile.mkdtemp()
+        self.savedOptions = dict((name, getattr(options, name, None)) for name in self.OPTIONS)
+        self.savedReference = reference.byName, reference.filename
+        reference.byName = OrderedDict((name, reference.ReferenceContig(i, name, name + " full",
+                                                                        "A" * length, length))
+                                       for (i, (name, length)) in enumerate([("ref1", 250),
+                                                                             ("ref2", 70)]))
+        reference.filename = "reference.fasta"
+        options.referenceWindows = ()
+        options.gffOutputFilename = options.vcfOutputFilename = None
+        options.resultStore = options.alignmentSummaryOutput = None
+
+    def teardown(self):
+        for name, value in self.savedOptions.items():
+            setattr(options, name, value)
+        reference.byName, reference.filename = self.savedReference
+        shutil.rmtree(self.directory)
+
+    def test_out_of_order_windows(self):
+        self.checkOutOfOrderWindows("", open, 1)
+
+    def test_compressed_output(self):
+        self.checkOutOfOrderWindows(".gz", gzip.open, 3)
+
+    def checkOutOfOrderWindows(self, suffix, openFile, compressionThreads):
+        options.fastaOutputFilename = os.path.join(self.directory, "out.fasta" + suffix)
+        options.fastqOutputFilename = os.path.join(self.directory, "out.fastq" + suffix)
+        options.compressionThreads = compressionThreads
+        rng = np.random.RandomState(3)
+        windows = [ ("ref1", s, min(s + 40, 250)) for s in xrange(0, 250, 40) ] + \
+                  [ ("ref2", s, min(s + 40, 70)) for s in xrange(0, 70, 40) ]
+        chunks = dict((w, Consensus(w, "".join(rng.choice(list("ACGT"), size=w[2] - w[1])),
+                                    rng.randint(0, 94, size=w[2] - w[1])))
+                      for w in windows)
+        collector = ResultCollector(None, "plurality", None)
+        collector.onStart()
+        for i in rng.permutation(len(windows)):
+            collector.onResult((windows[i], (chunks[windows[i]], [])))
+        collector.onFinish()
+
+        expectedFasta = expectedFastq = ""
+        for refId in ("ref1", "ref2"):
+            mine = [ chunks[w] for w in windows if w[0] == refId ]
+            sequence = "".join(css.sequence for css in mine)
+            qvs = np.concatenate([ css.confidence for css in mine ])
+            name = refId + " full|plurality"
+            expectedFasta += fastaRecord(name, sequence)
+            expectedFastq += fastqRecord(name, sequence, qvs)
+        assert_equal(expectedFasta, openFile(options.fastaOutputFilename).read())
+        assert_equal(expectedFastq, openFile(options.fastqOutputFilename).read())
@@ -74,6 +74,53 @@ def test_intervals_underflow():
     assert_equals([(5, 10)], kSpannedIntervals(refWindow, 3, tStart, tEnd))
 
 
+def _quadraticKSpannedIntervals(refWindow, k, start, end, minLength=0):
+    # The original implementation, kept as an oracle for the sweep
+    winId, winStart_, winEnd_ = refWindow
+    start = np.clip(start, winStart_, winEnd_) - winStart_
+    end   = np.clip(end, winStart_, winEnd_) - winStart_
+    winEnd = winEnd_ - winStart_
+    positions = np.arange(winEnd, dtype=int)
+    coverage = np.zeros(winEnd, dtype=int)
+    for (s, e) in zip(start, end):
+        coverage[s:e] += 1
+    y = 0
+    intervalsFound = []
+    while y < winEnd:
+        eligible = np.flatnonzero((positions >= y) & (coverage >= k))
+        if len(eligible) > 0:
+            x = eligible[0]
+        else:
+            break
+        eligible = end[(start <= x)]
+        eligible.sort()
+        if len(eligible) >= k:
+            y = eligible[-k]
+        else:
+            break
+        intervalsFound.append((x, y))
+    return [ (s + winStart_, e + winStart_)
+             for (s, e) in intervalsFound
+             if e - s >= minLength ]
+
+def test_intervals_randomized():
+    """
+    The sweep agrees with the original quadratic search on patchy
+    random coverage
+    """
+    rng = np.random.RandomState(42)
+    for trial in xrange(200):
+        winStart = rng.randint(0, 50)
+        refWindow = (0, winStart, winStart + rng.randint(1, 300))
+        nReads = rng.randint(0, 40)
+        start = np.sort(rng.randint(0, 350, size=nReads))
+        end   = start + rng.randint(1, 120, size=nReads)
+        k = rng.randint(1, 6)
+        minLength = rng.choice([0, 10])
+        assert_equals(_quadraticKSpannedIntervals(refWindow, k, start, end, minLength),
+                      kSpannedIntervals(refWindow, k, start, end, minLength))
+
+
 def test_abut():
     """
     Test abutting adjacent intervals
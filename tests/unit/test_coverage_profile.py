@@ -0,0 +1,86 @@
+from __future__ import absolute_import, division, print_function
+
+import os, shutil, tempfile
+import numpy as np
+from nose.tools import assert_equals
+
+from GenomicConsensus.coverage import CoverageProfile, loadCoverageProfile
+
+
+def denseCoverage(tStart, tEnd, winStart, winEnd):
+    coverage = np.zeros(winEnd - winStart, dtype=int)
+    for (s, e) in zip(tStart, tEnd):
+        coverage[max(s, winStart)-winStart:max(min(e, winEnd)-winStart, 0)] += 1
+    return coverage
+
+def runsAtLeast(coverage, k, winStart):
+    runs = []
+    for pos, c in enumerate(coverage):
+        if c >= k:
+            if runs and runs[-1][1] == winStart + pos:
+                runs[-1] = (runs[-1][0], winStart + pos + 1)
+            else:
+                runs.append((winStart + pos, winStart + pos + 1))
+    return runs
+
+def randomIndex(rng, numReads, numRefs=3):
+    tId    = rng.randint(0, numRefs, size=numReads)
+    tStart = rng.randint(0, 500, size=numReads)
+    tEnd   = tStart + rng.randint(1, 100, size=numReads)
+    mapQV  = rng.randint(0, 60, size=numReads)
+    return tId, tStart, tEnd, mapQV
+
+def test_profile_matches_dense_coverage():
+    rng = np.random.RandomState(42)
+    for trial in xrange(20):
+        tId, tStart, tEnd, mapQV = randomIndex(rng, rng.randint(0, 60))
+        profile = CoverageProfile.fromIndex(tId, tStart, tEnd, mapQV, 20)
+        for ref in xrange(3):
+            winStart = rng.randint(0, 300)
+            winEnd = winStart + rng.randint(1, 400)
+            mine = (tId == ref)
+            good = mine & (mapQV >= 20)
+            allCov  = denseCoverage(tStart[mine], tEnd[mine], winStart, winEnd)
+            goodCov = denseCoverage(tStart[good], tEnd[good], winStart, winEnd)
+            assert_equals(allCov.tolist(),
+                          profile.coverageInWindow(ref, winStart, winEnd,
+                                                   filtered=False).tolist())
+            assert_equals(goodCov.tolist(),
+                          profile.coverageInWindow(ref, winStart, winEnd).tolist())
+            for k in (1, 2, 5):
+                assert_equals(runsAtLeast(goodCov, k, winStart),
+                              profile.kCoveredIntervals(ref, k, winStart, winEnd))
+            coverage, lengths = profile.coverageRuns(ref, winStart, winEnd)
+            assert_equals(goodCov.tolist(), np.repeat(coverage, lengths).tolist())
+
+def test_missing_reference():
+    profile = CoverageProfile.fromIndex(*randomIndex(np.random.RandomState(1), 10),
+                                        minMapQV=0)
+    assert_equals([0]*5, profile.coverageInWindow(17, 0, 5).tolist())
+    assert_equals([], profile.kCoveredIntervals(17, 1, 0, 5))
+    assert_equals(([0], [5]), tuple(a.tolist() for a in profile.coverageRuns(17, 0, 5)))
+
+
+class FakeAlignmentFile(object):
+    def __init__(self, tId, tStart, tEnd, mapQV):
+        self.tId = tId
+        self.mapQV = mapQV
+        self.index = np.rec.fromarrays([tStart, tEnd], names=["tStart", "tEnd"])
+
+def test_sidecar_roundtrip():
+    alnFile = FakeAlignmentFile(*randomIndex(np.random.RandomState(7), 50))
+    cacheDirectory = tempfile.mkdtemp()
+    try:
+        computed = loadCoverageProfile(alnFile, 20, cacheDirectory)
+        assert_equals(1, len(os.listdir(cacheDirectory)))
+        loaded = loadCoverageProfile(alnFile, 20, cacheDirectory)
+        assert_equals(computed.checksum, loaded.checksum)
+        for ref in xrange(3):
+            for filtered in (True, False):
+                assert_equals(computed.coverageInWindow(ref, 0, 600, filtered).tolist(),
+                              loaded.coverageInWindow(ref, 0, 600, filtered).tolist())
+        # A different mapQV threshold gets its own sidecar
+        loadCoverageProfile(alnFile, 30, cacheDirectory)
+        assert_equals(2, len(os.listdir(cacheDirectory)))
+    finally:
+        shutil.rmtree(cacheDirectory)
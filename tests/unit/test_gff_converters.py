@@ -0,0 +1,74 @@
+from __future__ import absolute_import, division, print_function
+
+import gzip, os, shutil, tempfile
+from StringIO import StringIO
+from nose.tools import assert_equal
+
+from GenomicConsensus.io.GffConverters import (convertGff, vcfRecords,
+                                               variantBedRecords, coverageBedRecords)
+
+VARIANTS = """\
+##gff-version 3
+##sequence-region chr1 1 20000
+chr1\t.\tdeletion\t701415\t701415\t.\t.\t.\treference=G;variantSeq=.;coverage=97;confidence=46
+chr1\t.\tdeletion\t801415\t801417\t.\t.\t.\treference=GAT;variantSeq=.;coverage=97;confidence=48
+chr1\t.\tinsertion\t1342770\t1342770\t.\t.\t.\treference=.;variantSeq=a;coverage=27;confidence=49
+chr2\t.\tsubstitution\t23469\t23469\t.\t.\t.\treference=T;variantSeq=a;frequency=7;coverage=38;confidence=47
+"""
+
+EXPECTED_VCF = """\
+chr1\t701415\t.\tG\tD1\t46.00\t0\tNS=1;DP=97
+chr1\t801415\t.\tGAT\tD3\t48.00\t0\tNS=1;DP=97
+chr1\t1342770\t.\t.\tIA\t49.00\t0\tNS=1;DP=27
+chr2\t23469\t.\tT\tA\t47.00\t0\tNS=1;DP=38
+"""
+
+EXPECTED_BED = """\
+chr1\t701414\t701415\t701415del\t46.000\t.
+chr1\t801414\t801417\t801415_801417del\t48.000\t.
+chr1\t1342769\t1342770\t1342770_1342771insa\t49.000\t.
+chr2\t23468\t23469\t23469T>a\t47.000\t.
+"""
+
+SUMMARY = """\
+##gff-version 3
+chr1\t.\tregion\t1\t5000\t0.00\t+\t.\tcov=4,23,28;cov2=20.162,5.851;gaps=0,0
+chr1\t.\tregion\t5001\t10000\t0.00\t+\t.\tcov=18,24,29;cov2=24,2.316;gaps=0,0;
+"""
+
+EXPECTED_COVERAGE_BED = """\
+chr1\t0\t5000\tmeanCov\t20.162\t+
+chr1\t5000\t10000\tmeanCov\t24.000\t+
+"""
+
+def test_vcfRecords():
+    assert_equal(EXPECTED_VCF, vcfRecords(VARIANTS.splitlines(True)))
+
+def test_variantBedRecords():
+    assert_equal(EXPECTED_BED, variantBedRecords(VARIANTS.splitlines(True)))
+
+def test_coverageBedRecords():
+    assert_equal(EXPECTED_COVERAGE_BED, coverageBedRecords(SUMMARY.splitlines(True)))
+
+def test_empty_batch():
+    assert_equal("", vcfRecords(["##gff-version 3\n"]))
+
+
+class TestConvertGff(object):
+
+    def setup(self):
+        self.directory = tempfile.mkdtemp()
+        self.gffPath = os.path.join(self.directory, "variants.gff.gz")
+        lines = VARIANTS.splitlines(True)
+        with gzip.open(self.gffPath, "w") as f:
+            f.write("".join(lines[:2] + lines[2:] * 250))
+
+    def teardown(self):
+        shutil.rmtree(self.directory)
+
+    def test_workers_preserve_order(self):
+        expected = EXPECTED_VCF * 250
+        for numWorkers in (1, 3):
+            out = StringIO()
+            convertGff(self.gffPath, out, vcfRecords, numWorkers, batchSize=37)
+            assert_equal(expected, out.getvalue())
@@ -0,0 +1,114 @@
+from __future__ import absolute_import, division, print_function
+
+import json, os, tempfile
+from collections import OrderedDict, namedtuple
+import numpy as np
+from nose.tools import assert_equal, assert_almost_equal, assert_raises
+
+from GenomicConsensus import reference
+from GenomicConsensus.options import options
+from GenomicConsensus.coverage import CoverageProfile
+from GenomicConsensus.plan import Plan, COST_MODEL, MIN_CHUNK_SIZE, loadCostModel
+from test_coverage_profile import FakeAlignmentFile, denseCoverage
+
+Contig = namedtuple("Contig", ("ID", "length"))
+
+class IndexOnlyAlignmentFile(FakeAlignmentFile):
+    def referenceInfo(self, refId):
+        return reference.byName[refId]
+
+
+class TestPlan(object):
+
+    OPTIONS = dict(referenceWindows=(), fancyChunking=True, referenceChunkSize=500,
+                   minCoverage=5, minMapQV=10, coverage=30, stripeSize=0, queueSize=200,
+                   numWorkers=2, coverageCacheDirectory=None, algorithm="arrow",
+                   costModel=None)
+
+    def setup(self):
+        self.savedOptions = dict((name, getattr(options, name, None)) for name in self.OPTIONS)
+        for name, value in self.OPTIONS.items():
+            setattr(options, name, value)
+        self.savedReference = reference.byName, reference.filename
+        lengths = [3000, 8000]
+        reference.byName = OrderedDict(("ref%d" % i, Contig(i, length))
+                                       for (i, length) in enumerate(lengths))
+        reference.filename = "reference.fasta"
+
+        rng = np.random.RandomState(42)
+        numReads = 300
+        tId    = rng.randint(0, 2, size=numReads)
+        tStart = rng.randint(0, 7000, size=numReads) % np.take(lengths, tId)
+        tEnd   = np.minimum(tStart + rng.randint(100, 1500, size=numReads),
+                            np.take(lengths, tId))
+        mapQV  = rng.randint(0, 60, size=numReads)
+        self.alnFile = IndexOnlyAlignmentFile(tId, tStart, tEnd, mapQV)
+        self.profile = CoverageProfile.fromAlignmentFile(self.alnFile, options.minMapQV)
+        good = mapQV >= options.minMapQV
+        self.dense = np.concatenate([ denseCoverage(tStart[good & (tId == i)],
+                                                    tEnd[good & (tId == i)], 0, length)
+                                      for (i, length) in enumerate(lengths) ])
+
+    def teardown(self):
+        for name, value in self.savedOptions.items():
+            setattr(options, name, value)
+        reference.byName, reference.filename = self.savedReference
+
+    def test_chunks(self):
+        plan = Plan(self.alnFile, "arrow", self.profile)
+        chunks = [ chunk for refId in reference.byName
+                   for chunk in reference.fancyEnumerateChunks(self.alnFile, refId, 500, 5, 10,
+                                                               coverageProfile=self.profile) ]
+        assert_equal(len(chunks), plan.numChunks)
+        assert_equal(sum(chunk.hasCoverage for chunk in chunks), plan.numCoveredChunks)
+        assert_equal((2, 2, 11000), (plan.numContigs, plan.numSpans, plan.numBases))
+
+    def test_coverage(self):
+        plan = Plan(self.alnFile, "arrow", self.profile)
+        dense = np.sort(self.dense)
+        quantiles = [0.0, 0.25, 0.5, 0.95, 1.0]
+        expected = [ dense[max(int(np.ceil(q * len(dense))) - 1, 0)] for q in quantiles ]
+        assert_equal(expected, plan.coverageQuantiles(quantiles).tolist())
+        assert_almost_equal(self.dense.mean(), plan.meanCoverage)
+        assert_almost_equal((self.dense == 0).mean(), plan.fractionBelow(1))
+        assert_almost_equal((self.dense < 5).mean(), plan.fractionBelow(5))
+
+    def test_estimates(self):
+        plan = Plan(self.alnFile, "quiver", self.profile)
+        perBaseRead, perChunk = COST_MODEL["quiver"]
+        computed = self.dense >= options.minCoverage
+        readBases = np.minimum(self.dense[computed], options.coverage).sum()
+        assert_almost_equal(perBaseRead * readBases + perChunk * plan.numCoveredChunks,
+                            plan.cpuSeconds)
+        assert plan.collectorPeakBytes(8) > plan.collectorPeakBytes(1)
+        assert_equal(1, plan.suggestedNumWorkers(availableCpus=1))
+        assert_equal(min(16, plan.numCoveredChunks), plan.suggestedNumWorkers(availableCpus=16))
+        for numWorkers in (1, 4, 64):
+            size = plan.suggestedChunkSize(numWorkers)
+            assert size >= MIN_CHUNK_SIZE and size % 100 == 0
+        assert len(plan.report()) > 0
+
+    def test_costModel(self):
+        plan = Plan(self.alnFile, "quiver", self.profile)
+        assert not plan.isCalibrated
+        assert_equal(2, sum("(uncalibrated)" in line for line in plan.report()))
+
+        fd, path = tempfile.mkstemp(suffix=".json")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump({ "quiver": { "perBaseRead": 1e-5, "perChunk": 0.5 } }, f)
+            options.costModel = path
+            assert_equal({ "quiver": (1e-5, 0.5) }, loadCostModel(path))
+            calibrated = Plan(self.alnFile, "quiver", self.profile)
+            assert calibrated.isCalibrated
+            assert_almost_equal(1e-5 * plan.readBasesUsed + 0.5 * plan.numCoveredChunks,
+                                calibrated.cpuSeconds)
+            assert not any("uncalibrated" in line.lower() for line in calibrated.report())
+            # Algorithms not measured keep the guesses
+            assert not Plan(self.alnFile, "arrow", self.profile).isCalibrated
+
+            with open(path, "w") as f:
+                json.dump({ "quiver": { "perChunk": 0.5 } }, f)
+            assert_raises(ValueError, loadCostModel, path)
+        finally:
+            os.remove(path)
@@ -3,10 +3,21 @@ from __future__ import absolute_import, division, print_function
 from numpy.testing import assert_array_almost_equal
 from nose.tools import assert_equal
 import operator, numpy as np
+from collections import Counter
 
 from GenomicConsensus.plurality.plurality import (PluralityConfig,
                                                   pluralityConsensusAndVariants,
-                                                  _computeVariants)
+                                                  _computeVariants,
+                                                  tabulateBaseCalls,
+                                                  pileupBaseCalls,
+                                                  RollingPileup,
+                                                  columnConsensus,
+                                                  posteriorConfidences,
+                                                  ConfidenceTable,
+                                                  MAX_CONFIDENCE_TABLE_DEPTH,
+                                                  varsFromRefAndRead,
+                                                  varsFromRefAndReads,
+                                                  _isSameLengthVariant)
 from AlignmentHitStubs import *
 
 def test_plurality1():
@@ -76,6 +87,246 @@ def test_computeHaploidVariants():
                  variants3)
 
 
+def _loopTabulateBaseCalls(refWindow, alns):
+    # The original per-character implementation, as an oracle
+    _, refStart, refEnd = refWindow
+    baseCallsMatrix = np.zeros(shape=(len(alns), refEnd - refStart), dtype="S8")
+    for i, aln in enumerate(alns):
+        alnRef    = aln.reference(orientation="genomic")
+        alnRead   = aln.read(orientation="genomic")
+        readBases = []
+        accum = []
+        for (refBase, readBase) in zip(alnRef, alnRead):
+            if readBase != "-":
+                readBases.append(readBase)
+            if refBase != "-":
+                accum.append("".join(readBases) if readBases else "-")
+                readBases = []
+        baseCallsMatrix[i, aln.referenceStart-refStart:aln.referenceEnd-refStart] = accum
+    return baseCallsMatrix
+
+def _randomHits(rng, reference, numHits):
+    hits = []
+    for _ in xrange(numHits):
+        start = rng.randint(0, len(reference) - 1)
+        end = rng.randint(start + 1, len(reference) + 1)
+        alnRef, alnRead = [], []
+        for refBase in reference[start:end]:
+            if rng.rand() < 0.2:
+                for _ in xrange(rng.randint(1, 10)):
+                    alnRef.append("-")
+                    alnRead.append(rng.choice(list("ACGTN")))
+            alnRef.append(refBase)
+            alnRead.append("-" if rng.rand() < 0.1 else rng.choice(list("ACGTN")))
+        if rng.rand() < 0.5:
+            alnRef.append("-")
+            alnRead.append("A")
+        hits.append(AlignmentHitStub(start, FORWARD, "".join(alnRef), "".join(alnRead)))
+    return hits
+
+def test_tabulateBaseCalls():
+    rng = np.random.RandomState(42)
+    reference = "".join(rng.choice(list("ACGT"), size=50))
+    datasets = [ (ForwardAndReverseReads.referenceWindow, ForwardAndReverseReads.hits),
+                 (StaggeredReads.referenceWindow, StaggeredReads.hits),
+                 ((1, 0, 50), _randomHits(rng, reference, 40)),
+                 ((1, 0, 50), []) ]
+    for refWindow, hits in datasets:
+        expected = _loopTabulateBaseCalls(refWindow, hits)
+        assert_equal(expected.tolist(),
+                     tabulateBaseCalls(refWindow, hits).tolist())
+        pileup = pileupBaseCalls(refWindow, hits)
+        for j in xrange(expected.shape[1]):
+            expectedCounts = Counter(expected[:, j])
+            expectedCounts.pop("", None)
+            assert_equal(expectedCounts, pileup.callCounts(j))
+
+
+def test_rollingPileup():
+    rng = np.random.RandomState(42)
+    reference = "".join(rng.choice(list("ACGT"), size=50))
+    stripe = (1, 0, 50)
+    hits = sorted(_randomHits(rng, reference, 40), key=lambda h: h.referenceStart)
+    expected = pileupBaseCalls(stripe, hits)
+    rolling = RollingPileup(stripe)
+    added = 0
+    for winStart in xrange(0, 50, 10):
+        # Add the reads that can reach the window, then pop it
+        reachable = [ h for h in hits[added:] if h.referenceStart < winStart + 10 ]
+        rolling.add(reachable)
+        added += len(reachable)
+        window = rolling.popWindow((1, winStart, winStart + 10))
+        for j in xrange(10):
+            assert_equal(expected.callCounts(winStart + j), window.callCounts(j))
+
+
+def test_rollingPileupMemory():
+    # Only the live range of a long stripe is held
+    stripe = (1, 0, 100000)
+    rolling = RollingPileup(stripe)
+    largest = 0
+    for winStart in xrange(0, 100000, 500):
+        rolling.add([ AlignmentHitStub(start, FORWARD, "ACGT" * 50, "ACGT" * 50)
+                      for start in xrange(winStart, min(winStart + 500, 100000 - 200), 25) ])
+        window = rolling.popWindow((1, winStart, winStart + 500))
+        assert_equal(8, window.counts.sum(axis=1).max())
+        largest = max(largest, len(rolling._counts))
+    assert largest <= 2000
+
+
+def _counterColumnConsensus(baseCallsMatrix, noCallSequence, minCoverage, diploid):
+    # The original per-column Counter implementation, as an oracle
+    for j in xrange(baseCallsMatrix.shape[1]):
+        counter = Counter(baseCallsMatrix[:, j])
+        if "" in counter: counter.pop("")
+        coverage = sum(counter.itervalues())
+        top2 = None
+        if coverage == 0 or coverage < minCoverage:
+            css, cssFreq = noCallSequence[j], coverage
+        else:
+            top2 = counter.most_common(2)
+            css, cssFreq = top2[0]
+        if top2 and len(top2) > 1:
+            alt, altFreq = top2[1]
+        else:
+            alt, altFreq = "N", 0
+        cssConf, hetConf = posteriorConfidences(coverage, cssFreq,
+                                                altFreq if diploid else 0,
+                                                diploid=diploid)
+        yield (top2, css.replace("-", ""), cssFreq, coverage,
+               alt.replace("-", ""), altFreq, cssConf, hetConf)
+
+def test_columnConsensus():
+    rng = np.random.RandomState(42)
+    reference = "".join(rng.choice(list("ACGT"), size=50))
+    hits = _randomHits(rng, reference, 60)
+    refWindow = (1, 0, 50)
+    baseCallsMatrix = tabulateBaseCalls(refWindow, hits)
+    pileup = pileupBaseCalls(refWindow, hits)
+    for diploid in (False, True):
+        for minCoverage in (0, 5, 30):
+            css, cssFreq, coverage, alt, altFreq = \
+                columnConsensus(pileup, "N" * 50, minCoverage)
+            cssConf, hetConf = posteriorConfidences(coverage, cssFreq,
+                                                    altFreq if diploid else 0,
+                                                    diploid=diploid)
+            expected = _counterColumnConsensus(baseCallsMatrix, "N" * 50,
+                                               minCoverage, diploid)
+            for j, (top2, eCss, eCssFreq, eCoverage,
+                    eAlt, eAltFreq, eCssConf, eHetConf) in enumerate(expected):
+                assert_equal(eCoverage, coverage[j])
+                assert_equal(eCssFreq, cssFreq[j])
+                assert_equal(eAltFreq, altFreq[j])
+                assert_equal(eCssConf, cssConf[j])
+                assert_equal(eHetConf, hetConf[j])
+                # Which of several equally frequent calls wins is not
+                # specified by Counter.most_common
+                counts = Counter(baseCallsMatrix[:, j])
+                counts.pop("", None)
+                if top2 is None or counts.values().count(eCssFreq) == 1:
+                    assert_equal(eCss, css[j])
+                if top2 is not None and counts.values().count(eAltFreq) == 1:
+                    assert_equal(eAlt, alt[j])
+
+def test_columnConsensusInsertionThenDeletion():
+    # An inserted "A" followed by the deletion of the "G" is the call
+    # "A", and is counted with the plain "A" calls
+    hits = ([ AlignmentHitStub(0, FORWARD, "TGA",  "TAA")  for _ in xrange(3) ] +
+            [ AlignmentHitStub(0, FORWARD, "T-GA", "TA-A") for _ in xrange(2) ] +
+            [ AlignmentHitStub(0, FORWARD, "TGA",  "TCA")  for _ in xrange(4) ])
+    pileup = pileupBaseCalls((1, 0, 3), hits)
+    assert_equal(Counter(A=5, C=4), pileup.callCounts(1))
+    assert_equal({}, pileup.otherCalls)
+    css, cssFreq, coverage, alt, altFreq = columnConsensus(pileup, "NNN", 0)
+    assert_equal(("A", 5, 9, "C", 4),
+                 (css[1], cssFreq[1], coverage[1], alt[1], altFreq[1]))
+
+
+def test_confidenceTable():
+    rng = np.random.RandomState(42)
+    depth   = rng.randint(0, 80, size=500)
+    cssFreq = (depth * rng.rand(500)).astype(int)
+    altFreq = ((depth - cssFreq) * rng.rand(500)).astype(int)
+    for diploid in (False, True):
+        table = ConfidenceTable(diploid, maxDepth=50)
+        # Grow in stages; sites deeper than maxDepth are computed directly
+        for n in (10, 100, 500):
+            cssConf, hetConf = table.lookup(depth[:n], cssFreq[:n], altFreq[:n])
+            for j in xrange(n):
+                assert_equal(posteriorConfidences(depth[j], cssFreq[j], altFreq[j],
+                                                  diploid=diploid),
+                             (cssConf[j], hetConf[j]))
+        assert_equal(50, table.depth)
+
+    # The table stops growing at MAX_CONFIDENCE_TABLE_DEPTH, however
+    # high the coverage limit
+    depth += MAX_CONFIDENCE_TABLE_DEPTH - 40
+    table = ConfidenceTable(True, maxDepth=5000)
+    cssConf, hetConf = table.lookup(depth, cssFreq, altFreq)
+    assert_equal(MAX_CONFIDENCE_TABLE_DEPTH, table.depth)
+    for j in xrange(len(depth)):
+        assert_equal(posteriorConfidences(depth[j], cssFreq[j], altFreq[j], diploid=True),
+                     (cssConf[j], hetConf[j]))
+
+
+def _loopComputeVariants(config, refWindow, refSequenceInWindow, coverageArray,
+                         consensusArray, consensusFrequencyArray,
+                         consensusConfidenceArray, alternateAlleleArray=None,
+                         alternateAlleleFrequency=None, heterozygousConfidence=None):
+    # Site-by-site reference implementation of _computeVariants
+    refId, refStart, refEnd = refWindow
+    refPrev = cssPrev = "N"
+    vars = []
+    for j in xrange(refEnd - refStart):
+        refBase, cssBases = refSequenceInWindow[j], consensusArray[j]
+        cov, conf = coverageArray[j], consensusConfidenceArray[j]
+        if cov < config.minCoverage: continue
+        if config.diploid and heterozygousConfidence[j] > conf:
+            if heterozygousConfidence[j] >= config.minConfidence and refBase != "N":
+                vars += varsFromRefAndReads(refId, j + refStart, refBase,
+                                            cssBases, alternateAlleleArray[j],
+                                            confidence=heterozygousConfidence[j],
+                                            coverage=cov,
+                                            frequency1=consensusFrequencyArray[j],
+                                            frequency2=alternateAlleleFrequency[j],
+                                            refPrev=refPrev, readPrev=cssPrev)
+        elif (conf >= config.minConfidence and refBase != cssBases and
+              refBase != "N" and cssBases != "N" and
+              (cssBases == "" or cssBases.isupper())):
+            vars += varsFromRefAndRead(refId, j + refStart, refBase, cssBases,
+                                       confidence=conf, coverage=cov,
+                                       frequency1=consensusFrequencyArray[j],
+                                       refPrev=refPrev, readPrev=cssPrev)
+        refPrev = refBase
+        cssPrev = cssBases[-1] if cssBases else cssPrev
+    if config.diploid:
+        vars = filter(_isSameLengthVariant, vars)
+    return sorted(vars)
+
+def test_computeVariants():
+    rng = np.random.RandomState(42)
+    calls = ["A", "C", "G", "T", "N", "", "AC", "GT", "a", "c"]
+    for diploid in (False, True):
+        config = PluralityConfig(minConfidence=20, minCoverage=5, diploid=diploid)
+        for trial in xrange(20):
+            n = rng.randint(1, 60)
+            refWindow = (1, 100, 100 + n)
+            cssCalls = rng.randint(0, len(calls), size=n)
+            # The alternate allele always differs from the consensus
+            altCalls = (cssCalls + rng.randint(1, len(calls), size=n)) % len(calls)
+            args = ["".join(rng.choice(list("ACGTN"), size=n)),
+                    rng.randint(0, 10, size=n).tolist(),
+                    [ calls[i] for i in cssCalls ],
+                    rng.randint(0, 10, size=n).tolist(),
+                    rng.randint(0, 40, size=n).tolist()]
+            if diploid:
+                args += [[ calls[i] for i in altCalls ],
+                         rng.randint(0, 10, size=n).tolist(),
+                         rng.randint(0, 40, size=n).tolist()]
+            assert_equal(_loopComputeVariants(config, refWindow, *args),
+                         _computeVariants(config, refWindow, *args))
+
+
 # def test_computeVariantsDiploid():
 #     config = PluralityConfig(minConfidence=0,
 #                              minCoverage=0,
@@ -0,0 +1,108 @@
+from __future__ import absolute_import, division, print_function
+
+import json, os, shutil, tempfile, Queue
+from collections import OrderedDict
+from nose.tools import assert_equal, assert_almost_equal
+
+from GenomicConsensus import reference
+from GenomicConsensus.consensus import Consensus
+from GenomicConsensus.options import options
+from GenomicConsensus.progress import ProgressReporter
+from GenomicConsensus.ResultCollector import ResultCollector
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+    def __call__(self):
+        return self.now
+
+
+class TestProgressReporter(object):
+
+    def setup(self):
+        self.directory = tempfile.mkdtemp()
+        self.statusFilename = os.path.join(self.directory, "status.json")
+        self.clock = FakeClock()
+        self.progress = ProgressReporter(10000, 30, self.statusFilename,
+                                         rateWindow=2, clock=self.clock)
+
+    def teardown(self):
+        shutil.rmtree(self.directory)
+
+    def test_rates_and_eta(self):
+        self.clock.now += 10
+        self.progress.recordResult(("ref1", 0, 1000), "worker1", 8.0)
+        self.progress.recordResult(("ref1", 1000, 2000), "worker2", 5.0)
+        assert not self.progress.due()
+        self.clock.now += 30
+        assert self.progress.due()
+        status = self.progress.report({ "work" : 7, "results" : 1 })
+        assert not self.progress.due()
+        assert_almost_equal(0.2, status["fractionDone"])
+        assert_almost_equal(2000 / 40, status["basesPerSecond"])
+        assert_almost_equal(2 / 40, status["chunksPerSecond"])
+        assert_almost_equal(8000 / 50, status["etaSeconds"])
+        assert_almost_equal(8.0 / 40, status["workers"]["worker1"]["utilization"])
+        assert_equal(1, status["workers"]["worker2"]["chunks"])
+        assert_equal(status, json.load(open(self.statusFilename)))
+
+        # Rates follow the recent reports
+        for _ in xrange(3):
+            self.clock.now += 30
+            self.progress.recordResult(("ref1", 0, 100), "worker1", 30.0)
+            status = self.progress.report()
+        assert_almost_equal((2300 - 2000) / 90, status["basesPerSecond"])
+
+    def test_stalled(self):
+        self.clock.now += 60
+        status = self.progress.report()
+        assert_equal(None, status["etaSeconds"])
+        assert_equal("running", json.load(open(self.statusFilename))["state"])
+
+
+class TestResultCollectorProgress(object):
+
+    OPTIONS = dict(referenceWindows=(), fastaOutputFilename=None, fastqOutputFilename=None,
+                   gffOutputFilename=None, vcfOutputFilename=None, resultStore=None,
+                   alignmentSummaryOutput=None, compressionThreads=1, numWorkers=2,
+                   doProfiling=False, progressInterval=0, statusFile=None)
+
+    def setup(self):
+        self.directory = tempfile.mkdtemp()
+        self.savedOptions = dict((name, getattr(options, name, None)) for name in self.OPTIONS)
+        for name, value in self.OPTIONS.items():
+            setattr(options, name, value)
+        self.savedReference = reference.byName, reference.filename
+        reference.byName = OrderedDict((name, reference.ReferenceContig(i, name, name,
+                                                                        "A" * length, length))
+                                       for (i, (name, length)) in enumerate([("ref1", 100),
+                                                                             ("ref2", 50)]))
+        reference.filename = "reference.fasta"
+
+    def teardown(self):
+        for name, value in self.savedOptions.items():
+            setattr(options, name, value)
+        reference.byName, reference.filename = self.savedReference
+        shutil.rmtree(self.directory)
+
+    def test_final_status(self):
+        options.statusFile = os.path.join(self.directory, "status.json")
+        options.progressInterval = 3600
+        resultsQueue, workQueue = Queue.Queue(), Queue.Queue()
+        windows = [ ("ref1", 0, 60), ("ref2", 0, 50), ("ref1", 60, 100) ]
+        for i, window in enumerate(windows):
+            css = Consensus(window, "A" * (window[2] - window[1]), [20] * (window[2] - window[1]))
+            resultsQueue.put((window, (css, []), ("worker%d" % (i % 2), 0.5)))
+        resultsQueue.put(None)
+        resultsQueue.put(None)
+        ResultCollector(resultsQueue, "plurality", None, workQueue)._run()
+
+        status = json.load(open(options.statusFile))
+        assert_equal("finished", status["state"])
+        assert_equal((150, 150, 3), (status["basesCompleted"], status["totalBases"],
+                                     status["chunksCompleted"]))
+        assert_equal(0, status["etaSeconds"])
+        assert_equal({ "worker0" : 2, "worker1" : 1 },
+                     dict((name, w["chunks"]) for (name, w) in status["workers"].items()))
+        assert_equal({ "work" : 0, "results" : 0 }, status["queueDepths"])
@@ -0,0 +1,55 @@
+from __future__ import absolute_import, division, print_function
+
+import numpy as np
+from nose.tools import assert_equals
+
+from GenomicConsensus.utils import readsInWindow
+
+
+class FakeAlignmentFile(object):
+    """
+    Alignment file on contig "ref" whose index is a record array;
+    records the rows it is asked to decode.
+    """
+    def __init__(self, tStart, tEnd, mapQV, readQual=None):
+        columns = [ ("tStart", tStart), ("tEnd", tEnd), ("mapQV", mapQV) ]
+        if readQual is not None:
+            columns.append(("readQual", readQual))
+        self.index = np.rec.fromarrays([ c for _, c in columns ],
+                                       names=[ n for n, _ in columns ])
+        self.mapQV = self.index.mapQV
+        self.decoded = []
+
+    def readsInRange(self, refId, start, end, justIndices=False):
+        return np.flatnonzero((self.index.tStart < end) &
+                              (self.index.tEnd > start))
+
+    def __getitem__(self, rowNumbers):
+        self.decoded.extend(rowNumbers)
+        return list(rowNumbers)
+
+
+def test_prefilter_by_index_columns():
+    alnFile = FakeAlignmentFile(tStart=[0, 0, 0, 0],
+                                tEnd=[100, 100, 100, 100],
+                                mapQV=[60, 5, 60, 60],
+                                readQual=[0.9, 0.9, 0.5, 0.8])
+    alns = readsInWindow(alnFile, ("ref", 10, 20), minMapQV=10,
+                         minReadScore=0.75)
+    assert_equals([0, 3], alns)
+    assert_equals([0, 3], alnFile.decoded)
+
+def test_prefilter_applies_before_depth_limit():
+    alnFile = FakeAlignmentFile(tStart=[0, 0, 0],
+                                tEnd=[100, 100, 100],
+                                mapQV=[60, 60, 60],
+                                readQual=[0.1, 0.1, 0.9])
+    assert_equals([2], readsInWindow(alnFile, ("ref", 10, 20),
+                                     depthLimit=1, minReadScore=0.75))
+
+def test_no_read_quality_in_index():
+    alnFile = FakeAlignmentFile(tStart=[0, 0],
+                                tEnd=[100, 100],
+                                mapQV=[60, 60])
+    assert_equals([0, 1], readsInWindow(alnFile, ("ref", 10, 20),
+                                        minReadScore=0.75))
@@ -0,0 +1,95 @@
+from __future__ import absolute_import, division, print_function
+
+import os, shutil, tempfile
+import numpy as np
+from collections import OrderedDict
+from nose.tools import assert_equal
+
+from GenomicConsensus import reference
+from GenomicConsensus.consensus import Consensus
+from GenomicConsensus.variants import VariantTable
+from GenomicConsensus.export import exportResults
+from GenomicConsensus.io.ResultStore import ResultStoreWriter, ResultStore
+from GenomicConsensus.io.VariantsGffWriter import VariantsGffWriter
+from test_variant_table import randomVariants
+from test_consensus_writers import fastaRecord
+
+
+class TestResultStore(object):
+
+    def setup(self):
+        self.savedReference = reference.byName, reference.filename
+        reference.byName = OrderedDict((name, reference.ReferenceContig(i, name, name + " full",
+                                                                        "A" * length, length))
+                                       for (i, (name, length)) in enumerate([("ref1", 100),
+                                                                             ("ref2", 60)]))
+        reference.filename = "reference.fasta"
+        self.directory = tempfile.mkdtemp()
+        self.optionsDict = { "minConfidence"      : 20,
+                             "minCoverage"        : 5,
+                             "diploid"            : True,
+                             "shellCommand"       : "variantCaller",
+                             "inputFilename"      : "aligned.bam",
+                             "referenceFilename"  : "reference.fasta",
+                             "compressionThreads" : 1 }
+
+        rng = np.random.RandomState(42)
+        self.spans = [ ("ref1", 0, 100), ("ref2", 0, 60) ]
+        self.windows = [ ("ref1", s, s + 25) for s in xrange(0, 100, 25) ] + \
+                       [ ("ref2", s, s + 20) for s in xrange(0, 60, 20) ]
+        rng.shuffle(self.windows)
+        self.results = []
+        for window in self.windows:
+            length = rng.randint(0, 40)
+            css = Consensus(window, "".join(rng.choice(list("ACGT"), size=length)),
+                            rng.randint(0, 94, size=length))
+            self.results.append((window, css, randomVariants(rng, rng.randint(0, 20))))
+
+        self.storeDirectory = os.path.join(self.directory, "store")
+        writer = ResultStoreWriter(self.storeDirectory, reference.byName.values(),
+                                   self.spans, "plurality", self.optionsDict)
+        for window, css, variants in self.results:
+            writer.addWindow(window, css, VariantTable.fromVariants(variants))
+        writer.close()
+
+    def teardown(self):
+        reference.byName, reference.filename = self.savedReference
+        shutil.rmtree(self.directory)
+
+    def test_roundtrip(self):
+        store = ResultStore(self.storeDirectory)
+        assert_equal(len(self.results), len(store))
+        assert_equal("plurality", store.algorithmName)
+        assert_equal(self.spans, store.spans)
+        for i, (window, css, _) in enumerate(self.results):
+            stored = store.consensus(i)
+            assert_equal(window, stored.refWindow)
+            assert_equal(css.sequence, stored.sequence)
+            assert_equal(css.confidence.tolist(), stored.confidence.tolist())
+        assert_equal(sum([ variants for (_, _, variants) in self.results ], []),
+                     list(store.variants()))
+
+    def test_export(self):
+        gffPath = os.path.join(self.directory, "exported.gff")
+        fastaPath = os.path.join(self.directory, "exported.fasta")
+        exportOptions = dict(self.optionsDict, minConfidence=30)
+        exportResults(ResultStore(self.storeDirectory), [gffPath, fastaPath], exportOptions)
+
+        # As written directly from the results, at the new threshold
+        expectedPath = os.path.join(self.directory, "expected.gff")
+        writer = VariantsGffWriter(expectedPath, exportOptions, reference.byName.values())
+        for refId in reference.byName:
+            writer.writeVariants(sorted(v for (_, _, variants) in self.results
+                                        for v in variants if v.refId == refId))
+        writer.close()
+        records = lambda path: [ l for l in open(path) if not l.startswith("#") ]
+        assert len(records(expectedPath)) > 0
+        assert_equal(records(expectedPath), records(gffPath))
+
+        expectedFasta = ""
+        for refId, _, _ in self.spans:
+            chunks = sorted((window, css) for (window, css, _) in self.results
+                            if window[0] == refId)
+            expectedFasta += fastaRecord(refId + " full|plurality",
+                                         "".join(css.sequence for (_, css) in chunks))
+        assert_equal(expectedFasta, open(fastaPath).read())
@@ -0,0 +1,79 @@
+from __future__ import absolute_import, division, print_function
+
+import numpy as np
+from nose.tools import assert_equals
+
+from GenomicConsensus.reference import WorkChunk, WorkStripe, enumerateStripes
+from GenomicConsensus.io.StripeReader import StripeReader
+from GenomicConsensus.utils import readsInWindow
+
+
+class FakeIndex(object):
+    def __init__(self, tStart, tEnd):
+        self.tStart = np.array(tStart, dtype=int)
+        self.tEnd   = np.array(tEnd, dtype=int)
+
+class FakeAlignmentFile(object):
+    """
+    Minimal alignment file on a single contig "ref", counting how many
+    times each row is decoded.
+    """
+    def __init__(self, tStart, tEnd):
+        self.index = FakeIndex(tStart, tEnd)
+        self.mapQV = np.array([60] * len(tStart), dtype=int)
+        self.decodeCounts = np.zeros(len(tStart), dtype=int)
+
+    def readsInRange(self, refId, start, end, justIndices=False):
+        assert justIndices
+        assert refId == "ref"
+        return np.flatnonzero((self.index.tStart < end) &
+                              (self.index.tEnd > start))
+
+    def __getitem__(self, rowNumbers):
+        if np.isscalar(rowNumbers):
+            self.decodeCounts[rowNumbers] += 1
+            return ("aln", int(rowNumbers))
+        return [ self[r] for r in rowNumbers ]
+
+
+def chunksFor(starts, refId="ref", chunkSize=100):
+    return [ WorkChunk((refId, s, s + chunkSize), True) for s in starts ]
+
+def test_enumerateStripes_groups_contiguous_chunks():
+    chunks = chunksFor([0, 100, 200, 300, 400])
+    stripes = list(enumerateStripes(chunks, 250))
+    assert_equals(2, len(stripes))
+    assert_equals(("ref", 0, 300), stripes[0].window)
+    assert_equals(("ref", 300, 500), stripes[1].window)
+    assert_equals(chunks, sum([ s.chunks for s in stripes ], []))
+
+def test_enumerateStripes_breaks_at_contigs():
+    chunks = chunksFor([0, 100]) + chunksFor([0, 100], refId="other")
+    stripes = list(enumerateStripes(chunks, 10000))
+    assert_equals([("ref", 0, 200), ("other", 0, 200)],
+                  [ s.window for s in stripes ])
+    assert all(isinstance(s, WorkStripe) for s in stripes)
+
+def test_stripe_reader_decodes_each_row_once():
+    # Reads in sorted order, with some long reads spanning several windows
+    tStart = [  0,  10,  50, 120, 150, 210, 250, 320, 390 ]
+    tEnd   = [ 90, 300, 140, 260, 170, 330, 400, 400, 400 ]
+    alnFile = FakeAlignmentFile(tStart, tEnd)
+    reader = StripeReader(alnFile, ("ref", 0, 400))
+    for winStart in xrange(0, 400, 100):
+        window = ("ref", winStart, winStart + 100)
+        reader.advanceTo(winStart)
+        expected = alnFile.readsInRange(*window, justIndices=True)
+        assert_equals(expected.tolist(),
+                      reader.readsInRange(*window, justIndices=True).tolist())
+        alns = readsInWindow(reader, window, strategy="fileorder")
+        assert_equals([ ("aln", r) for r in expected ], alns)
+    assert_equals([1] * len(tStart), alnFile.decodeCounts.tolist())
+
+def test_stripe_reader_delegates_outside_stripe():
+    alnFile = FakeAlignmentFile([0, 500], [100, 600])
+    reader = StripeReader(alnFile, ("ref", 0, 200))
+    assert_equals([1], reader.readsInRange("ref", 450, 550,
+                                           justIndices=True).tolist())
+    assert_equals(("aln", 1), reader[1])
+    assert reader.index is alnFile.index
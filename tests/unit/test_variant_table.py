@@ -0,0 +1,67 @@
+from __future__ import absolute_import, division, print_function
+
+import cPickle as pickle, numpy as np
+from nose.tools import assert_equal
+
+from GenomicConsensus.variants import Variant, VariantTable
+
+
+def randomVariants(rng, n):
+    alleles = ["", "A", "C", "G", "T", "AC", "GGT"]
+    variants = []
+    for _ in xrange(n):
+        refStart = int(rng.randint(0, 50))
+        heterozygous = rng.rand() < 0.3
+        v = Variant(rng.choice(["ref1", "ref2"]),
+                    refStart, refStart + int(rng.randint(0, 3)),
+                    rng.choice(alleles), rng.choice(alleles),
+                    rng.choice(alleles) if heterozygous else None,
+                    confidence=int(rng.randint(0, 60)) if rng.rand() < 0.9 else None,
+                    coverage=int(rng.randint(0, 30)) if rng.rand() < 0.9 else None,
+                    frequency1=float(rng.randint(0, 20)) if rng.rand() < 0.5 else None,
+                    frequency2=0.5 if heterozygous else None,
+                    refPrev=rng.choice(list("ACGTN")),
+                    readPrev=rng.choice(list("ACGTN")))
+        if rng.rand() < 0.1:
+            v.annotate("rows", "1,2,3")
+        variants.append(v)
+    return variants
+
+def test_roundtrip():
+    variants = randomVariants(np.random.RandomState(42), 200)
+    table = VariantTable.fromVariants(variants)
+    assert_equal(len(variants), len(table))
+    assert_equal(variants, list(table))
+    assert_equal(variants[17], table[17])
+    assert_equal(variants, list(pickle.loads(pickle.dumps(table, pickle.HIGHEST_PROTOCOL))))
+
+def test_sorted_matches_variant_order():
+    rng = np.random.RandomState(7)
+    variants = randomVariants(rng, 300)
+    assert_equal(sorted(variants),
+                 list(VariantTable.fromVariants(variants).sorted()))
+
+def test_concatenate():
+    rng = np.random.RandomState(1)
+    pieces = [ randomVariants(rng, n) for n in (10, 0, 25, 5) ]
+    table = VariantTable.concatenate([ VariantTable.fromVariants(p) for p in pieces ])
+    assert_equal(sum(pieces, []), list(table))
+
+def test_meetsThresholds():
+    variants = randomVariants(np.random.RandomState(3), 200)
+    table = VariantTable.fromVariants(variants)
+    assert_equal([ v for v in variants if v.coverage >= 5 and v.confidence >= 20 ],
+                 list(table[table.meetsThresholds(5, 20)]))
+
+def test_keptAtSource():
+    variants = randomVariants(np.random.RandomState(5), 500)
+    table = VariantTable.fromVariants(variants)
+    passing = table.meetsThresholds(5, 20)
+    assert_equal(passing.tolist(), table.keptAtSource(5, 20, 0).tolist())
+    assert table.keptAtSource(5, 20, 1).all()
+    half = table.keptAtSource(5, 20, 0.5)
+    assert (half >= passing).all()
+    assert 0 < (half & ~passing).sum() < (~passing).sum()
+    # Fractions outside [0, 1] are clipped
+    assert_equal(passing.tolist(), table.keptAtSource(5, 20, -0.5).tolist())
+    assert table.keptAtSource(5, 20, 1.5).all()
@@ -0,0 +1,95 @@
+from __future__ import absolute_import, division, print_function
+
+import os, re, shutil, tempfile, numpy as np
+from nose.tools import assert_equal
+
+from GenomicConsensus import reference
+from GenomicConsensus.variants import Variant, VariantTable
+from GenomicConsensus.io.VariantsGffWriter import (VariantsGffWriter, formatGffRecords,
+                                                   formatGffLines, toGffRecord)
+from GenomicConsensus.io.VariantsVcfWriter import VariantsVcfWriter, formatVcfRecords
+from test_variant_table import randomVariants
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+
+
+class TestVariantWriters(object):
+
+    def setup(self):
+        self.savedByName = reference.byName
+        reference.byName = dict((name, reference.ReferenceContig(i, name, name + " full",
+                                                                 "A" * 100, 100))
+                                for (i, name) in enumerate(["ref1", "ref2"]))
+        self.directory = tempfile.mkdtemp()
+        self.optionsDict = { "minConfidence"     : 20,
+                             "minCoverage"       : 5,
+                             "diploid"           : True,
+                             "shellCommand"      : "variantCaller",
+                             "inputFilename"     : "aligned.bam",
+                             "referenceFilename" : "reference.fasta" }
+
+    def teardown(self):
+        reference.byName = self.savedByName
+        shutil.rmtree(self.directory)
+
+    def contents(self, writerClass, filename, variants):
+        path = os.path.join(self.directory, filename)
+        writer = writerClass(path, self.optionsDict,
+                             [ reference.byName[name] for name in ("ref1", "ref2") ])
+        writer.writeVariants(variants)
+        writer.close()
+        return open(path).read()
+
+    def records(self, writerClass, filename, variants):
+        path = os.path.join(self.directory, filename)
+        writer = writerClass(path, self.optionsDict, reference.byName.values())
+        writer.writeVariants(variants)
+        writer.close()
+        return [ line for line in open(path) if not line.startswith("#") ]
+
+    def test_preformatted_records_match(self):
+        variants = sorted(randomVariants(np.random.RandomState(42), 300))
+        table = VariantTable.fromVariants(variants)
+        table.gffRecords = formatGffRecords(table, 5, 20)
+        table.vcfRecords = formatVcfRecords(table, 5, 20)
+        for writerClass, extension in ((VariantsGffWriter, ".gff"),
+                                       (VariantsVcfWriter, ".vcf")):
+            expected = self.records(writerClass, "plain" + extension, variants)
+            assert len(expected) > 0
+            assert_equal(expected,
+                         self.records(writerClass, "preformatted" + extension, table))
+
+    def test_formatGffLines(self):
+        insertion = Variant("ref1", 10, 10, "", "AC", confidence=40, coverage=12,
+                            frequency1=9., refPrev="G", readPrev="G")
+        deletion = Variant("ref1", 20, 22, "GT", "", confidence=30, coverage=8,
+                           refPrev="A", readPrev="A")
+        deletion.annotate("rows", "1,2")
+        het = Variant("ref1", 30, 31, "A", "C", "A", confidence=50, coverage=20,
+                      frequency1=10., frequency2=10., refPrev="T", readPrev="T")
+        assert_equal(
+            ["ref1 full\t.\tinsertion\t10\t10\t.\t.\t.\t"
+             "reference=.;variantSeq=AC;frequency=9;coverage=12;confidence=40",
+             "ref1 full\t.\tdeletion\t21\t22\t.\t.\t.\t"
+             "reference=GT;variantSeq=.;coverage=8;confidence=30;rows=1,2",
+             "ref1 full\t.\tsubstitution\t31\t31\t.\t.\t.\t"
+             "reference=A;variantSeq=C/A;frequency=10/10;coverage=20;confidence=50"],
+            formatGffLines(VariantTable.fromVariants([insertion, deletion, het])).tolist())
+
+    def test_formatGffLines_matches_Gff3Record(self):
+        variants = randomVariants(np.random.RandomState(11), 500)
+        assert_equal([ str(toGffRecord(v)) for v in variants ],
+                     formatGffLines(VariantTable.fromVariants(variants)).tolist())
+
+    def test_gff_golden(self):
+        # Byte for byte the output of the Gff3Record-based writer
+        def undated(text):
+            text = re.sub("(?m)^##date .*$", "##date", text)
+            return re.sub("(?m)^##source GenomicConsensus .*$", "##source", text)
+        expected = undated(open(os.path.join(DATA_DIR, "writers", "variants.gff")).read())
+        variants = sorted(randomVariants(np.random.RandomState(42), 400))
+        table = VariantTable.fromVariants(variants)
+        preformatted = VariantTable.fromVariants(variants)
+        preformatted.gffRecords = formatGffRecords(preformatted, 5, 20)
+        for name, vs in (("list", variants), ("table", table), ("preformatted", preformatted)):
+            assert_equal(expected, undated(self.contents(VariantsGffWriter, name + ".gff", vs)))